@@ -0,0 +1,185 @@
+"""End-to-end latency of the heavier commands against a synthetic repo
+
+    python benchmarks/bench_commands.py [--repo PATH | --preset NAME] [--repeat N]
+                                        [--only Status,Blame,...] [--warm] [--json]
+
+Each sample runs one command from the start of its run() until every git
+process it set off has finished and every callback has been called on the
+(stub) main thread -- i.e. until the quick panel is up, the scratch view is
+filled, or the regions and status entries are set. By default the plugin's
+caches are emptied between samples; --warm keeps them, which is what
+repeated use inside the editor looks like.
+
+Without --repo a repo is generated with benchmarks/repogen.py into a
+temporary directory (see its --preset and override options) and removed
+afterwards. Use --json and keep the output to compare commits.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+from harness import sublime, environment, load_plugin_settings, reset_caches, summarize, wait_idle
+import repogen
+from git import annotate, history, ignore, status, statusbar  # noqa: F401 (registers commands)
+from git import core  # noqa: F401
+
+
+def open_view(window, repo, path):
+    return window.open_file(os.path.join(repo, path))
+
+
+def bench_status(window, repo):
+    window.quick_panels[:] = []
+    status.GitStatusCommand(window).run()
+    return lambda: bool(window.quick_panels)
+
+
+def bench_log_all(window, repo):
+    window.quick_panels[:] = []
+    history.GitLogAllCommand(window).run()
+    return lambda: bool(window.quick_panels)
+
+
+def bench_blame(window, repo):
+    view = open_view(window, repo, repogen.HOT_FILE)
+    before = len(window.views())
+    history.GitBlameCommand(view).run(sublime.Edit())
+    return lambda: len(window.views()) > before and window.views()[-1].size() > 0
+
+
+def bench_annotate(window, repo):
+    view = open_view(window, repo, repogen.HOT_FILE)
+    if not view.is_dirty():
+        # change a line here and there, and add and remove a few
+        lines = view.substr(sublime.Region(0, view.size())).split('\n')
+        for number in range(10, len(lines), 97):
+            lines[number] = lines[number] + '  # edited'
+        for number in range(len(lines) - 50, 50, -211):
+            del lines[number]
+            lines.insert(number - 7, 'inserted = %d' % number)
+        view.set_text('\n'.join(lines))
+        view._dirty = True
+    view.erase_regions('git.changes.x')
+    annotate.GitAnnotateCommand(view).run(sublime.Edit())
+    return lambda: bool(view.get_regions('git.changes.x'))
+
+
+def bench_annotate_typing(window, repo):
+    # a keystroke's worth of re-annotation: the edit comes through the
+    # buffer's change listener, so only the rows it touched are re-read
+    view = open_view(window, repo, repogen.HOT_FILE)
+    if not view.settings().get('live_git_annotations'):
+        annotate.GitAnnotateCommand(view).run(sublime.Edit())
+        wait_idle()
+    view.insert(sublime.Edit(), view.text_point(20, 0), 'typed = 1\n')
+    view.erase_regions('git.changes.+')
+    annotate.GitAnnotateCommand(view).run(sublime.Edit())
+    return lambda: bool(view.get_regions('git.changes.+'))
+
+
+def bench_branch_status(window, repo):
+    view = open_view(window, repo, repogen.HOT_FILE)
+    view.statuses.clear()
+    statusbar.GitBranchStatusCommand(view).run(sublime.Edit())
+    return lambda: view.get_status('git-status-working').startswith('working:')
+
+
+def bench_update_ignore(window, repo):
+    view = open_view(window, repo, repogen.HOT_FILE)
+    window.set_project_data({'folders': [{'path': repo}]})
+    ignore.GitUpdateIgnoreCommand(view).run(sublime.Edit())
+    return lambda: bool(window.project_data()['folders'][0].get('folder_exclude_patterns'))
+
+
+BENCHMARKS = [
+    ('Status', bench_status),
+    ('LogAll', bench_log_all),
+    ('Blame', bench_blame),
+    ('Annotate', bench_annotate),
+    ('AnnotateTyping', bench_annotate_typing),
+    ('BranchStatus', bench_branch_status),
+    ('UpdateIgnore', bench_update_ignore),
+]
+
+
+def run_benchmark(name, func, repo, repeat, warm):
+    window = sublime.Window(folders=[repo])
+    samples = []
+    for number in range(repeat):
+        if not warm:
+            reset_caches()
+        started = time.time()
+        done = func(window, repo)
+        wait_idle()
+        samples.append(time.time() - started)
+        if not done():
+            raise RuntimeError('%s did not finish what it was meant to' % name)
+    window.close()
+    return summarize(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--repo', help='an existing repo made by repogen.py')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--only', help='comma separated benchmark names')
+    parser.add_argument('--warm', action='store_true', help="don't empty the plugin's caches between samples")
+    parser.add_argument('--json', action='store_true')
+    repogen.add_arguments(parser)
+    args = parser.parse_args()
+
+    names = [name for name, func in BENCHMARKS]
+    only = args.only.split(',') if args.only else names
+    unknown = set(only) - set(names)
+    if unknown:
+        parser.error('unknown benchmarks: %s (choose from %s)' % (', '.join(sorted(unknown)), ', '.join(names)))
+
+    settings = load_plugin_settings()
+    settings.set('statusbar_branch', True)
+    settings.set('statusbar_status', True)
+    settings.set('save_first', False)
+
+    scratch = None
+    if args.repo:
+        repo = os.path.realpath(args.repo)
+        summary = {'path': repo}
+    else:
+        scratch = tempfile.mkdtemp(prefix='git_bench_')
+        repo = os.path.join(scratch, 'repo')
+        if not args.json:
+            print('generating a %s repo in %s...' % (args.preset, repo), file=sys.stderr)
+        summary = repogen.generate(repo, **repogen.options_from(args))
+
+    results = {}
+    # the plugin prints the odd thing; keep stdout for the results
+    stdout, sys.stdout = sys.stdout, sys.stderr
+    try:
+        for name, func in BENCHMARKS:
+            if name in only:
+                results[name] = run_benchmark(name, func, repo, args.repeat, args.warm)
+                if not args.json:
+                    print('%-14s median %9.1f ms   p95 %9.1f ms   min %9.1f ms' % (
+                        name, results[name]['median_ms'], results[name]['p95_ms'], results[name]['min_ms']), file=stdout)
+    finally:
+        sys.stdout = stdout
+        reset_caches()
+        if scratch:
+            shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({
+            'environment': environment(),
+            'repo': summary,
+            'warm': args.warm,
+            'results': results,
+        }, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
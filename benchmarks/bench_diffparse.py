@@ -0,0 +1,116 @@
+"""Parsing a big unified diff with git/diffparse.py
+
+    python benchmarks/bench_diffparse.py [--size-mb 100] [--repeat N] [--json]
+
+Generates a diff of about --size-mb megabytes (many files, hunks of mixed
+sizes, the odd rename, binary file and missing newline) and times finding
+all of its file headers and hunks: from one str, from one bytes object,
+and streamed in 64 KiB byte chunks. For comparison, "legacy" is the way
+the plugin used to do it: splitlines(), a regular expression per hunk
+header and each hunk's text built up line by line.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import random
+import re
+import time
+
+from harness import summarize
+from git import diffparse
+
+
+def make_diff(size, seed=1):
+    rng = random.Random(seed)
+    parts = []
+    total = 0
+    number = 0
+    while total < size:
+        number += 1
+        name = 'src/module%d/file%d.py' % (number % 50, number)
+        lines = ['diff --git a/%s b/%s\n' % (name, name)]
+        if number % 97 == 0:
+            lines.append('index 1234567..89abcde 100644\nBinary files a/%s and b/%s differ\n' % (name, name))
+        else:
+            if number % 31 == 0:
+                lines.append('similarity index 90%%\nrename from %s.old\nrename to %s\n' % (name, name))
+            lines.append('index 1234567..89abcde 100644\n--- a/%s\n+++ b/%s\n' % (name, name))
+            line = 1
+            for _ in range(rng.randint(1, 12)):
+                line += rng.randint(0, 200)
+                context = rng.randint(0, 3)
+                removed = rng.randint(0, 20)
+                added = rng.randint(0, 20) if removed else rng.randint(1, 20)
+                body = (
+                    [' context line %d\n' % n for n in range(context)]
+                    + ['-    old = compute(%d, %d)\n' % (line, n) for n in range(removed)]
+                    + ['+    new = compute(%d, %d)  # changed\n' % (line, n) for n in range(added)]
+                    + [' context line %d\n' % n for n in range(context)]
+                )
+                lines.append('@@ -%d,%d +%d,%d @@ def function_%d():\n' % (
+                    line, 2 * context + removed, line, 2 * context + added, line))
+                lines.extend(body)
+            if number % 53 == 0:
+                lines.append('\\ No newline at end of file\n')
+        part = ''.join(lines)
+        parts.append(part)
+        total += len(part)
+    return ''.join(parts)
+
+
+def legacy_parse(text):
+    # what GitAddSelectedHunkCommand.cull_diff did before diffparse: a
+    # regex per hunk header, and each hunk's text built up line by line
+    matcher = re.compile(r'^@@ -([0-9]*)(?:,([0-9]*))? \+([0-9]*)(?:,([0-9]*))? @@')
+    hunks = [{"diff": ""}]
+    for line in text.splitlines():
+        if line.startswith('@@'):
+            match = matcher.match(line)
+            hunks.append({"diff": "", "start": int(match.group(3))})
+        hunks[-1]["diff"] += line + "\n"
+    return len(hunks) - 1
+
+
+def chunked(data, size=65536):
+    return (data[position:position + size] for position in range(0, len(data), size))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--size-mb', type=float, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    text = make_diff(int(args.size_mb * 1024 * 1024))
+    data = text.encode('utf-8')
+    hunks = sum(1 for record in diffparse.parse(text) if isinstance(record, diffparse.Hunk))
+    cases = [
+        ('str', lambda: sum(1 for record in diffparse.parse(text) if isinstance(record, diffparse.Hunk))),
+        ('bytes', lambda: sum(1 for record in diffparse.parse(data) if isinstance(record, diffparse.Hunk))),
+        ('chunks', lambda: sum(1 for record in diffparse.iter_records(chunked(data)) if isinstance(record, diffparse.Hunk))),
+        ('legacy', lambda: legacy_parse(text)),
+    ]
+    results = {}
+    for name, func in cases:
+        samples = []
+        for _ in range(args.repeat):
+            started = time.time()
+            found = func()
+            samples.append(time.time() - started)
+        if found != hunks:
+            raise RuntimeError('%s found %d hunks, not %d' % (name, found, hunks))
+        summary = summarize(samples)
+        summary['mb_per_s'] = round(len(data) / 1024 / 1024 / (summary['median_ms'] / 1000), 1)
+        results[name] = summary
+        if not args.json:
+            print('%-7s median %9.1f ms   p95 %9.1f ms   %7.1f MB/s' % (
+                name, summary['median_ms'], summary['p95_ms'], summary['mb_per_s']))
+
+    if args.json:
+        print(json.dumps({'bytes': len(data), 'hunks': hunks, 'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,126 @@
+"""Live annotation diffing: in-process engines against `git diff` on temp files
+
+    python benchmarks/bench_linediff.py [--lines 10000,100000] [--edits N] [--repeat N] [--json]
+
+For each size a file is generated, then changed in --edits places (lines
+edited, inserted and deleted), and the two are compared the way each
+annotation engine does it, from the HEAD text and the buffer text to the
+change list annotate() takes. The "git" engine's time includes writing the
+temp files, running git and parsing its output. Also reports how many of
+the marked lines each engine agrees with git on.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import time
+
+from harness import summarize
+from git import linediff
+from git.annotate import GitAnnotateCommand
+
+
+def make_texts(lines, edits, seed=1):
+    rng = random.Random(seed)
+    words = 'if else for while return def class self pass import yield with as'.split()
+    head = ['%s%s(%d)' % ('    ' * rng.randint(0, 3), rng.choice(words), rng.randint(0, 10 ** 6)) for _ in range(lines)]
+    # and plenty of lines which aren't unique (blank lines, braces, the
+    # same statement over and over), which is what makes diffs hard
+    for index in range(0, lines, 7):
+        head[index] = rng.choice(['', '}', '    }', '', '        return None', '    pass'])
+    buffer = list(head)
+    for _ in range(edits):
+        index = rng.randrange(len(buffer))
+        action = rng.random()
+        if action < 0.5:
+            buffer[index] = buffer[index] + '  # changed'
+        elif action < 0.8:
+            buffer[index:index] = ['added line %d' % n for n in range(rng.randint(1, 5))]
+        else:
+            del buffer[index:index + rng.randint(1, 5)]
+    return '\n'.join(head) + '\n', '\n'.join(buffer) + '\n'
+
+
+class Capture(GitAnnotateCommand):
+    # parse_diff without a view: keep what it would have drawn
+    def __init__(self):
+        self.result = None
+
+    def annotate(self, diff):
+        self.result = diff
+
+
+def git_engine(head, buffer, scratch):
+    head_file = os.path.join(scratch, 'head')
+    buffer_file = os.path.join(scratch, 'buffer')
+    with open(buffer_file, 'wb') as f:
+        f.write(buffer.encode('utf-8'))
+    with open(head_file, 'wb') as f:
+        f.write(head.encode('utf-8'))
+    proc = subprocess.Popen(
+        ['git', 'diff', '--no-index', '-u', '--', head_file, buffer_file],
+        stdout=subprocess.PIPE, cwd=scratch
+    )
+    output = proc.communicate()[0].decode('utf-8')
+    capture = Capture()
+    capture.parse_diff(output)
+    return capture.result
+
+
+def python_engine(algorithm):
+    def run(head, buffer, scratch):
+        changes = linediff.diff(linediff.split_lines(head), linediff.split_lines(buffer), algorithm=algorithm)
+        return linediff.annotations(changes)
+    return run
+
+
+def agreement(result, reference):
+    result = set(tuple(change) for change in result)
+    reference = set(tuple(change) for change in reference)
+    if not reference:
+        return 1.0 if not result else 0.0
+    return round(len(result & reference) / len(result | reference), 3)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--lines', default='10000,100000')
+    parser.add_argument('--edits', type=int, default=50)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    engines = [('git', git_engine), ('myers', python_engine('myers')), ('patience', python_engine('patience'))]
+    scratch = tempfile.mkdtemp(prefix='git_bench_')
+    results = {}
+    try:
+        for lines in [int(n) for n in args.lines.split(',')]:
+            head, buffer = make_texts(lines, args.edits)
+            reference = git_engine(head, buffer, scratch)
+            for name, engine in engines:
+                samples = []
+                for _ in range(args.repeat):
+                    started = time.time()
+                    result = engine(head, buffer, scratch)
+                    samples.append(time.time() - started)
+                summary = summarize(samples)
+                summary['agreement_with_git'] = agreement(result, reference)
+                summary['marked_lines'] = len(result)
+                results['%s/%d' % (name, lines)] = summary
+                if not args.json:
+                    print('%-9s %7d lines  median %8.2f ms  p95 %8.2f ms  agreement %5.1f%%' % (
+                        name, lines, summary['median_ms'], summary['p95_ms'], summary['agreement_with_git'] * 100))
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps({'edits': args.edits, 'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
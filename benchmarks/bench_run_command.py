@@ -0,0 +1,89 @@
+"""Per-call overhead of GitCommand.run_command, up to the point git is spawned
+
+Compares the current code path against a replica of what every call used
+to do: load both settings files, re-parse the fallback encoding, copy
+os.environ and check the platform. The scheduler is swapped for one that
+drops jobs, so no processes are started.
+
+    python benchmarks/bench_run_command.py [--json] [--calls N]
+
+Note that load_settings is a dict lookup in the stub; inside the editor it
+costs rather more, so the real difference is larger than shown here.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import os
+import sys
+import timeit
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.join(HERE, 'stubs'))
+sys.path.insert(0, os.path.dirname(HERE))
+
+import sublime  # noqa: E402
+import git  # noqa: E402
+
+
+class DroppingScheduler(object):
+    def submit(self, job):
+        pass
+
+
+class BenchCommand(git.GitTextCommand):
+    def generic_done(self, result):
+        pass
+
+
+def legacy_overhead(view):
+    # What run_command + CommandThread.run did on every call before the
+    # execution context was cached
+    s = sublime.load_settings("Git.sublime-settings")
+    if view.settings().get('fallback_encoding'):
+        str(view.settings().get('fallback_encoding').rpartition('(')[2].rpartition(')')[0])
+    s.get('save_first')
+    us = sublime.load_settings('Preferences.sublime-settings')
+    s.get('git_command') or us.get('git_binary')
+    s.get('gitk_command')
+    env = os.environ.copy()
+    if sublime.platform() == 'windows':
+        env['HOME'] = ''
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--calls', type=int, default=20000)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    git._scheduler = DroppingScheduler()
+    view = sublime.View(file_name=os.path.join(os.path.dirname(HERE), 'git_commands.py'))
+    view.settings().set('fallback_encoding', 'Western (Windows 1252)')
+    command = BenchCommand(view)
+    # a write, so it isn't coalesced with the previous (never finished) call
+    argv = ['git', 'add', '--', 'git_commands.py']
+
+    def current():
+        command.run_command(list(argv), show_status=False)
+
+    def legacy():
+        legacy_overhead(view)
+        git.CommandThread(list(argv), command.generic_done, working_dir=command.get_working_dir())
+
+    current()  # build the cached context outside the timing
+    results = {}
+    for name, func in (('legacy', legacy), ('current', current)):
+        seconds = min(timeit.repeat(func, number=args.calls, repeat=5))
+        results[name] = seconds / args.calls * 1e6
+
+    if args.json:
+        print(json.dumps({'run_command_overhead_us': results}, indent=2, sort_keys=True))
+    else:
+        for name in ('legacy', 'current'):
+            print('%-8s %8.2f us/call' % (name, results[name]))
+        print('speedup  %8.2fx' % (results['legacy'] / results['current']))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+"""Parsing a huge `git status --porcelain=v2 --branch -z` with git/repostate.py
+
+    python benchmarks/bench_status.py [--entries 200000] [--repeat N] [--json]
+
+Generates status output for a worktree with --entries entries, in the
+shapes that get big: mostly untracked build output, mostly modified files
+(a mass reformat), and a mix with renames and conflicts. Each is timed
+through parse_status(), and, for comparison, through "legacy": the way the
+status list used to read `git status --porcelain`, splitting on newlines
+and matching each line against a regular expression.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import re
+import time
+
+from harness import summarize
+from git import repostate
+
+
+def make_status(entries, shape):
+    records = ['# branch.oid %040x' % 1, '# branch.head master', '# branch.upstream origin/master', '# branch.ab +1 -2']
+    tracked = []
+    untracked = []
+    for number in range(entries):
+        oid = '%040x' % number
+        name = 'src/module%d/file%d.py' % (number % 50, number)
+        if shape == 'untracked' or (shape == 'mixed' and number % 2):
+            untracked.append('? build/out%d/object%d.o' % (number % 300, number))
+        elif shape == 'mixed' and number % 10 == 0:
+            tracked.append('2 R. N... 100644 100644 100644 %s %s R100 %s' % (oid, oid, name))
+            tracked.append(name + '.old')
+        elif shape == 'mixed' and number % 98 == 0:
+            tracked.append('u UU N... 100644 100644 100644 100644 %s %s %s %s' % (oid, oid, oid, name))
+        else:
+            tracked.append('1 %s N... 100644 100644 100644 %s %s %s' % ('.M' if number % 3 else 'M.', oid, oid, name))
+    return '\0'.join(records + tracked + untracked) + '\0'
+
+
+def legacy_parse(text):
+    # what GitStatusCommand.status_filter did with each line of v1 output
+    return [line for line in text.rstrip().split('\n') if re.match(r'^[ MADRCU?!]{1,2}\s+.*', line)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--entries', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--json', action='store_true')
+    args = parser.parse_args()
+
+    results = {}
+    for shape in ('untracked', 'modified', 'mixed'):
+        output = make_status(args.entries, shape)
+        legacy = repostate.parse_status(output).porcelain()
+        cases = [
+            ('v2', lambda: len(repostate.parse_status(output).entries)),
+            ('legacy', lambda: len(legacy_parse(legacy))),
+        ]
+        for name, func in cases:
+            samples = []
+            for _ in range(args.repeat):
+                started = time.time()
+                found = func()
+                samples.append(time.time() - started)
+            if found != args.entries:
+                raise RuntimeError('%s found %d entries in %s, not %d' % (name, found, shape, args.entries))
+            summary = summarize(samples)
+            results['%s/%s' % (shape, name)] = summary
+            if not args.json:
+                print('%-10s %-7s median %8.1f ms   p95 %8.1f ms' % (
+                    shape, name, summary['median_ms'], summary['p95_ms']))
+
+    if args.json:
+        print(json.dumps({'entries': args.entries, 'results': results}, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
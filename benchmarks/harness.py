@@ -0,0 +1,97 @@
+"""Shared plumbing for the benchmarks: the stubbed editor, waiting for the
+plugin to finish, and summarising timings
+
+Importing this puts the stubs and the plugin on sys.path, so `import git`
+works afterwards.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import time
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+PLUGIN_DIR = os.path.dirname(HERE)
+sys.path.insert(0, os.path.join(HERE, 'stubs'))
+sys.path.insert(0, PLUGIN_DIR)
+
+import sublime  # noqa: E402
+import git  # noqa: E402
+from git import catfile, repostate, telemetry  # noqa: E402
+
+
+def load_plugin_settings():
+    """Fill the stub's Git.sublime-settings from the real defaults"""
+    with io.open(os.path.join(PLUGIN_DIR, 'Git.sublime-settings'), encoding='utf-8') as f:
+        lines = [line for line in f if not line.strip().startswith('//')]
+    settings = sublime.load_settings('Git.sublime-settings')
+    for key, value in json.loads(''.join(lines)).items():
+        settings.set(key, value)
+    return settings
+
+
+def busy():
+    scheduler = git._scheduler
+    if scheduler is None:
+        return False
+    with scheduler.condition:
+        return bool(scheduler.pending or scheduler.running)
+
+
+def wait_idle(timeout=600):
+    """Run main-thread callbacks until no git commands are queued or running
+
+    A job queues its callbacks before it stops counting as running, so once
+    the scheduler is empty and the callback queue drains (without queueing
+    any more commands) everything the command set off has finished.
+    """
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        ran = sublime.run_pending(wait=0.002)
+        if not ran and not busy():
+            # anything queued between the two checks gets one more go
+            if not sublime.run_pending():
+                return
+    raise RuntimeError('still busy after %d seconds' % timeout)
+
+
+def reset_caches():
+    # Forget everything the plugin remembers about repos, so each sample
+    # does the work a first run would
+    git._root_cache.clear()
+    repostate._states.clear()
+    catfile.shutdown_all()
+
+
+def summarize(samples):
+    samples = sorted(samples)
+    return {
+        'runs': len(samples),
+        'min_ms': round(samples[0] * 1000, 2),
+        'median_ms': round(telemetry.percentile(samples, 0.5) * 1000, 2),
+        'p95_ms': round(telemetry.percentile(samples, 0.95) * 1000, 2),
+        'max_ms': round(samples[-1] * 1000, 2),
+        'mean_ms': round(sum(samples) / len(samples) * 1000, 2),
+    }
+
+
+def _output(*command):
+    try:
+        return subprocess.check_output(command, cwd=PLUGIN_DIR, stderr=subprocess.STDOUT).decode('utf-8').strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Enough about where the numbers came from to compare two runs"""
+    return {
+        'plugin_commit': _output('git', 'rev-parse', 'HEAD'),
+        'plugin_dirty': bool(_output('git', 'status', '--porcelain', '--untracked-files=no')),
+        'git': _output('git', '--version'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+    }
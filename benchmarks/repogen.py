@@ -0,0 +1,252 @@
+"""Build a synthetic git repo to benchmark against
+
+    python benchmarks/repogen.py DEST [--preset small|medium|large] [options]
+
+History is written with `git fast-import`, so even tens of thousands of
+commits only take a few seconds. What you get:
+
+- `--files` tracked text files spread over `--depth` levels of directories,
+  plus one chain of `--deep` nested directories
+- `--commits` commits; most touch one small file, and every so often one
+  rewrites part of HOT_FILE, so that blame and annotations have some
+  history to chew through
+- `--binaries` blobs of `--binary-mb` MB of random bytes
+- `--modified` tracked files changed in the worktree, `--untracked` new
+  files, and `--ignored` files matched by .gitignore
+- `--submodules` small submodules, each with an ignored file of its own
+
+Everything is derived from `--seed`, so two runs with the same options give
+the same trees (commit ids differ only if git itself changes).
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import argparse
+import json
+import os
+import random
+import subprocess
+import sys
+
+HOT_FILE = 'src/hot.py'
+HOT_LINES = 2000
+
+PRESETS = {
+    'small': {
+        'files': 2000, 'commits': 500, 'depth': 3, 'deep': 20, 'binaries': 1, 'binary_mb': 1,
+        'modified': 50, 'untracked': 200, 'ignored': 200, 'submodules': 1,
+    },
+    'medium': {
+        'files': 20000, 'commits': 5000, 'depth': 4, 'deep': 40, 'binaries': 2, 'binary_mb': 8,
+        'modified': 500, 'untracked': 2000, 'ignored': 2000, 'submodules': 2,
+    },
+    'large': {
+        'files': 100000, 'commits': 50000, 'depth': 5, 'deep': 80, 'binaries': 4, 'binary_mb': 32,
+        'modified': 2000, 'untracked': 20000, 'ignored': 10000, 'submodules': 3,
+    },
+}
+
+# no user or system config, so results don't depend on who runs this
+GIT_ENV = dict(
+    os.environ,
+    GIT_CONFIG_NOSYSTEM='1',
+    GIT_CONFIG_GLOBAL=os.devnull,
+    GIT_AUTHOR_NAME='Bench Mark', GIT_AUTHOR_EMAIL='bench@example.com',
+    GIT_COMMITTER_NAME='Bench Mark', GIT_COMMITTER_EMAIL='bench@example.com',
+)
+
+WORDS = (
+    'alpha beta gamma delta epsilon zeta eta theta iota kappa lambda mu nu xi '
+    'omicron pi rho sigma tau upsilon phi chi psi omega'
+).split()
+
+
+def git(cwd, *args, **kwargs):
+    return subprocess.check_output(('git',) + args, cwd=cwd, env=GIT_ENV, **kwargs)
+
+
+def tracked_path(index, depth, fanout=16):
+    parts = ['tree']
+    for level in range(depth):
+        parts.append('d%x' % ((index // (fanout ** level)) % fanout))
+    parts.append('file%d.txt' % index)
+    return '/'.join(parts)
+
+
+def text_line(rng, number):
+    return '%d %s\n' % (number, ' '.join(rng.choice(WORDS) for _ in range(rng.randint(3, 10))))
+
+
+def text_file(rng, lines):
+    return ''.join(text_line(rng, number) for number in range(lines)).encode('utf-8')
+
+
+def hot_file(rng, lines=HOT_LINES):
+    return ['def line_%d():  # %s\n' % (number, rng.choice(WORDS)) for number in range(lines)]
+
+
+class FastImport(object):
+    def __init__(self, repo):
+        self.proc = subprocess.Popen(
+            ['git', 'fast-import', '--quiet', '--done'],
+            cwd=repo, env=GIT_ENV, stdin=subprocess.PIPE
+        )
+        self.write = self.proc.stdin.write
+        self.timestamp = 1500000000
+        self.mark = 0
+
+    def commit(self, message, files, parent=True):
+        # files: {path: bytes}
+        self.mark += 1
+        self.timestamp += 600
+        message = message.encode('utf-8')
+        self.write(b'commit refs/heads/master\n')
+        self.write(b'mark :%d\n' % self.mark)
+        self.write(b'author Bench Mark <bench@example.com> %d +0000\n' % self.timestamp)
+        self.write(b'committer Bench Mark <bench@example.com> %d +0000\n' % self.timestamp)
+        self.write(b'data %d\n%s\n' % (len(message), message))
+        if parent and self.mark > 1:
+            self.write(b'from :%d\n' % (self.mark - 1))
+        for path, data in files.items():
+            self.write(b'M 100644 inline ' + path.encode('utf-8') + b'\n')
+            self.write(b'data %d\n' % len(data))
+            self.write(data)
+            self.write(b'\n')
+        self.write(b'\n')
+
+    def close(self):
+        self.write(b'done\n')
+        self.proc.stdin.close()
+        if self.proc.wait():
+            raise RuntimeError('git fast-import failed')
+
+
+def write_file(root, path, data):
+    full = os.path.join(root, path)
+    directory = os.path.dirname(full)
+    if not os.path.isdir(directory):
+        os.makedirs(directory)
+    with open(full, 'wb') as f:
+        f.write(data)
+
+
+def make_submodule(dest, index, rng):
+    path = dest + '-submodules/sub%d' % index
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    git(path, 'init', '-q', '-b', 'master')
+    with open(os.path.join(path, '.gitignore'), 'w') as f:
+        f.write('*.log\n')
+    for number in range(20):
+        write_file(path, 'lib/module%d.txt' % number, text_file(rng, 20))
+    git(path, 'add', '.')
+    git(path, 'commit', '-q', '-m', 'Initial commit of sub%d' % index)
+    return path
+
+
+def generate(dest, files, commits, depth, deep, binaries, binary_mb, modified, untracked, ignored, submodules, seed=1):
+    rng = random.Random(seed)
+    if os.path.exists(dest) and os.listdir(dest):
+        raise ValueError('%s already exists and is not empty' % dest)
+    if not os.path.isdir(dest):
+        os.makedirs(dest)
+    git(dest, 'init', '-q', '-b', 'master')
+
+    importer = FastImport(dest)
+    initial = {
+        '.gitignore': b'*.log\nbuild/\n',
+        HOT_FILE: ''.join(hot_file(rng)).encode('utf-8'),
+    }
+    paths = []
+    for index in range(files):
+        path = tracked_path(index, depth)
+        paths.append(path)
+        initial[path] = text_file(rng, rng.randint(5, 40))
+    deep_dir = '/'.join(['deep'] + ['level%d' % level for level in range(deep)])
+    initial[deep_dir + '/bottom.txt'] = text_file(rng, 10)
+    for index in range(binaries):
+        initial['assets/blob%d.bin' % index] = os.urandom(binary_mb * 1024 * 1024)
+    importer.commit('Initial import', initial)
+
+    hot = hot_file(rng)
+    # rewriting the whole of HOT_FILE is expensive, so only do it often
+    # enough to give it a few hundred commits' worth of history
+    hot_every = max(1, commits // 400)
+    for number in range(1, commits):
+        changes = {}
+        if number % hot_every == 0:
+            start = rng.randrange(len(hot))
+            for line in range(start, min(len(hot), start + rng.randint(1, 20))):
+                hot[line] = 'def line_%d():  # %s %d\n' % (line, rng.choice(WORDS), number)
+            changes[HOT_FILE] = ''.join(hot).encode('utf-8')
+        else:
+            changes[rng.choice(paths)] = text_file(rng, rng.randint(5, 40))
+        importer.commit('Change %d: %s' % (number, ' '.join(rng.sample(WORDS, 4))), changes)
+    importer.close()
+    git(dest, 'reset', '-q', '--hard', 'master')
+
+    for index in range(submodules):
+        path = make_submodule(dest, index, rng)
+        git(dest, '-c', 'protocol.file.allow=always', 'submodule', 'add', '-q', path, 'modules/sub%d' % index)
+        write_file(dest, 'modules/sub%d/debug.log' % index, b'ignored inside a submodule\n')
+    if submodules:
+        git(dest, 'commit', '-q', '-m', 'Add submodules')
+
+    for path in rng.sample(paths, min(modified, len(paths))):
+        with open(os.path.join(dest, path), 'ab') as f:
+            f.write(b'locally modified\n')
+    for index in range(untracked):
+        write_file(dest, 'untracked/u%d/new%d.txt' % (index % 50, index), b'untracked\n')
+    for index in range(ignored):
+        if index % 2:
+            write_file(dest, 'build/out%d.o' % index, b'ignored\n')
+        else:
+            write_file(dest, 'logs/run%d.log' % index, b'ignored\n')
+
+    return {
+        'path': dest,
+        'files': files + 2 + binaries,
+        'commits': commits + (1 if submodules else 0),
+        'depth': depth,
+        'deep': deep,
+        'binaries': binaries,
+        'binary_mb': binary_mb,
+        'modified': min(modified, len(paths)),
+        'untracked': untracked,
+        'ignored': ignored,
+        'submodules': submodules,
+        'seed': seed,
+    }
+
+
+def add_arguments(parser, default_preset='small'):
+    parser.add_argument('--preset', choices=sorted(PRESETS), default=default_preset)
+    for name in sorted(PRESETS['small']):
+        parser.add_argument('--' + name.replace('_', '-'), type=int, dest=name,
+                            help='overrides the preset')
+    parser.add_argument('--seed', type=int, default=1)
+
+
+def options_from(args):
+    options = dict(PRESETS[args.preset])
+    for name in options:
+        if getattr(args, name) is not None:
+            options[name] = getattr(args, name)
+    options['seed'] = args.seed
+    return options
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('dest')
+    add_arguments(parser)
+    args = parser.parse_args()
+    try:
+        summary = generate(os.path.abspath(args.dest), **options_from(args))
+    except (ValueError, RuntimeError, subprocess.CalledProcessError) as e:
+        print(e, file=sys.stderr)
+        sys.exit(1)
+    print(json.dumps(summary, indent=2, sort_keys=True))
+
+
+if __name__ == '__main__':
+    main()
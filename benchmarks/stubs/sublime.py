@@ -0,0 +1,527 @@
+"""Just enough of the Sublime Text API to import and drive the plugin headless
+
+Callbacks passed to set_timeout go on a queue which run_pending() drains
+once they're due, standing in for the editor's main thread. Views keep
+their text in a plain string, and record whatever the plugin does to them
+(regions, status entries, names) so benchmarks can check that a command got
+as far as they expect.
+"""
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import bisect
+import heapq
+import io
+import itertools
+import threading
+import time
+
+HIDDEN = 128
+DRAW_EMPTY_AS_OVERWRITE = 256
+MONOSPACE_FONT = 1
+
+_main_queue = []  # heap of (due, sequence, callback)
+_main_sequence = itertools.count()
+_main_lock = threading.Condition()
+_settings = {}
+_windows = []
+
+
+def version():
+    return '3211'
+
+
+def set_timeout(callback, delay=0):
+    with _main_lock:
+        heapq.heappush(_main_queue, (time.time() + delay / 1000, next(_main_sequence), callback))
+        _main_lock.notify()
+
+
+set_timeout_async = set_timeout
+
+
+def pending_timeouts():
+    with _main_lock:
+        return len(_main_queue)
+
+
+def run_pending(wait=0):
+    """Run main-thread callbacks which are due; returns how many ran
+
+    With wait, waits up to that many seconds for one to come due first.
+    """
+    callbacks = []
+    with _main_lock:
+        now = time.time()
+        if wait and not (_main_queue and _main_queue[0][0] <= now):
+            timeout = wait
+            if _main_queue:
+                timeout = min(wait, _main_queue[0][0] - now)
+            _main_lock.wait(timeout)
+            now = time.time()
+        while _main_queue and _main_queue[0][0] <= now:
+            callbacks.append(heapq.heappop(_main_queue)[2])
+    for callback in callbacks:
+        callback()
+    return len(callbacks)
+
+
+def platform():
+    return 'linux'
+
+
+def status_message(message):
+    pass
+
+
+def error_message(message):
+    print('error_message:', message)
+
+
+def message_dialog(message):
+    print('message_dialog:', message)
+
+
+def ok_cancel_dialog(message, ok_title=''):
+    return True
+
+
+def active_window():
+    return _windows[-1] if _windows else None
+
+
+def windows():
+    return list(_windows)
+
+
+class Settings(object):
+    def __init__(self, values=None):
+        self.values = dict(values or {})
+        self.callbacks = {}
+
+    def get(self, key, default=None):
+        return self.values.get(key, default)
+
+    def set(self, key, value):
+        self.values[key] = value
+        for callback in list(self.callbacks.values()):
+            callback()
+
+    def erase(self, key):
+        self.values.pop(key, None)
+
+    def has(self, key):
+        return key in self.values
+
+    def add_on_change(self, tag, callback):
+        self.callbacks[tag] = callback
+
+    def clear_on_change(self, tag):
+        self.callbacks.pop(tag, None)
+
+
+def load_settings(name):
+    if name not in _settings:
+        _settings[name] = Settings()
+    return _settings[name]
+
+
+class Region(object):
+    def __init__(self, a, b=None):
+        self.a = a
+        self.b = a if b is None else b
+
+    def begin(self):
+        return min(self.a, self.b)
+
+    def end(self):
+        return max(self.a, self.b)
+
+    def size(self):
+        return abs(self.b - self.a)
+
+    def empty(self):
+        return self.a == self.b
+
+    def contains(self, x):
+        if isinstance(x, Region):
+            return self.begin() <= x.begin() and x.end() <= self.end()
+        return self.begin() <= x <= self.end()
+
+    def __len__(self):
+        return self.size()
+
+    def __eq__(self, other):
+        return (self.a, self.b) == (other.a, other.b)
+
+    def __hash__(self):
+        return hash((self.a, self.b))
+
+    def __repr__(self):
+        return 'Region(%d, %d)' % (self.a, self.b)
+
+
+class Edit(object):
+    pass
+
+
+def _run_command(target, base, name, args):
+    import sublime_plugin
+    command = sublime_plugin.find_command(base, name)
+    if command is None:
+        # a built-in (save, goto_line, show_panel, ...); just note it
+        target.commands_run.append((name, args))
+        return
+    instance = command(target)
+    if base is sublime_plugin.TextCommand:
+        instance.run(Edit(), **(args or {}))
+    else:
+        instance.run(**(args or {}))
+
+
+class HistoricPosition(object):
+    def __init__(self, pt, row, col):
+        self.pt = pt
+        self.row = row
+        self.col = col
+
+
+class TextChange(object):
+    def __init__(self, a, b, text):
+        self.a = a
+        self.b = b
+        self.str = text
+
+
+class Buffer(object):
+    """One per view (there are no clones here); TextChangeListeners attached
+    to it hear about insert(), erase() and replace(), but not set_text()"""
+
+    def __init__(self, view):
+        self.view = view
+        self.listeners = []
+
+    def id(self):
+        return self.view.buffer_id()
+
+    def primary_view(self):
+        return self.view
+
+
+class View(object):
+    _next_id = 1
+
+    def __init__(self, file_name=None, text='', window=None):
+        self._id = View._next_id
+        View._next_id += 1
+        self._file_name = file_name
+        self._window = window
+        self._settings = Settings()
+        self._dirty = False
+        self._name = ''
+        self._scratch = False
+        self._read_only = False
+        self._syntax = None
+        self._encoding = 'UTF-8'
+        self._viewport = (0.0, 0.0)
+        self._visible_lines = 60
+        self._text = ''
+        self._line_starts = None
+        self._sel = [Region(0)]
+        self._change_count = 0
+        self.regions = {}
+        self.statuses = {}
+        self.commands_run = []
+        self._buffer = Buffer(self)
+        self.set_text(text)
+
+    @classmethod
+    def from_file(cls, file_name, window=None):
+        with io.open(file_name, encoding='utf-8', errors='replace', newline='') as f:
+            return cls(file_name=file_name, text=f.read(), window=window)
+
+    def id(self):
+        return self._id
+
+    def is_valid(self):
+        return True
+
+    def buffer_id(self):
+        return self._id
+
+    def buffer(self):
+        return self._buffer
+
+    def file_name(self):
+        return self._file_name
+
+    def settings(self):
+        return self._settings
+
+    def is_dirty(self):
+        return self._dirty
+
+    def is_loading(self):
+        return False
+
+    def is_scratch(self):
+        return self._scratch
+
+    def set_scratch(self, scratch):
+        self._scratch = scratch
+
+    def is_read_only(self):
+        return self._read_only
+
+    def set_read_only(self, read_only):
+        self._read_only = read_only
+
+    def name(self):
+        return self._name
+
+    def set_name(self, name):
+        self._name = name
+
+    def set_syntax_file(self, syntax):
+        self._syntax = syntax
+        self._settings.set('syntax', syntax)
+
+    def encoding(self):
+        return self._encoding
+
+    def set_encoding(self, encoding):
+        self._encoding = encoding
+
+    def window(self):
+        return self._window
+
+    def change_count(self):
+        return self._change_count
+
+    def run_command(self, name, args=None):
+        import sublime_plugin
+        _run_command(self, sublime_plugin.TextCommand, name, args)
+
+    # text
+
+    def set_text(self, text):
+        """Replace the buffer wholesale, as if it had been edited"""
+        self._text = text
+        self._line_starts = None
+        self._change_count += 1
+
+    def size(self):
+        return len(self._text)
+
+    def substr(self, x):
+        if isinstance(x, Region):
+            return self._text[x.begin():x.end()]
+        return self._text[x:x + 1]
+
+    def _edit(self, begin, end, text):
+        a = HistoricPosition(begin, *self.rowcol(begin))
+        b = HistoricPosition(end, *self.rowcol(end))
+        self.set_text(self._text[:begin] + text + self._text[end:])
+        self._dirty = True
+        for listener in list(self._buffer.listeners):
+            listener.on_text_changed([TextChange(a, b, text)])
+
+    def insert(self, edit, point, text):
+        self._edit(point, point, text)
+        return len(text)
+
+    def erase(self, edit, region):
+        self._edit(region.begin(), region.end(), '')
+
+    def replace(self, edit, region, text):
+        self._edit(region.begin(), region.end(), text)
+
+    def _starts(self):
+        if self._line_starts is None:
+            starts = [0]
+            find = self._text.find
+            position = find('\n')
+            while position != -1:
+                starts.append(position + 1)
+                position = find('\n', position + 1)
+            self._line_starts = starts
+        return self._line_starts
+
+    def rowcol(self, point):
+        starts = self._starts()
+        row = bisect.bisect_right(starts, point) - 1
+        return row, point - starts[row]
+
+    def text_point(self, row, col):
+        starts = self._starts()
+        row = max(0, min(row, len(starts) - 1))
+        return min(starts[row] + col, len(self._text))
+
+    def line(self, x):
+        if isinstance(x, Region):
+            begin = self.line(x.begin()).begin()
+            return Region(begin, self.line(x.end()).end())
+        starts = self._starts()
+        row = bisect.bisect_right(starts, x) - 1
+        end = starts[row + 1] - 1 if row + 1 < len(starts) else len(self._text)
+        return Region(starts[row], end)
+
+    def full_line(self, x):
+        line = self.line(x)
+        end = line.end() + 1 if line.end() < len(self._text) else line.end()
+        return Region(line.begin(), end)
+
+    def lines(self, region):
+        starts = self._starts()
+        first = self.rowcol(region.begin())[0]
+        last = self.rowcol(region.end())[0]
+        return [self.line(starts[row]) for row in range(first, last + 1)]
+
+    def split_by_newlines(self, region):
+        return self.lines(region)
+
+    def find(self, pattern, start_point, flags=0):
+        import re
+        match = re.compile(pattern).search(self._text, start_point)
+        if match is None:
+            return Region(-1, -1)
+        return Region(match.start(), match.end())
+
+    # selection and viewport
+
+    def sel(self):
+        return self._sel
+
+    def show(self, x, show_surrounds=True):
+        pass
+
+    def show_at_center(self, x):
+        pass
+
+    def viewport_position(self):
+        return self._viewport
+
+    def set_viewport_position(self, xy, animate=True):
+        self._viewport = xy
+
+    def visible_region(self):
+        top = int(self._viewport[1])
+        starts = self._starts()
+        top = max(0, min(top, len(starts) - 1))
+        bottom = min(top + self._visible_lines, len(starts) - 1)
+        return Region(starts[top], self.line(starts[bottom]).end())
+
+    # decorations
+
+    def add_regions(self, key, regions, scope='', icon='', flags=0):
+        self.regions[key] = list(regions)
+
+    def get_regions(self, key):
+        return list(self.regions.get(key, []))
+
+    def erase_regions(self, key):
+        self.regions.pop(key, None)
+
+    def set_status(self, key, value):
+        self.statuses[key] = value
+
+    def get_status(self, key):
+        return self.statuses.get(key, '')
+
+    def erase_status(self, key):
+        self.statuses.pop(key, None)
+
+
+class Window(object):
+    _next_id = 1
+
+    def __init__(self, folders=None, project_data=None, project_file_name=None):
+        self._id = Window._next_id
+        Window._next_id += 1
+        self._folders = list(folders or [])
+        self._project_data = project_data
+        self._project_file_name = project_file_name
+        self._views = []
+        self._active_view = None
+        self.panels = {}
+        self.quick_panels = []
+        self.input_panels = []
+        self.commands_run = []
+        _windows.append(self)
+
+    def id(self):
+        return self._id
+
+    def close(self):
+        if self in _windows:
+            _windows.remove(self)
+
+    def folders(self):
+        return list(self._folders)
+
+    def project_data(self):
+        if self._project_data is None:
+            return {'folders': [{'path': folder} for folder in self._folders]}
+        return self._project_data
+
+    def set_project_data(self, data):
+        self._project_data = data
+
+    def project_file_name(self):
+        return self._project_file_name
+
+    def views(self):
+        return list(self._views)
+
+    def active_view(self):
+        return self._active_view
+
+    def focus_view(self, view):
+        self._active_view = view
+
+    def add_view(self, view):
+        view._window = self
+        self._views.append(view)
+        self._active_view = view
+        return view
+
+    def new_file(self):
+        return self.add_view(View())
+
+    def open_file(self, file_name, flags=0):
+        for view in self._views:
+            if view.file_name() == file_name:
+                self._active_view = view
+                return view
+        return self.add_view(View.from_file(file_name))
+
+    def find_open_file(self, file_name):
+        for view in self._views:
+            if view.file_name() == file_name:
+                return view
+        return None
+
+    def get_view_index(self, view):
+        if view in self._views:
+            return 0, self._views.index(view)
+        return -1, -1
+
+    def active_view_in_group(self, group):
+        return self._active_view if group == 0 else None
+
+    def get_output_panel(self, name):
+        if name not in self.panels:
+            self.panels[name] = View(window=self)
+        return self.panels[name]
+
+    create_output_panel = get_output_panel
+
+    def show_quick_panel(self, items, on_select, flags=0, selected_index=-1, on_highlight=None):
+        self.quick_panels.append((items, on_select))
+
+    def show_input_panel(self, caption, initial_text, on_done, on_change, on_cancel):
+        self.input_panels.append((caption, initial_text, on_done))
+        return View(window=self)
+
+    def run_command(self, name, args=None):
+        import sublime_plugin
+        _run_command(self, sublime_plugin.WindowCommand, name, args)
@@ -0,0 +1,61 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import re
+
+
+class EventListener(object):
+    pass
+
+
+class TextChangeListener(object):
+    @classmethod
+    def is_applicable(cls, buffer):
+        return False
+
+    def __init__(self):
+        self.buffer = None
+
+    def attach(self, buffer):
+        self.buffer = buffer
+        buffer.listeners.append(self)
+
+    def detach(self):
+        self.buffer.listeners.remove(self)
+        self.buffer = None
+
+    def is_attached(self):
+        return self.buffer is not None
+
+
+class TextCommand(object):
+    def __init__(self, view):
+        self.view = view
+
+
+class WindowCommand(object):
+    def __init__(self, window):
+        self.window = window
+
+
+def command_name(cls):
+    # GitScratchOutputCommand -> git_scratch_output, as the editor does it
+    name = cls.__name__
+    if name.endswith('Command'):
+        name = name[:-len('Command')]
+    return re.sub(r'(?<=[a-z0-9])([A-Z])', r'_\1', name).lower()
+
+
+def _subclasses(base):
+    for cls in base.__subclasses__():
+        yield cls
+        for subclass in _subclasses(cls):
+            yield subclass
+
+
+def find_command(base, name):
+    """The most recently defined loaded subclass of base called name, if any"""
+    found = None
+    for cls in _subclasses(base):
+        if command_name(cls) == name:
+            found = cls
+    return found
@@ -1,18 +1,29 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import codecs
 import os
 import re
 import sublime
 import sublime_plugin
-import threading
 import subprocess
 import functools
+import threading
 import os.path
 import time
 
+from .catfile import cat_file_server, format_object
+from .repostate import GitRootCache, repo_state
+from .scheduler import CommandScheduler, is_read_only
+from . import telemetry
+
 
-git_root_cache = {}
+_root_cache = GitRootCache()
 _has_warned = False
+_scheduler = None
+
+# Timeout for things like the status bar and annotations, which run in the
+# background and are pointless if they take this long
+BACKGROUND_TIMEOUT = 30
 
 
 # Goal is to get: "Packages/Git", allowing for people who rename things
@@ -49,31 +60,7 @@ def open_url(url):
 
 
 def git_root(directory):
-    global git_root_cache
-
-    retval = False
-    leaf_dir = directory
-
-    if leaf_dir in git_root_cache and git_root_cache[leaf_dir]['expires'] > time.time():
-        return git_root_cache[leaf_dir]['retval']
-
-    while directory:
-        if os.path.exists(os.path.join(directory, '.git')):
-            retval = directory
-            break
-        parent = os.path.realpath(os.path.join(directory, os.path.pardir))
-        if parent == directory:
-            # /.. == /
-            retval = False
-            break
-        directory = parent
-
-    git_root_cache[leaf_dir] = {
-        'retval': retval,
-        'expires': time.time() + 5
-    }
-
-    return retval
+    return _root_cache.lookup(directory)
 
 
 # for readability code
@@ -126,6 +113,30 @@ def _make_text_safeish(text, fallback_encoding, method='decode'):
     return unitext
 
 
+class _SafeishDecoder(object):
+    # Incremental version of _make_text_safeish, for output that arrives in
+    # chunks: decode as utf-8 until that fails, then switch over to the
+    # fallback encoding for the rest of the stream.
+    def __init__(self, fallback_encoding):
+        self.decoder = codecs.getincrementaldecoder('utf-8')()
+        self.fallback_encoding = fallback_encoding
+        self.fallen_back = False
+
+    def decode(self, data, final=False):
+        try:
+            return self.decoder.decode(data, final)
+        except UnicodeDecodeError:
+            if self.fallen_back:
+                raise
+            pending = self.decoder.getstate()[0]
+            try:
+                self.decoder = codecs.getincrementaldecoder(self.fallback_encoding or 'utf-8')('replace')
+            except LookupError:
+                self.decoder = codecs.getincrementaldecoder('utf-8')('replace')
+            self.fallen_back = True
+            return self.decoder.decode(pending + data, final)
+
+
 def _test_paths_for_executable(paths, test_file):
     for directory in paths:
         file_path = os.path.join(directory, test_file)
@@ -165,19 +176,153 @@ GIT = find_binary('git')
 GITK = find_binary('gitk')
 
 
+class ExecutionContext(object):
+    # Everything run_command needs to know about how to start git, which
+    # otherwise means loading two settings files and copying os.environ for
+    # every single command. It's built once and thrown away when the settings
+    # change (see execution_context). The settings involved are global, so
+    # one context serves every repo.
+    def __init__(self):
+        s = sublime.load_settings("Git.sublime-settings")
+        us = sublime.load_settings('Preferences.sublime-settings')
+        self.path = os.environ.get('PATH', '')
+        self.git = s.get('git_command') or us.get('git_binary') or find_binary('git') or 'git'
+        self.gitk = s.get('gitk_command') or 'gitk'
+        self.git_flow = s.get('git_flow_command')
+        self.save_first = s.get('save_first')
+        self.timeout = s.get('command_timeout')
+
+        # Windows needs startupinfo in order to start process in background
+        self.startupinfo = None
+        if os.name == 'nt':
+            self.startupinfo = subprocess.STARTUPINFO()
+            self.startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
+
+        env = os.environ.copy()
+        # there's nowhere for git to ask for credentials, so fail rather than
+        # hang forever waiting on a terminal prompt (askpass helpers still work)
+        env[str('GIT_TERMINAL_PROMPT')] = str('0')
+
+        self.shell = False
+        if sublime.platform() == 'windows':
+            self.shell = True
+            if 'HOME' not in env:
+                env[str('HOME')] = str(env['HOMEDRIVE']) + str(env['HOMEPATH'])
+        self.env = env
+
+    def resolve(self, command):
+        # swap the bare command name for the configured binary
+        if command[0] == 'git':
+            if command[1] == 'flow' and self.git_flow:
+                command[0] = self.git_flow
+                del(command[1])
+            else:
+                command[0] = self.git
+        if command[0] == 'gitk':
+            command[0] = self.gitk
+        return command
+
+
+_execution_context = None
+
+
+def _settings_changed():
+    global _execution_context
+    _execution_context = None
+
+
+def execution_context():
+    global _execution_context
+    context = _execution_context
+    if context is None or context.path != os.environ.get('PATH', ''):
+        if context is None:
+            for name in ("Git.sublime-settings", 'Preferences.sublime-settings'):
+                settings = sublime.load_settings(name)
+                settings.clear_on_change('git-execution-context')
+                settings.add_on_change('git-execution-context', _settings_changed)
+        context = _execution_context = ExecutionContext()
+    return context
+
+
+_fallback_encodings = {}
+
+
+def parse_fallback_encoding(setting):
+    # "Western (Windows 1252)" -> "Windows 1252"
+    if setting not in _fallback_encodings:
+        _fallback_encodings[setting] = str(setting.rpartition('(')[2].rpartition(')')[0])
+    return _fallback_encodings[setting]
+
+
+def os_error_message(command, e):
+    print("OSError", e)
+    output = ''
+    if e.errno == 2:
+        global _has_warned
+        if not _has_warned:
+            _has_warned = True
+            output = "{cmd} binary could not be found in PATH\n\nConsider using the {cmd_setting}_command setting for the Git plugin\n\nPATH is: {path}".format(cmd=command[0], cmd_setting=command[0].replace('-', '_'), path=os.environ['PATH'])
+    else:
+        output = e.strerror
+    return output
+
+
 def output_error_message(output, *args, **kwargs):
     # print('error', output, args, kwargs)
     sublime.error_message(output)
 
 
-class CommandThread(threading.Thread):
-    command_lock = threading.Lock()
+def get_scheduler():
+    global _scheduler
+    if _scheduler is None:
+        s = sublime.load_settings("Git.sublime-settings")
+        _scheduler = CommandScheduler(
+            max_workers=s.get('max_concurrent_commands', 4),
+            max_per_repo=s.get('max_concurrent_commands_per_repo', 2)
+        )
+    return _scheduler
+
+
+class CommandHandle(object):
+    # What run_command gives back. Cancelling it means its callbacks won't be
+    # called; if nobody else is waiting on the same command (see coalescing,
+    # below) the command is dropped from the queue or its process killed.
+    def __init__(self, thread, supersede=None):
+        self.thread = thread
+        self.supersede = supersede
+        self.cancelled = False
+
+    def cancel(self):
+        if not self.cancelled:
+            self.cancelled = True
+            self.thread.unsubscribe()
+
+
+class CommandThread(object):
+    # Not actually a thread any more: start() hands it over to the scheduler,
+    # which runs it on one of its workers once the repo is free.
 
-    def __init__(self, command, on_done, working_dir="", fallback_encoding="", error_suppresses_output=False, **kwargs):
-        threading.Thread.__init__(self)
+    # Identical read-only commands which are queued or running at the same
+    # time share a single process; see start()
+    in_flight = {}
+    in_flight_lock = threading.Lock()
+    stats = {'spawned': 0, 'coalesced': 0}
+
+    # supersede key -> the newest CommandHandle started with it
+    superseding = {}
+
+    stream_batch_lines = 2000
+    stream_batch_seconds = 0.1
+
+    def __init__(self, command, on_done, working_dir="", fallback_encoding="", error_suppresses_output=False, read_only=None, stream=None, supersede=None, timeout=None, context=None, source=None, parse=None, **kwargs):
         self.command = command
+        self.context = context or execution_context()
         self.on_done = on_done
         self.working_dir = working_dir
+        self.repo = (working_dir and git_root(working_dir)) or working_dir
+        if read_only is None:
+            read_only = is_read_only(command)
+        self.exclusive = not read_only
         if "stdin" in kwargs:
             self.stdin = kwargs["stdin"].encode()
         else:
@@ -189,47 +334,152 @@ class CommandThread(threading.Thread):
         self.fallback_encoding = fallback_encoding
         self.error_suppresses_output = error_suppresses_output
         self.kwargs = kwargs
+        self.stream = stream
+        # turns the output into what on_done gets, on the worker thread, so
+        # big outputs aren't picked apart on the main one
+        self.parse = parse
+        self.timeout = timeout
+        self.timed_out = False
+        self.proc = None
+        self.cancelled = False
+        self.handle = CommandHandle(self, supersede)
+        self.subscribers = [(self.handle, on_done, kwargs)]
+        self.timing = telemetry.CommandTiming(command, self.repo, source)
+        self.coalesce_key = None
+        if not self.exclusive and self.stdin is None and "stdout" not in kwargs and stream is None:
+            self.coalesce_key = (tuple(command), working_dir, fallback_encoding, error_suppresses_output, parse)
+
+    def start(self):
+        handle = self.handle
+        if handle.supersede is not None:
+            # a newer request for the same thing makes the older one moot
+            previous = self.superseding.get(handle.supersede)
+            self.superseding[handle.supersede] = handle
+            if previous is not None:
+                previous.cancel()
+        # If the same read is already waiting for (or producing) its output,
+        # just ask for a copy of that instead of running git again
+        if self.coalesce_key is not None:
+            with self.in_flight_lock:
+                existing = self.in_flight.get(self.coalesce_key)
+                if existing is not None and not existing.cancelled:
+                    handle.thread = existing
+                    existing.subscribers.append((handle, self.on_done, self.kwargs))
+                    existing.timing.subscribers += 1
+                    self.stats['coalesced'] += 1
+                    return handle
+                self.in_flight[self.coalesce_key] = self
+        self.stats['spawned'] += 1
+        get_scheduler().submit(self)
+        return handle
+
+    def unsubscribe(self):
+        with self.in_flight_lock:
+            if [handle for handle, on_done, kwargs in self.subscribers if not handle.cancelled]:
+                return
+            self.cancelled = True
+            if self.in_flight.get(self.coalesce_key) is self:
+                del self.in_flight[self.coalesce_key]
+        if not get_scheduler().discard(self):
+            # already running, so stop it
+            self.kill()
+
+    def kill(self):
+        with self.in_flight_lock:
+            proc = self.proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def expire(self):
+        self.timed_out = True
+        self.kill()
+
+    def deliver(self, callback, output):
+        with self.in_flight_lock:
+            if self.in_flight.get(self.coalesce_key) is self:
+                del self.in_flight[self.coalesce_key]
+            subscribers = list(self.subscribers)
+        if callback is None:
+            return
+        telemetry.record(self.timing)
+        if callback is output_error_message:
+            main_thread(callback, output, **self.kwargs)
+            return
+        for handle, on_done, kwargs in subscribers:
+            main_thread(self.call, handle, on_done, output, kwargs)
+
+    def call(self, handle, on_done, output, kwargs):
+        # on the main thread; the handle may have been cancelled since the
+        # output was queued up for delivery
+        if self.superseding.get(handle.supersede) is handle:
+            del self.superseding[handle.supersede]
+        if not handle.cancelled:
+            started = telemetry.clock()
+            on_done(output, **kwargs)
+            self.timing.callback_seconds += telemetry.clock() - started
+
+    def call_stream(self, lines):
+        if not self.handle.cancelled:
+            started = telemetry.clock()
+            self.stream(lines, **self.kwargs)
+            self.timing.callback_seconds += telemetry.clock() - started
 
     def run(self):
         # Ignore directories that no longer exist
-        if not os.path.isdir(self.working_dir):
+        if self.cancelled or not os.path.isdir(self.working_dir):
+            self.deliver(None, None)
             return
 
-        self.command_lock.acquire()
         output = ''
         callback = self.on_done
+        timer = None
+        timing = self.timing
+        timing.started = telemetry.clock()
         try:
             cwd = None
             if self.working_dir != "":
                 cwd = self.working_dir
-            # Windows needs startupinfo in order to start process in background
-            startupinfo = None
-            if os.name == 'nt':
-                startupinfo = subprocess.STARTUPINFO()
-                startupinfo.dwFlags |= subprocess.STARTF_USESHOWWINDOW
-
-            env = os.environ.copy()
-
-            shell = False
-            if sublime.platform() == 'windows':
-                shell = True
-                if 'HOME' not in env:
-                    env[str('HOME')] = str(env['HOMEDRIVE']) + str(env['HOMEPATH'])
+            context = self.context
 
             # universal_newlines seems to break `log` in python3
             proc = subprocess.Popen(
                 self.command,
                 stdout=self.stdout, stderr=subprocess.STDOUT,
-                stdin=subprocess.PIPE, startupinfo=startupinfo,
-                shell=shell, universal_newlines=False,
-                env=env, cwd=cwd
+                stdin=subprocess.PIPE, startupinfo=context.startupinfo,
+                shell=context.shell, universal_newlines=False,
+                env=context.env, cwd=cwd
             )
-            output = proc.communicate(self.stdin)[0]
+            timing.spawned = telemetry.clock()
+            with self.in_flight_lock:
+                self.proc = proc
+            if self.cancelled:
+                # cancelled while we were starting it up
+                self.kill()
+            if self.timeout:
+                timer = threading.Timer(self.timeout, self.expire)
+                timer.daemon = True
+                timer.start()
+            if self.stream:
+                output = self.read_stream(proc)
+            else:
+                output = proc.communicate(self.stdin)[0]
+                timing.output_size = len(output or b'')
+            timing.exited = telemetry.clock()
             if self.error_suppresses_output and proc.returncode is not None and proc.returncode > 0:
                 output = False
             if not output:
                 output = ''
             output = _make_text_safeish(output, self.fallback_encoding)
+            timing.decoded = telemetry.clock()
+            if self.timed_out:
+                print("Git: command timed out", self.command)
+                output = '' if self.error_suppresses_output else "{0} timed out after {1} seconds\n\n{2}".format(' '.join(self.command), self.timeout, output)
+            if self.parse is not None and proc.returncode == 0 and not self.timed_out:
+                # (what a failed command said is passed on as it is)
+                output = self.parse(output)
         except subprocess.CalledProcessError as e:
             print("CalledProcessError", e)
             if self.error_suppresses_output:
@@ -237,65 +487,224 @@ class CommandThread(threading.Thread):
             else:
                 output = e.returncode
         except OSError as e:
-            print("OSError", e)
-            callback = output_error_message
-            if e.errno == 2:
-                global _has_warned
-                if not _has_warned:
-                    _has_warned = True
-                    output = "{cmd} binary could not be found in PATH\n\nConsider using the {cmd_setting}_command setting for the Git plugin\n\nPATH is: {path}".format(cmd=self.command[0], cmd_setting=self.command[0].replace('-', '_'), path=os.environ['PATH'])
+            callback, output = self.os_error(e)
+        finally:
+            if timer is not None:
+                timer.cancel()
+            self.deliver(None if self.cancelled else callback, output)
+
+    def read_stream(self, proc):
+        # Hand stdout to the stream callback in batches of lines as it comes
+        # in, rather than waiting for the end and holding it all in memory.
+        if self.stdin:
+            proc.stdin.write(self.stdin)
+        proc.stdin.close()
+        decoder = _SafeishDecoder(self.fallback_encoding)
+        fd = proc.stdout.fileno()
+        partial = ''
+        batch = []
+        flushed = time.time()
+        while True:
+            chunk = os.read(fd, 65536)
+            self.timing.output_size += len(chunk)
+            final = not chunk
+            lines = (partial + decoder.decode(chunk, final)).split('\n')
+            partial = lines.pop()
+            if final and partial:
+                lines.append(partial)
+            batch.extend(lines)
+            if batch and (final or len(batch) >= self.stream_batch_lines or time.time() - flushed >= self.stream_batch_seconds):
+                main_thread(self.call_stream, batch)
+                batch = []
+                flushed = time.time()
+            if final:
+                break
+        proc.stdout.close()
+        proc.wait()
+        # everything's already been delivered
+        return ''
+
+    def os_error(self, e):
+        return output_error_message, os_error_message(self.command, e)
+
+
+class CatFileThread(CommandThread):
+    # Reads objects through the repo's long-lived `git cat-file --batch`
+    # process instead of spawning `git show` for each one. `formatter` gets
+    # the list of (spec, (oid, type, bytes)) pairs and returns the bytes to
+    # decode and pass back; missing objects are left out.
+    def __init__(self, git, specs, on_done, formatter=None, **kwargs):
+        CommandThread.__init__(self, [git, 'cat-file', '--batch'], on_done, read_only=True, **kwargs)
+        # the command line is the same whatever's being read
+        self.coalesce_key = None
+        self.specs = specs
+        self.formatter = formatter or self.show
+        self.server = None
+
+    def show(self, objects):
+        return b''.join(format_object(spec, obj) for spec, obj in objects)
+
+    def kill(self):
+        # the process is shared, so only stop it if it's busy with our read
+        server = self.server
+        if server is not None:
+            server.abort(self)
+
+    def run(self):
+        if self.cancelled or not os.path.isdir(self.working_dir):
+            self.deliver(None, None)
+            return
+
+        output = ''
+        callback = self.on_done
+        timer = None
+        timing = self.timing
+        timing.started = telemetry.clock()
+        try:
+            server = cat_file_server(self.command[0], self.repo, env=self.context.env, startupinfo=self.context.startupinfo)
+            self.server = server
+            if self.timeout:
+                timer = threading.Timer(self.timeout, self.expire)
+                timer.daemon = True
+                timer.start()
+            objects = []
+            missing = []
+            for spec in self.specs:
+                if self.cancelled or self.timed_out:
+                    break
+                obj = server.read(spec, self)
+                if obj is None:
+                    missing.append(spec)
+                else:
+                    objects.append((spec, obj))
+                    timing.output_size += len(obj[2])
+            timing.exited = telemetry.clock()
+            if missing and not self.error_suppresses_output:
+                output = ''.join("fatal: Not a valid object name {0}\n".format(spec) for spec in missing)
             else:
-                output = e.strerror
+                output = _make_text_safeish(self.formatter(objects), self.fallback_encoding)
+            timing.decoded = telemetry.clock()
+        except (IOError, OSError) as e:
+            if not (self.cancelled or self.timed_out):
+                callback, output = self.os_error(e)
+        except ValueError as e:
+            # cat-file said something we couldn't make sense of
+            print("Git: unexpected output from git cat-file", e)
+            output = None if self.error_suppresses_output else "git cat-file failed: {0}\n".format(e)
         finally:
-            self.command_lock.release()
-            main_thread(callback, output, **self.kwargs)
+            if timer is not None:
+                timer.cancel()
+            if self.timed_out:
+                print("Git: command timed out", self.command)
+                callback = self.on_done
+                output = None if self.error_suppresses_output else "{0} timed out after {1} seconds\n".format(' '.join(self.command), self.timeout)
+            self.deliver(None if self.cancelled else callback, output)
 
 
 # A base for all commands
 class GitCommand(object):
     may_change_files = False
 
+    def _command_kwargs(self, kwargs):
+        if 'working_dir' not in kwargs:
+            kwargs[str('working_dir')] = str(self.get_working_dir())
+        if 'fallback_encoding' not in kwargs:
+            view = self.active_view()
+            fallback_encoding = view and view.settings().get('fallback_encoding')
+            if fallback_encoding:
+                kwargs[str('fallback_encoding')] = parse_fallback_encoding(fallback_encoding)
+        return kwargs
+
     def run_command(self, command, callback=None, show_status=True, filter_empty_args=True, no_save=False, **kwargs):
         if filter_empty_args:
             command = [arg for arg in command if arg]
-        if 'working_dir' not in kwargs:
-            kwargs[str('working_dir')] = str(self.get_working_dir())
-        if 'fallback_encoding' not in kwargs and self.active_view() and self.active_view().settings().get('fallback_encoding'):
-            kwargs[str('fallback_encoding')] = str(self.active_view().settings().get('fallback_encoding').rpartition('(')[2].rpartition(')')[0])
+        self._command_kwargs(kwargs)
 
-        s = sublime.load_settings("Git.sublime-settings")
-        if (
-            s.get('save_first')
-            and self.active_view()
-            and self.active_view().file_name()
-            and self.active_view().is_dirty()
-            and not no_save
-        ):
-            self.active_view().run_command('save')
-        if command[0] == 'git':
-            if command[1] == 'flow' and s.get('git_flow_command'):
-                command[0] = s.get('git_flow_command')
-                del(command[1])
-            else:
-                us = sublime.load_settings('Preferences.sublime-settings')
-                if s.get('git_command') or us.get('git_binary'):
-                    command[0] = s.get('git_command') or us.get('git_binary')
-                elif GIT:
-                    command[0] = GIT
-        if command[0] == 'gitk' and s.get('gitk_command'):
-            if s.get('gitk_command'):
-                command[0] = s.get('gitk_command')
-            elif GITK:
-                command[0] = GITK
+        self.save_first(no_save)
+        context = execution_context()
+        command = context.resolve(command)
         if not callback:
             callback = self.generic_done
+        if 'timeout' not in kwargs:
+            kwargs[str('timeout')] = context.timeout
+        if 'source' not in kwargs:
+            kwargs[str('source')] = self.__class__.__name__
 
-        thread = CommandThread(command, callback, **kwargs)
-        thread.start()
+        thread = CommandThread(command, callback, context=context, **kwargs)
+        handle = thread.start()
 
         if show_status:
             message = kwargs.get('status_message', False) or ' '.join(command)
             sublime.status_message(message)
+        return handle
+
+    def launch(self, command, working_dir=None, no_save=False):
+        # Start an interactive tool (gitk, git gui, difftool) and leave it
+        # be: it stays open as long as the user wants, so it mustn't go
+        # through the scheduler and tie up a worker, and there's no output
+        # worth waiting for
+        self.save_first(no_save)
+        context = execution_context()
+        command = context.resolve([arg for arg in command if arg])
+        if working_dir is None:
+            working_dir = self.get_working_dir()
+        try:
+            devnull = open(os.devnull, 'r+b')
+            try:
+                proc = subprocess.Popen(
+                    command,
+                    stdout=devnull, stderr=devnull, stdin=devnull,
+                    startupinfo=context.startupinfo, shell=context.shell,
+                    env=context.env, cwd=working_dir or None
+                )
+            finally:
+                devnull.close()
+        except OSError as e:
+            output = os_error_message(command, e)
+            if output:
+                output_error_message(output)
+            return None
+        # reap it once it exits, rather than leaving a zombie behind
+        reaper = threading.Thread(target=proc.wait)
+        reaper.daemon = True
+        reaper.start()
+        sublime.status_message(' '.join(command))
+        return proc
+
+    def save_first(self, no_save=False):
+        if (
+            not no_save
+            and execution_context().save_first
+            and self.active_view()
+            and self.active_view().file_name()
+            and self.active_view().is_dirty()
+        ):
+            self.active_view().run_command('save')
+
+    def repo_snapshot(self, callback, no_save=False, **kwargs):
+        # callback gets the repo's repostate.StatusSnapshot, which is shared
+        # and reused until something changes; kwargs go to run_command if
+        # git needs running
+        root = git_root(self.get_working_dir())
+        if not root:
+            return
+        self.save_first(no_save)
+        kwargs.setdefault(str('timeout'), execution_context().timeout)
+        run = functools.partial(self.run_command, no_save=True, working_dir=root, **kwargs)
+        repo_state(root).status_snapshot(run, callback, kwargs['timeout'])
+
+    def read_object(self, spec, callback=None, **kwargs):
+        # `git show <spec>` (or several), through the repo's long-lived
+        # `git cat-file --batch`, which is much cheaper for blob reads. With
+        # error_suppresses_output a read which failed gives None, unlike a
+        # missing object
+        self._command_kwargs(kwargs)
+        specs = spec if isinstance(spec, (list, tuple)) else [spec]
+        context = execution_context()
+        kwargs.setdefault(str('source'), self.__class__.__name__)
+        kwargs.setdefault(str('timeout'), context.timeout)
+        thread = CatFileThread(context.git, specs, callback or self.generic_done, context=context, **kwargs)
+        return thread.start()
 
     def generic_done(self, result, **kw):
         if self.may_change_files and self.active_view() and self.active_view().file_name():
@@ -317,11 +726,12 @@ class GitCommand(object):
             return
         self.panel(result)
 
-    def _output_to_view(self, output_file, output, clear=False, syntax="Packages/Diff/Diff.tmLanguage", **kwargs):
+    def _output_to_view(self, output_file, output, clear=False, syntax="Packages/Diff/Diff.tmLanguage", append=False, **kwargs):
         output_file.set_syntax_file(syntax)
         args = {
             'output': output,
-            'clear': clear
+            'clear': clear,
+            'append': append,
         }
         output_file.run_command('git_scratch_output', args)
 
@@ -337,6 +747,36 @@ class GitCommand(object):
         scratch_file.run_command('goto_line', {'line': focused_line})
         return scratch_file
 
+    def scratch_stream(self, command, title=False, focused_line=1, syntax="Packages/Diff/Diff.tmLanguage", empty_message=None, **kwargs):
+        # run_command + scratch, except that the scratch view fills in as
+        # the output arrives. The view is only created once there's something
+        # other than whitespace to put in it; otherwise empty_message (if
+        # any) goes to the panel.
+        state = {'view': None, 'leading': ''}
+
+        def on_lines(lines, **kw):
+            text = state['leading'] + '\n'.join(lines) + '\n'
+            view = state['view']
+            if view is None:
+                if not text.strip():
+                    state['leading'] = text
+                    return
+                view = state['view'] = self.scratch('', title=title, syntax=syntax)
+                state['leading'] = ''
+            view.set_read_only(False)
+            view.run_command('git_scratch_output', {'output': text, 'append': True})
+            view.set_read_only(True)
+
+        def on_done(result, **kw):
+            view = state['view']
+            if view is None:
+                if empty_message:
+                    self.panel(empty_message)
+                return
+            view.run_command('goto_line', {'line': focused_line})
+
+        self.run_command(command, on_done, stream=on_lines, **kwargs)
+
     def panel(self, output, **kwargs):
         if not hasattr(self, 'output_view'):
             self.output_view = self.get_window().get_output_panel("git")
@@ -383,7 +823,7 @@ class GitWindowCommand(GitCommand, sublime_plugin.WindowCommand):
     @property
     def fallback_encoding(self):
         if self.active_view() and self.active_view().settings().get('fallback_encoding'):
-            return self.active_view().settings().get('fallback_encoding').rpartition('(')[2].rpartition(')')[0]
+            return parse_fallback_encoding(self.active_view().settings().get('fallback_encoding'))
 
     # If there's no active view or the active view is not a file on the
     # filesystem (e.g. a search results view), we can infer the folder
@@ -1,47 +1,49 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
 import os
-import re
 
 import sublime
 from . import GitTextCommand, GitWindowCommand, git_root
-from .status import GitStatusCommand
+from . import diffparse
+from .status import GitStatusCommand, staged_entry
 
 
 class GitAddChoiceCommand(GitStatusCommand):
-    def status_filter(self, item):
-        return super(GitAddChoiceCommand, self).status_filter(item) and not item[1].isspace()
-
-    def show_status_list(self):
-        self.results = [
-            [" + All Files", "apart from untracked files"],
-            [" + All Files", "including untracked files"],
-        ] + [[a, ''] for a in self.results]
-        return super(GitAddChoiceCommand, self).show_status_list()
+    def status_filter(self, entry):
+        # only what's changed in the working tree
+        return super(GitAddChoiceCommand, self).status_filter(entry) and entry[0][1] != ' '
+
+    def status_list_header(self, prefix):
+        if prefix:
+            count = sum(1 for entry in self.entries if entry[1].startswith(prefix))
+            return [" + All %s Files in %s" % (format(count, ','), prefix)]
+        return [
+            " + All Files (apart from untracked files)",
+            " + All Files (including untracked files)",
+        ]
 
     def panel_followup(self, picked_status, picked_file, picked_index):
-        working_dir = git_root(self.get_working_dir())
-
-        if picked_index == 0:
-            command = ['git', 'add', '--update']
-        elif picked_index == 1:
-            command = ['git', 'add', '--all']
+        if picked_index is None:
+            entries = [(picked_status, picked_file, None)]
+        elif self.page.prefix:
+            entries = [entry for entry in self.entries if entry[1].startswith(self.page.prefix)]
+        elif picked_index == 0:
+            self.change_entries(
+                [(['git', 'add', '--update'], None)],
+                lambda entry: entry if entry[0] == '??' else staged_entry(entry)
+            )
+            return
         else:
-            command = ['git']
-            picked_file = picked_file.strip('"')
-            if os.path.exists(working_dir + "/" + picked_file):
-                command += ['add']
-            else:
-                command += ['rm']
-            command += ['--', picked_file]
+            self.change_entries([(['git', 'add', '--all'], None)], staged_entry)
+            return
 
-        self.run_command(
-            command, self.rerun,
-            working_dir=working_dir
-        )
-
-    def rerun(self, result):
-        self.run()
+        # what's gone from the working tree has to be staged with rm
+        working_dir = git_root(self.get_working_dir())
+        exists = [os.path.exists(working_dir + "/" + entry[1]) for entry in entries]
+        self.change_entries([
+            (['git', 'add'], [entry for entry, present in zip(entries, exists) if present]),
+            (['git', 'rm'], [entry for entry, present in zip(entries, exists) if not present]),
+        ], staged_entry)
 
 
 class GitAddSelectedHunkCommand(GitTextCommand):
@@ -56,33 +58,24 @@ class GitAddSelectedHunkCommand(GitTextCommand):
                 "end": self.view.rowcol(sel.end())[0] + 1,
             })
 
-        hunks = [{"diff": ""}]
-        i = 0
-        matcher = re.compile(r'^@@ -([0-9]*)(?:,([0-9]*))? \+([0-9]*)(?:,([0-9]*))? @@')
-        for line in result.splitlines():
-            if line.startswith('@@'):
-                i += 1
-                match = matcher.match(line)
-                start = int(match.group(3))
-                end = match.group(4)
-                if end:
-                    end = start + int(end)
-                else:
-                    end = start
-                hunks.append({"diff": "", "start": start, "end": end})
-            hunks[i]["diff"] += line + "\n"
-
-        diffs = hunks[0]["diff"]
-        hunks.pop(0)
-        selection_is_hunky = False
-        for hunk in hunks:
-            for sel in selection:
-                if sel["end"] < hunk["start"]:
-                    continue
-                if sel["start"] > hunk["end"]:
-                    continue
-                diffs += hunk["diff"]  # + "\n\nEND OF HUNK\n\n"
-                selection_is_hunky = True
+        # the file header, then whichever hunks the selection touches
+        patch = []
+        header = None
+        for record in diffparse.parse(result):
+            if isinstance(record, diffparse.FileHeader):
+                header = result[record.start:record.end]
+                continue
+            start = record.new_start
+            end = start + record.new_count
+            if any(sel["end"] >= start and sel["start"] <= end for sel in selection):
+                if header:
+                    patch.append(header)
+                    header = None
+                patch.append(result[record.start:record.end])
+        selection_is_hunky = bool(patch)
+        diffs = ''.join(patch)
+        if diffs and not diffs.endswith('\n'):
+            diffs += '\n'
 
         if selection_is_hunky:
             self.run_command(['git', 'apply', '--cached'], stdin=diffs)
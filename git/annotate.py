@@ -1,5 +1,8 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import bisect
+import collections
+import functools
 import tempfile
 import re
 import os
@@ -7,7 +10,32 @@ import codecs
 
 import sublime
 import sublime_plugin
-from . import git_root, GitTextCommand
+from . import git_root, view_contents, GitTextCommand, BACKGROUND_TIMEOUT
+from . import diffparse, linediff, telemetry, watcher
+from .repostate import repo_state
+
+# view id -> temporary files made for it by the "git" diff engine
+_temp_files = {}
+
+# (repo, commit, path) -> the file's lines at that commit. HEAD hardly ever
+# moves while someone's typing, so this saves asking git on every keystroke.
+HEAD_CACHE_SIZE = 16
+_head_lines = collections.OrderedDict()
+
+
+def cached_head_lines(key):
+    lines = _head_lines.pop(key, None)
+    if lines is not None:
+        # most recently used last
+        _head_lines[key] = lines
+    return lines
+
+
+def cache_head_lines(key, lines):
+    _head_lines.pop(key, None)
+    _head_lines[key] = lines
+    while len(_head_lines) > HEAD_CACHE_SIZE:
+        _head_lines.popitem(last=False)
 
 
 def temp_file(view, key):
@@ -15,12 +43,269 @@ def temp_file(view, key):
         fd, filepath = tempfile.mkstemp(prefix='git_annotations_')
         os.close(fd)
         view.settings().set('git_annotation_temp_%s' % key, filepath)
+        _temp_files.setdefault(view.id(), []).append(filepath)
     return view.settings().get('git_annotation_temp_%s' % key)
 
 
+def remove_temp_files(view_id=None):
+    # Those for one view, or all of them
+    if view_id is None:
+        paths = [path for paths in _temp_files.values() for path in paths]
+        _temp_files.clear()
+    else:
+        paths = _temp_files.pop(view_id, [])
+    for path in paths:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class DirtyRows(object):
+    # Which rows of a buffer have changed since its Alignment was last
+    # brought up to date, going by the editor's text change events: rows
+    # start..end (inclusive) now, which were start..end - delta before
+    def __init__(self, change_count):
+        self.start = None
+        self.end = None
+        self.delta = 0
+        # the buffer's change count as of the last event we saw
+        self.change_count = change_count
+
+    def add(self, a_row, b_row, text, change_count):
+        # rows a_row..b_row were replaced by text
+        inserted = text.count('\n')
+        delta = inserted - (b_row - a_row)
+        new_end = a_row + inserted
+
+        def moved(row):
+            if row > b_row:
+                return row + delta
+            if row >= a_row:
+                return min(row, new_end)
+            return row
+
+        if self.start is None:
+            self.start, self.end = a_row, new_end
+        else:
+            self.start = min(moved(self.start), a_row)
+            self.end = max(moved(self.end), new_end)
+        self.delta += delta
+        self.change_count = change_count
+
+
+# buffer id -> ((head key, engine), Alignment of HEAD's line hashes with the
+# buffer's), buffer id -> DirtyRows since then, and buffer id -> the
+# GitAnnotationChangeListener feeding those
+_alignments = {}
+_dirty_rows = {}
+_change_listeners = {}
+
+
+def forget_buffer(buffer_id):
+    _alignments.pop(buffer_id, None)
+    _dirty_rows.pop(buffer_id, None)
+    listener = _change_listeners.pop(buffer_id, None)
+    if listener is not None and listener.is_attached():
+        listener.detach()
+
+
+def listen_for_changes(view):
+    if GitAnnotationChangeListener is None or view.buffer_id() in _change_listeners:
+        return
+    listener = GitAnnotationChangeListener()
+    listener.attach(view.buffer())
+    _change_listeners[view.buffer_id()] = listener
+
+
+def line_hashes(lines):
+    return [hash(line) for line in lines]
+
+
+def is_visible(view):
+    # showing in some group of its window, rather than a background tab
+    window = view.window()
+    if window is None:
+        return False
+    group, index = window.get_view_index(view)
+    return group != -1 and window.active_view_in_group(group) == view
+
+
+class AnnotationScheduler(object):
+    # Every edit asks for an annotation pass, but one only happens once the
+    # view's been quiet for the debounce time, or the oldest request is
+    # older than the max latency. Hidden views are skipped until they're
+    # next activated.
+
+    def __init__(self):
+        self.pending = {}  # view id -> [first request, last request, requests]
+        self.stale = set()  # view ids skipped while hidden
+
+    def settings(self):
+        s = sublime.load_settings("Git.sublime-settings")
+        return s.get('annotation_debounce_ms', 200) / 1000, s.get('annotation_max_latency_ms', 1000) / 1000
+
+    def request(self, view):
+        now = telemetry.clock()
+        telemetry.count('annotation passes requested')
+        entry = self.pending.get(view.id())
+        if entry is not None:
+            entry[1] = now
+            entry[2] += 1
+            return
+        self.pending[view.id()] = [now, now, 1]
+        self.schedule(view, self.settings()[0])
+
+    def schedule(self, view, delay):
+        sublime.set_timeout(functools.partial(self.check, view), max(1, int(delay * 1000)))
+
+    def check(self, view):
+        entry = self.pending.get(view.id())
+        if entry is None:
+            return
+        debounce, max_latency = self.settings()
+        first, last, requests = entry
+        due = min(last + debounce, first + max_latency)
+        remaining = due - telemetry.clock()
+        if remaining > 0.001:
+            self.schedule(view, remaining)
+            return
+        del self.pending[view.id()]
+        telemetry.count('annotation passes elided', requests - 1)
+        if not view.settings().get('live_git_annotations'):
+            # cleared in the meantime
+            return
+        if not is_visible(view):
+            self.stale.add(view.id())
+            telemetry.count('annotation passes skipped (hidden view)')
+            return
+        telemetry.count('annotation passes run')
+        view.run_command('git_annotate')
+
+    def activated(self, view):
+        if view.id() in self.stale:
+            self.stale.discard(view.id())
+            self.request(view)
+
+    def forget(self, view):
+        self.pending.pop(view.id(), None)
+        self.stale.discard(view.id())
+
+
+_annotation_scheduler = AnnotationScheduler()
+
+
+class ViewportAnnotations(object):
+    # For very large files, regions are only made for the visible lines and
+    # margin lines either side. There's no scroll event, so such a view is
+    # checked every poll_ms for having scrolled near the edge of them.
+    poll_ms = 250
+
+    def __init__(self):
+        self.changes = {}  # view id -> (annotations, their lines)
+        self.drawn = {}  # view id -> (first row, last row) drawn
+
+    def settings(self):
+        s = sublime.load_settings("Git.sublime-settings")
+        return (
+            s.get('annotation_viewport_min_lines', 20000), s.get('annotation_viewport_min_bytes', 2097152),
+            s.get('annotation_viewport_margin', 200)
+        )
+
+    def is_large(self, view):
+        min_lines, min_bytes = self.settings()[:2]
+        size = view.size()
+        return size > min_bytes or view.rowcol(size)[0] >= min_lines
+
+    def show(self, view, annotations):
+        polling = view.id() in self.changes
+        self.changes[view.id()] = (annotations, [line for change_type, line in annotations])
+        self.drawn.pop(view.id(), None)
+        self.draw(view)
+        if not polling:
+            self.schedule(view)
+
+    def draw(self, view):
+        annotations, lines = self.changes[view.id()]
+        margin = self.settings()[2]
+        visible = view.visible_region()
+        top, bottom = view.rowcol(visible.begin())[0], view.rowcol(visible.end())[0]
+        drawn = self.drawn.get(view.id())
+        if drawn and drawn[0] <= max(0, top - margin // 2) and bottom + margin // 2 <= drawn[1]:
+            return
+        first, last = max(0, top - margin), bottom + margin
+        self.drawn[view.id()] = (first, last)
+        telemetry.count('annotation viewport redraws')
+        GitAnnotateCommand(view).annotate(
+            annotations[bisect.bisect_left(lines, first):bisect.bisect_right(lines, last)]
+        )
+
+    def schedule(self, view):
+        sublime.set_timeout(functools.partial(self.poll, view), self.poll_ms)
+
+    def poll(self, view):
+        if view.id() not in self.changes:
+            return
+        if not view.settings().get('live_git_annotations') or view.window() is None:
+            self.forget(view)
+            return
+        if is_visible(view):
+            self.draw(view)
+        self.schedule(view)
+
+    def forget(self, view):
+        self.changes.pop(view.id(), None)
+        self.drawn.pop(view.id(), None)
+
+
+_viewport_annotations = ViewportAnnotations()
+
+
+def reannotate_repo(root, kinds):
+    # A commit, checkout or reset moves what annotations compare against.
+    # Hidden views get theirs when they're next shown.
+    if not kinds & {watcher.HEAD, watcher.REFS}:
+        return
+    for window in sublime.windows():
+        for view in window.views():
+            if (
+                view.settings().get('live_git_annotations') and view.file_name()
+                and git_root(os.path.dirname(view.file_name())) == root
+            ):
+                _annotation_scheduler.request(view)
+
+
+watcher.subscribe('annotate', reannotate_repo)
+# buffers whose Alignment is being brought up to date off the main thread
+_aligning = set()
+
+
+if hasattr(sublime_plugin, 'TextChangeListener'):
+    class GitAnnotationChangeListener(sublime_plugin.TextChangeListener):
+        # Sublime Text 4 says which rows each edit touched, which lets
+        # annotations re-read just those; elsewhere the whole buffer is
+        # compared with what we saw last time instead
+        @classmethod
+        def is_applicable(cls, buffer):
+            # attached by listen_for_changes() once a buffer's annotated,
+            # which may be long after it's loaded
+            return False
+
+        def on_text_changed(self, changes):
+            dirty = _dirty_rows.get(self.buffer.id())
+            if dirty is None:
+                return
+            change_count = self.buffer.primary_view().change_count()
+            for change in changes:
+                dirty.add(change.a.row, change.b.row, change.str, change_count)
+else:
+    GitAnnotationChangeListener = None
+
+
 class GitClearAnnotationCommand(GitTextCommand):
     def run(self, view):
         self.active_view().settings().set('live_git_annotations', False)
+        _viewport_annotations.forget(self.view)
         self.view.erase_regions('git.changes.x')
         self.view.erase_regions('git.changes.+')
         self.view.erase_regions('git.changes.-')
@@ -38,37 +323,159 @@ class GitAnnotationListener(sublime_plugin.EventListener):
     def on_modified(self, view):
         if not view.settings().get('live_git_annotations'):
             return
-        view.run_command('git_annotate')
+        _annotation_scheduler.request(view)
+
+    def on_activated(self, view):
+        if view.settings().get('live_git_annotations'):
+            _annotation_scheduler.activated(view)
 
     def on_load(self, view):
         s = sublime.load_settings("Git.sublime-settings")
         if s.get('annotations'):
+            if _viewport_annotations.is_large(view):
+                # no hurry: it happens once the view's shown and idle
+                view.settings().set('live_git_annotations', True)
+                _annotation_scheduler.request(view)
+                return
             view.run_command('git_annotate')
 
+    def on_close(self, view):
+        _annotation_scheduler.forget(view)
+        _viewport_annotations.forget(view)
+        remove_temp_files(view.id())
+        forget_buffer(view.buffer_id())
+
 
 class GitAnnotateCommand(GitTextCommand):
-    # Unfortunately, git diff does not support text from stdin, making a *live*
-    # annotation difficult. Therefore I had to resort to the system diff
-    # command.
-    # This works as follows:
-    # 1. When the command is run for the first time for this file, a temporary
-    #    file with the current state of the HEAD is being pulled from git.
-    # 2. All consecutive runs will pass the current buffer into diffs stdin.
-    #    The resulting output is then parsed and regions are set accordingly.
+    # The HEAD version of the file comes from git (once per commit; after
+    # that it's in _head_lines), and gets compared with the buffer's
+    # contents. By default that happens right here, in Python; with
+    # "annotation_diff_engine": "git" both are written to temporary files
+    # (one pair per view, removed when it closes) and handed to `git diff`,
+    # since git can't diff against stdin.
     may_change_files = False
 
     def run(self, view):
-        # If the annotations are already running, we dont have to create a new
-        # tmpfile
-        if not hasattr(self, "git_tmp"):
-            self.git_tmp = temp_file(self.active_view(), 'head')
-            self.buffer_tmp = temp_file(self.active_view(), 'buffer')
         self.active_view().settings().set('live_git_annotations', True)
+        listen_for_changes(self.view)
         root = git_root(self.get_working_dir())
         repo_file = os.path.relpath(self.view.file_name(), root).replace('\\', '/')  # always unix
-        self.run_command(['git', 'show', 'HEAD:{0}'.format(repo_file)], show_status=False, no_save=True, callback=self.compare_tmp)
+        engine = self.diff_engine()
+        # Ask for the file at HEAD's commit rather than at "HEAD", so what we
+        # get can be cached against it
+        head = repo_state(root).head
+        key = head and (root, head, repo_file)
+        if key and engine != 'git':
+            lines = cached_head_lines(key)
+            if lines is not None:
+                self.compare_lines(key, lines, engine)
+                return
+        # a newer annotation run for this view makes any in-progress one moot
+        self.read_object('{0}:{1}'.format(head or 'HEAD', repo_file), functools.partial(self.compare_head, key), error_suppresses_output=True, supersede=self.supersede_key())
+
+    def supersede_key(self):
+        return ('git_annotate', self.view.id())
+
+    def diff_engine(self):
+        s = sublime.load_settings("Git.sublime-settings")
+        return s.get('annotation_diff_engine', 'myers')
+
+    def compare_head(self, key, result, stdout=None):
+        if result is None:
+            # the read failed (say it timed out), which isn't the same as
+            # the file not being in HEAD: try again on the next pass
+            return
+        engine = self.diff_engine()
+        if engine == 'git':
+            self.compare_tmp(result)
+            return
+        lines = linediff.split_lines(result)
+        if key:
+            cache_head_lines(key, lines)
+        self.compare_lines(key, lines, engine)
+
+    def compare_lines(self, key, head_lines, engine):
+        buffer_id = self.view.buffer_id()
+        if buffer_id in _aligning or _viewport_annotations.is_large(self.view):
+            # too big to do here without making typing stutter: take a copy of
+            # the text, and only draw what's on screen once it's done
+            _aligning.add(buffer_id)
+            sublime.set_timeout_async(functools.partial(
+                self.align_in_background, key, head_lines, engine, view_contents(self.view)
+            ), 0)
+            return
+        _viewport_annotations.forget(self.view)
+        self.annotate(linediff.annotations(self.align(key, head_lines, engine).changes))
+
+    def align_in_background(self, key, head_lines, engine, text):
+        try:
+            annotations = linediff.annotations(self.align(key, head_lines, engine, text).changes)
+        finally:
+            _aligning.discard(self.view.buffer_id())
+        sublime.set_timeout(functools.partial(self.show_viewport, annotations), 0)
 
-    def compare_tmp(self, result, stdout=None):
+    def show_viewport(self, annotations):
+        if self.view.settings().get('live_git_annotations') and self.view.window() is not None:
+            _viewport_annotations.show(self.view, annotations)
+
+    def align(self, key, head_lines, engine, text=None):
+        # Brings the buffer's Alignment with HEAD up to date. Given text (a
+        # snapshot, for use off the main thread) change events since can't
+        # be lined up with it, so they're dropped, and the next pass
+        # compares the whole buffer.
+        algorithm = engine if engine in linediff.ALGORITHMS else 'myers'
+        buffer_id = self.view.buffer_id()
+        known = _alignments.get(buffer_id)
+        dirty = None
+        if text is None:
+            dirty = _dirty_rows.get(buffer_id)
+        else:
+            _dirty_rows.pop(buffer_id, None)
+        if key is None or known is None or known[0] != (key, algorithm):
+            alignment = linediff.Alignment(
+                line_hashes(head_lines), self.buffer_hashes(text), algorithm=algorithm
+            )
+            _alignments[buffer_id] = ((key, algorithm), alignment)
+        else:
+            alignment = known[1]
+            if dirty is None or dirty.change_count != self.view.change_count() or not self.update_rows(alignment, dirty):
+                # we don't know (for sure) which lines changed, but can
+                # still find out by comparing hashes, and only diff those
+                alignment.update(self.buffer_hashes(text))
+        if text is None:
+            _dirty_rows[buffer_id] = DirtyRows(self.view.change_count())
+        return alignment
+
+    def buffer_hashes(self, text=None):
+        return line_hashes(linediff.split_lines(view_contents(self.view) if text is None else text))
+
+    def update_rows(self, alignment, dirty):
+        # Re-read just the rows the change events said were touched. Returns
+        # False if the result doesn't add up, so the caller can do it the
+        # slow way.
+        if dirty.start is None:
+            return True
+        view = self.view
+        size = view.size()
+        region = sublime.Region(view.text_point(dirty.start, 0), view.line(view.text_point(dirty.end, 0)).end())
+        text = view.substr(region)
+        lines = linediff.split_lines(text)
+        if region.end() < size and text[-1:] in ('', '\n'):
+            # split_lines took the last row for the one after a final newline
+            lines.append('')
+        # which should leave the buffer as many lines long as it is
+        rows = view.rowcol(size)[0] + 1 if size else 0
+        if size and view.substr(size - 1) == '\n':
+            rows -= 1
+        end = dirty.end - dirty.delta + 1
+        if end > len(alignment.buffer) or len(alignment.buffer) + len(lines) - (end - dirty.start) != rows:
+            return False
+        alignment.replace(dirty.start, end, line_hashes(lines))
+        return True
+
+    def compare_tmp(self, result):
+        self.git_tmp = temp_file(self.view, 'head')
+        self.buffer_tmp = temp_file(self.view, 'buffer')
         with open(self.buffer_tmp, 'wb') as f:
             contents = self.get_view_contents()
             if self.view.encoding() == "UTF-8 with BOM":
@@ -76,79 +483,49 @@ class GitAnnotateCommand(GitTextCommand):
             f.write(contents)
         with open(self.git_tmp, 'wb') as f:
             f.write(result.encode())
-        self.run_command(['git', 'diff', '-u', '--', self.git_tmp, self.buffer_tmp], no_save=True, show_status=False, callback=self.parse_diff)
+        self.run_command(['git', 'diff', '-u', '--', self.git_tmp, self.buffer_tmp], no_save=True, show_status=False, callback=self.parse_diff, supersede=self.supersede_key(), timeout=BACKGROUND_TIMEOUT)
 
-    # This is where the magic happens. At the moment, only one chunk format is supported. While
-    # the unified diff format theoritaclly supports more, I don't think git diff creates them.
+    # This is where the magic happens: the hunks git found become the same
+    # list of changes the in-process engines come up with.
     def parse_diff(self, result, stdin=None):
         if result.startswith('error:'):
             print('Aborted annotations:', result)
             return
-        lines = result.splitlines()
-        matcher = re.compile(r'^@@ -([0-9]*),([0-9]*) \+([0-9]*),([0-9]*) @@')
-        diff = []
-        for line_index in range(0, len(lines)):
-            line = lines[line_index]
-            if not line.startswith('@'):
-                continue
-            match = matcher.match(line)
-            if not match:
-                continue
-            line_before, len_before, line_after, len_after = [int(match.group(x)) for x in [1, 2, 3, 4]]
-            chunk_index = line_index + 1
-            tracked_line_index = line_after - 1
-            deletion = False
-            insertion = False
-            while True:
-                line = lines[chunk_index]
-                if line.startswith('@'):
-                    break
-                elif line.startswith('-'):
-                    if not line.strip() == '-':
-                        deletion = True
-                    tracked_line_index -= 1
-                elif line.startswith('+'):
-                    if deletion and not line.strip() == '+':
-                        diff.append(['x', tracked_line_index])
-                        insertion = True
-                    elif not deletion:
-                        insertion = True
-                        diff.append(['+', tracked_line_index])
-                else:
-                    if not insertion and deletion:
-                        diff.append(['-', tracked_line_index])
-                    insertion = deletion = False
-                tracked_line_index += 1
-                chunk_index += 1
-                if chunk_index >= len(lines):
-                    break
-
-        self.annotate(diff)
+        changes = []
+        for record in diffparse.parse(result):
+            if isinstance(record, diffparse.Hunk):
+                changes.extend(diffparse.hunk_changes(result, record))
+        self.annotate(linediff.annotations(changes))
 
     # Once we got all lines with their specific change types (either x, +, or - for
     # modified, added, or removed) we can create our regions and do the actual annotation.
     def annotate(self, diff):
-        self.view.erase_regions('git.changes.x')
-        self.view.erase_regions('git.changes.+')
-        self.view.erase_regions('git.changes.-')
         typed_diff = {'x': [], '+': [], '-': []}
         for change_type, line in diff:
+            point = self.view.text_point(line, 0)
             if change_type == '-':
-                full_region = self.view.full_line(self.view.text_point(line - 1, 0))
-                position = full_region.begin()
-                for i in range(full_region.size()):
-                    typed_diff[change_type].append(sublime.Region(position + i))
+                # one marker where the lines were, between the line before
+                # and this one
+                typed_diff[change_type].append(sublime.Region(point))
             else:
-                point = self.view.text_point(line, 0)
-                region = self.view.full_line(point)
-                if change_type == '-':
-                    region = sublime.Region(point, point + 5)
-                typed_diff[change_type].append(region)
+                typed_diff[change_type].append(self.view.full_line(point))
 
         for change in ['x', '+']:
-            self.view.add_regions("git.changes.{0}".format(change), typed_diff[change], 'git.changes.{0}'.format(change), 'dot', sublime.HIDDEN)
+            self.update_regions(change, typed_diff[change], sublime.HIDDEN)
+        self.update_regions('-', typed_diff['-'], sublime.DRAW_EMPTY_AS_OVERWRITE)
 
-        self.view.add_regions("git.changes.-", typed_diff['-'], 'git.changes.-', 'dot', sublime.DRAW_EMPTY_AS_OVERWRITE)
+    def update_regions(self, change, regions, flags):
+        # Only hand the view regions which differ from what it has: each
+        # add_regions() means a redraw, and most passes while typing leave
+        # most kinds of change where they were
+        key = 'git.changes.{0}'.format(change)
+        if regions == self.view.get_regions(key):
+            telemetry.count('annotation region sets unchanged')
+            return
+        if regions:
+            self.view.add_regions(key, regions, key, 'dot', flags)
+        else:
+            self.view.erase_regions(key)
 
     def get_view_contents(self):
         region = sublime.Region(0, self.view.size())
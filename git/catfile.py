@@ -0,0 +1,224 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import datetime
+import subprocess
+import threading
+import time
+
+
+_servers = {}
+_servers_lock = threading.Lock()
+
+
+class CatFileServer(object):
+    # A long-lived `git cat-file --batch` process for one repo, since
+    # spawning git for every object read dominates things like live
+    # annotations. Requests take turns; the process is restarted on demand
+    # and shut down after idle_timeout seconds without one.
+    idle_timeout = 60
+
+    def __init__(self, git, repo, env=None, startupinfo=None):
+        self.git = git
+        self.repo = repo
+        self.env = env
+        self.startupinfo = startupinfo
+        self.lock = threading.Lock()
+        self.proc = None
+        self.last_used = 0
+        self.timer = None
+        # whoever's read is in progress, and whether it's been aborted
+        self.reader = None
+        self.aborted = False
+
+    def _start(self):
+        self.proc = subprocess.Popen(
+            [self.git, 'cat-file', '--batch'],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            startupinfo=self.startupinfo, env=self.env, cwd=self.repo
+        )
+
+    def _stop(self):
+        proc, self.proc = self.proc, None
+        if proc is None:
+            return
+        try:
+            proc.stdin.close()
+            proc.stdout.close()
+        except (IOError, OSError):
+            pass
+        if proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+        proc.wait()
+
+    def _request(self, spec):
+        if self.proc is None or self.proc.poll() is not None:
+            self._stop()
+            self._start()
+        if self.aborted:
+            raise IOError("git cat-file read aborted")
+        self.proc.stdin.write(spec.encode('utf-8') + b'\n')
+        self.proc.stdin.flush()
+        header = self.proc.stdout.readline()
+        if not header:
+            raise IOError("git cat-file exited unexpectedly")
+        # (the spec, echoed back, may have spaces in it)
+        parts = header.decode('utf-8', 'replace').rstrip('\n').rsplit(' ', 2)
+        if parts[-1] in ('missing', 'ambiguous'):
+            # "<spec> missing" or "<spec> ambiguous"
+            return None
+        oid, kind, size = parts[0], parts[1], int(parts[2])
+        data = self.proc.stdout.read(size + 1)
+        if len(data) != size + 1:
+            raise IOError("git cat-file returned a short read")
+        return oid, kind, data[:-1]
+
+    def read(self, spec, reader=None):
+        # (oid, type, bytes) for a revision spec, or None if it's missing;
+        # abort(reader) fails the read with an IOError
+        if '\n' in spec:
+            return None
+        with self.lock:
+            self.last_used = time.time()
+            self.reader = reader
+            self.aborted = False
+            try:
+                try:
+                    return self._request(spec)
+                except (IOError, OSError, ValueError):
+                    # the process died (or got out of step with us); restart
+                    # it and give the request one more go, unless it was
+                    # killed on purpose
+                    self._stop()
+                    if self.aborted:
+                        raise IOError("git cat-file read aborted")
+                    return self._request(spec)
+            finally:
+                self.reader = None
+                self._schedule_idle_check()
+
+    def abort(self, reader):
+        # Doesn't take the lock, since a hung read is holding it: killing the
+        # process makes that read fail, which releases it
+        if reader is None or self.reader is not reader:
+            return
+        self.aborted = True
+        proc = self.proc
+        if proc is not None and proc.poll() is None:
+            try:
+                proc.kill()
+            except OSError:
+                pass
+
+    def _schedule_idle_check(self):
+        if self.timer is not None:
+            return
+        self.timer = threading.Timer(self.idle_timeout, self._idle_check)
+        self.timer.daemon = True
+        self.timer.start()
+
+    def _idle_check(self):
+        with self.lock:
+            self.timer = None
+            if time.time() - self.last_used >= self.idle_timeout:
+                self._stop()
+            else:
+                self._schedule_idle_check()
+
+    def close(self):
+        with self.lock:
+            if self.timer is not None:
+                self.timer.cancel()
+                self.timer = None
+            self._stop()
+
+
+def cat_file_server(git, repo, **kwargs):
+    with _servers_lock:
+        key = (git, repo)
+        if key not in _servers:
+            _servers[key] = CatFileServer(git, repo, **kwargs)
+        return _servers[key]
+
+
+def shutdown_all():
+    with _servers_lock:
+        servers = list(_servers.values())
+        _servers.clear()
+    for server in servers:
+        server.close()
+
+
+def format_tree(spec, data, oid_length):
+    # Mimics `git show <tree>`: a header, then the entry names with a
+    # trailing slash on subdirectories
+    names = []
+    hash_size = oid_length // 2
+    position = 0
+    while position < len(data):
+        space = data.index(b' ', position)
+        nul = data.index(b'\0', space)
+        mode = data[position:space]
+        name = data[space + 1:nul]
+        names.append(name + b'/' if mode == b'40000' else name)
+        position = nul + 1 + hash_size
+    return b'tree ' + spec.encode('utf-8') + b'\n\n' + b''.join(name + b'\n' for name in names)
+
+
+def _format_date(timestamp, offset):
+    # --date=iso: the author's wall-clock time plus their UTC offset
+    sign = -1 if offset.startswith('-') else 1
+    seconds = sign * (int(offset[1:3]) * 3600 + int(offset[3:5]) * 60)
+    moment = datetime.datetime(1970, 1, 1) + datetime.timedelta(seconds=int(timestamp) + seconds)
+    return moment.strftime('%Y-%m-%d %H:%M:%S') + ' ' + offset
+
+
+def format_commit(oid, data):
+    # Mimics `git show -s --date=iso <commit>`
+    headers, _, message = data.partition(b'\n\n')
+    encoding = 'utf-8'
+    parents = []
+    author = b''
+    for line in headers.split(b'\n'):
+        key, _, value = line.partition(b' ')
+        if key == b'parent':
+            parents.append(value[:7])
+        elif key == b'author':
+            author = value
+        elif key == b'encoding':
+            encoding = value.decode('ascii', 'replace')
+    lines = [b'commit ' + oid.encode('ascii')]
+    if len(parents) > 1:
+        lines.append(b'Merge: ' + b' '.join(parents))
+    if author:
+        # "Name <email> 1234567890 +0100"
+        ident, _, when = author.rpartition(b'> ')
+        timestamp, _, offset = when.partition(b' ')
+        lines.append(b'Author: ' + ident + b'>')
+        try:
+            date = _format_date(timestamp.decode('ascii'), offset.decode('ascii'))
+            lines.append(b'Date:   ' + date.encode('ascii'))
+        except (ValueError, OverflowError):
+            pass
+    lines.append(b'')
+    for line in message.rstrip(b'\n').split(b'\n'):
+        lines.append(b'    ' + line)
+    text = b'\n'.join(lines) + b'\n'
+    if encoding.lower().replace('-', '') != 'utf8':
+        try:
+            text = text.decode(encoding).encode('utf-8')
+        except (LookupError, UnicodeError):
+            pass
+    return text
+
+
+def format_object(spec, obj):
+    # roughly what `git show` would say
+    oid, kind, data = obj
+    if kind == 'tree':
+        return format_tree(spec, data, len(oid))
+    if kind == 'commit':
+        return format_commit(oid, data)
+    return data
@@ -52,8 +52,8 @@ class GitQuickCommitCommand(GitTextCommand):
 # -w to sublime, which means the editor won't wait, and so the commit will fail
 # with an empty message.
 # Thus this flow:
-# 1. `status --porcelain --untracked-files=no` to know whether files need
-#    to be committed
+# 1. `status --porcelain=v2` (shared with everything else wanting the repo's
+#    status) to know whether files need to be committed
 # 2. `status` to get a template commit message (not the exact one git uses; I
 #    can't see a way to ask it to output that, which is not quite ideal)
 # 3. Create a scratch buffer containing the template
@@ -72,19 +72,15 @@ class GitCommitCommand(GitWindowCommand):
     def run(self):
         self.lines = []
         self.working_dir = self.get_working_dir()
-        self.run_command(
-            ['git', 'status', '--untracked-files=no', '--porcelain'],
-            self.porcelain_status_done
-        )
+        self.repo_snapshot(self.porcelain_status_done)
 
-    def porcelain_status_done(self, result):
-        # todo: split out these status-parsing things... asdf
-        has_staged_files = False
-        result_lines = result.rstrip().split('\n')
-        for line in result_lines:
-            if line and not line[0].isspace():
-                has_staged_files = True
-                break
+    def porcelain_status_done(self, snapshot):
+        if snapshot.error:
+            self.panel(snapshot.error)
+            return
+        # snapshot.index counts entries by their X; untracked and ignored
+        # ones have '?' or '!' there
+        has_staged_files = any(letter not in '?!' for letter in snapshot.index)
         if not has_staged_files and self.quit_when_nothing_staged:
             self.panel("Nothing to commit")
             return
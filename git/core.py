@@ -3,7 +3,7 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 import sublime
 import sublime_plugin
 
-from . import GitWindowCommand, GitTextCommand
+from . import GitWindowCommand, GitTextCommand, CommandThread, telemetry
 
 
 class GitCustomCommand(GitWindowCommand):
@@ -80,22 +80,38 @@ class GitRawCommand(GitWindowCommand):
         msg.sel().add(sublime.Region(0, 0))
 
 
+class GitPerformanceReportCommand(GitWindowCommand):
+    # Timings for the recent git commands, to find out what's making things
+    # slow: which commands, which repos, and which bits of the plugin (the
+    # status bar, annotations...) asked for them.
+    def run(self):
+        view = self.window.new_file()
+        view.set_name("Git Performance Report")
+        view.set_scratch(True)
+        view.settings().set('word_wrap', False)
+        self._output_to_view(view, telemetry.report(CommandThread.stats), syntax="Packages/Text/Plain text.tmLanguage")
+        view.set_read_only(True)
+
+    def is_enabled(self):
+        return True
+
+
 class GitGuiCommand(GitTextCommand):
     def run(self, edit):
         command = ['git', 'gui']
-        self.run_command(command)
+        self.launch(command)
 
 
 class GitGitkCommand(GitTextCommand):
     def run(self, edit):
         command = ['gitk']
-        self.run_command(command)
+        self.launch(command)
 
 
 # called by GitWindowCommand
 class GitScratchOutputCommand(sublime_plugin.TextCommand):
-    def run(self, edit, output='', output_file=None, clear=False):
+    def run(self, edit, output='', output_file=None, clear=False, append=False):
         if clear:
             region = sublime.Region(0, self.view.size())
             self.view.erase(edit, region)
-        self.view.insert(edit, 0, output)
+        self.view.insert(edit, self.view.size() if append else 0, output)
@@ -3,8 +3,8 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 import sublime
 import sublime_plugin
 import os
-import re
 from . import GitTextCommand, GitWindowCommand, do_when, goto_xy, git_root, get_open_folder_from_window
+from . import diffparse
 
 
 class GitDiff (object):
@@ -13,7 +13,12 @@ class GitDiff (object):
         if ignore_whitespace:
             command.extend(('--ignore-all-space', '--ignore-blank-lines'))
         command.extend(('--', self.get_file_name()))
-        self.run_command(command, self.diff_done)
+        s = sublime.load_settings("Git.sublime-settings")
+        if s.get('diff_panel'):
+            self.run_command(command, self.diff_done)
+        else:
+            syntax = s.get("diff_syntax", "Packages/Git/syntax/Git Diff.sublime-syntax")
+            self.scratch_stream(command, title="Git Diff", syntax=syntax, empty_message="No output")
         if word_diff:
             command.append('--word-diff')
 
@@ -23,10 +28,7 @@ class GitDiff (object):
             return
         s = sublime.load_settings("Git.sublime-settings")
         syntax = s.get("diff_syntax", "Packages/Git/syntax/Git Diff.sublime-syntax")
-        if s.get('diff_panel'):
-            self.panel(result, syntax=syntax)
-        else:
-            self.scratch(result, title="Git Diff", syntax=syntax)
+        self.panel(result, syntax=syntax)
 
 
 class GitDiffCommit (object):
@@ -36,15 +38,9 @@ class GitDiffCommit (object):
             command.extend(('--ignore-all-space', '--ignore-blank-lines'))
         if word_diff:
             command.extend('--word-diff')
-        self.run_command(command, self.diff_done)
-
-    def diff_done(self, result):
-        if not result.strip():
-            self.panel("No output")
-            return
         s = sublime.load_settings("Git.sublime-settings")
         syntax = s.get("diff_syntax", "Packages/Git/syntax/Git Diff.sublime-syntax")
-        self.scratch(result, title="Git Diff", syntax=syntax)
+        self.scratch_stream(command, title="Git Diff", syntax=syntax, empty_message="No output")
 
 
 class GitDiffCommand(GitDiff, GitTextCommand):
@@ -76,31 +72,25 @@ class GitGotoDiff(sublime_plugin.TextCommand):
         pt = v.line(beg).a          # First position in the current diff line
         self.column = beg - pt - 1  # The current column (-1 because the first char in diff file)
 
-        self.file_name = None
-        hunk_line = None
-        line_offset = 0
-
-        while pt > 0:
-            line = v.line(pt)
-            lineContent = v.substr(line)
-            if lineContent.startswith("@@"):
-                if not hunk_line:
-                    hunk_line = lineContent
-            elif lineContent.startswith("+++ b/"):
-                self.file_name = v.substr(sublime.Region(line.a + 6, line.b)).strip()
+        # parse this file's part of the diff up to here, to find the hunk
+        # we're in and which line of the file that makes this
+        text = v.substr(sublime.Region(0, v.size()))
+        hunk = None
+        for record in diffparse.parse(text, text.rfind('\ndiff ', 0, pt) + 1):
+            if record.start > pt:
                 break
-            elif not hunk_line and not lineContent.startswith("-"):
-                line_offset = line_offset + 1
-
-            pt = v.line(pt - 1).a
-
-        hunk = re.match(r"^@@ -(\d+),(\d+) \+(\d+),(\d+) @@.*", hunk_line)
-        if not hunk:
+            if isinstance(record, diffparse.Hunk) and record.body <= pt < record.end:
+                hunk = record
+                break
+        if hunk is None or hunk.file is None or hunk.file.new_path is None:
             sublime.status_message("No hunk info")
             return
 
-        hunk_start_line = hunk.group(3)
-        self.goto_line = int(hunk_start_line) + line_offset - 1
+        self.file_name = hunk.file.new_path
+        # the lines up to and including this one, less the removed ones
+        lines = text.count('\n', hunk.body, pt) + 1
+        removed = text.count('\n-', hunk.body - 1, pt + 1)
+        self.goto_line = hunk.new_start + lines - removed - 1
 
         git_root_dir = v.settings().get("git_root_dir")
         # See if we can get the git root directory if we haven't saved it yet
@@ -0,0 +1,370 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+
+class FileHeader(object):
+    # One file's header in a diff: data[start:end] runs from its `diff
+    # --git` (or `---`) line to its first hunk. A /dev/null path is None.
+    __slots__ = ('start', 'end', 'old_path', 'new_path', 'renamed', 'binary')
+
+    def __init__(self, start):
+        self.start = start
+        self.end = start
+        self.old_path = None
+        self.new_path = None
+        self.renamed = False
+        self.binary = False
+
+
+class Hunk(object):
+    # One `@@ -old_start,old_count +new_start,new_count @@` hunk:
+    # data[start:end] is the whole of it and data[body:end] its lines
+    __slots__ = (
+        'file', 'start', 'body', 'end', 'old_start', 'old_count', 'new_start', 'new_count',
+        'no_newline_old', 'no_newline_new',
+    )
+
+    def __init__(self, file, start, body, old_start, old_count, new_start, new_count):
+        self.file = file
+        self.start = start
+        self.body = body
+        self.end = body
+        self.old_start = old_start
+        self.old_count = old_count
+        self.new_start = new_start
+        self.new_count = new_count
+        self.no_newline_old = False
+        self.no_newline_new = False
+
+
+class _Tokens(object):
+    # The strings the parser looks for, as str or as bytes to match the input
+    def __init__(self, convert):
+        for name, value in [
+            ('newline', '\n'), ('cr', '\r'), ('space', ' '), ('minus', '-'), ('plus', '+'),
+            ('backslash', '\\'), ('hunk', '@@ '), ('hunk_end', ' @@'),
+            ('diff', 'diff '), ('diff_git', 'diff --git '), ('old', '--- '), ('new', '+++ '),
+            ('next_hunk', '\n@@ '), ('next_diff', '\ndiff '), ('context_line', '\n '),
+            ('minus_line', '\n-'), ('plus_line', '\n+'),
+            ('rename_from', 'rename from '), ('rename_to', 'rename to '),
+            ('copy_from', 'copy from '), ('copy_to', 'copy to '),
+            ('new_file', 'new file mode'), ('deleted_file', 'deleted file mode'),
+            ('binary_files', 'Binary files '), ('binary_patch', 'GIT binary patch'),
+        ]:
+            setattr(self, name, convert(value))
+
+
+_text_tokens = _Tokens(lambda value: value)
+_bytes_tokens = _Tokens(lambda value: value.encode('ascii'))
+
+
+def _tokens(data):
+    return _bytes_tokens if isinstance(data, bytes) else _text_tokens
+
+
+def _decode(value):
+    if isinstance(value, bytes):
+        return value.decode('utf-8', 'replace')
+    return value
+
+
+def _unquote(path):
+    # git C-quotes paths with unusual characters in them: "a/tab\there"
+    if not path.startswith('"') or not path.endswith('"') or len(path) < 2:
+        return path
+    escapes = {'a': '\a', 'b': '\b', 't': '\t', 'n': '\n', 'v': '\v', 'f': '\f', 'r': '\r', '"': '"', '\\': '\\'}
+    raw = bytearray()
+    body = path[1:-1]
+    index = 0
+    while index < len(body):
+        char = body[index]
+        if char == '\\' and index + 1 < len(body):
+            following = body[index + 1]
+            octal = body[index + 1:index + 4]
+            if len(octal) == 3 and all(c in '01234567' for c in octal):
+                raw.append(int(octal, 8))
+                index += 4
+                continue
+            raw.extend(escapes.get(following, following).encode('utf-8'))
+            index += 2
+            continue
+        raw.extend(char.encode('utf-8'))
+        index += 1
+    return bytes(raw).decode('utf-8', 'replace')
+
+
+def _path(value, prefixed):
+    path = _decode(value).rstrip('\r')
+    if '\t' in path:
+        # git ends names with spaces in them with a tab, and plain `diff -u`
+        # puts a timestamp there; names with actual tabs are quoted
+        path = path.split('\t', 1)[0]
+    path = _unquote(path)
+    if path == '/dev/null':
+        return None
+    if prefixed and path[:2] in ('a/', 'b/'):
+        path = path[2:]
+    return path
+
+
+def _hunk_range(spec):
+    # "12,3" or just "12", which means one line
+    start, comma, count = spec.partition(b',' if isinstance(spec, bytes) else ',')
+    return int(start), int(count) if comma else 1
+
+
+class DiffParser(object):
+    # feed() it a diff a piece at a time (str or bytes, any size) and it
+    # returns the FileHeader and Hunk records completed so far; close()
+    # returns the rest. Records hold offsets into everything fed, not copies.
+
+    def __init__(self):
+        self.file = None
+        self.pieces = []
+        self.size = 0
+        # where self.pieces starts in the whole input
+        self.offset = 0
+        # don't try again until there's this much unparsed input: a hunk
+        # which takes many pieces to arrive gets looked at log(n) times
+        self.retry_at = 0
+        self.used = 0
+
+    def feed(self, data):
+        self.pieces.append(data)
+        self.size += len(data)
+        if self.size < self.retry_at:
+            return []
+        return self._parse(False)
+
+    def close(self):
+        if not self.pieces:
+            return []
+        return self._parse(True)
+
+    def _parse(self, final):
+        text = self.pieces[0][:0].join(self.pieces)
+        records = list(self.records(text, 0, final))
+        text = text[self.used:]
+        self.offset += self.used
+        self.pieces = [text] if text else []
+        self.size = len(text)
+        self.retry_at = 2 * self.size
+        return records
+
+    def records(self, text, position, final):
+        # The records in text[position:], offset by self.offset. Unless
+        # final, stops at (and sets self.used to) one which might not be
+        # complete yet
+        tokens = _tokens(text)
+        size = len(text)
+        self.used = position
+        while position < size:
+            line_end = text.find(tokens.newline, position)
+            if line_end == -1:
+                if not final:
+                    return
+                line_end = size
+            if text.startswith(tokens.hunk, position):
+                hunk = self._hunk(text, tokens, position, line_end, final)
+                if hunk is False:
+                    return
+                if hunk is not None:
+                    position = hunk.end - self.offset
+                    self.used = position
+                    yield hunk
+                    continue
+            elif text.startswith(tokens.diff, position) or (
+                    text.startswith(tokens.old, position) and text.startswith(tokens.new, line_end + 1)):
+                header = self._header(text, tokens, position, final)
+                if header is None:
+                    return
+                self.file = header
+                position = header.end - self.offset
+                self.used = position
+                yield header
+                continue
+            # anything else (a commit message, a signature) isn't ours
+            position = line_end + 1
+            self.used = min(position, size)
+
+    def _header(self, text, tokens, position, final):
+        size = len(text)
+        header = FileHeader(position + self.offset)
+        prefixed = text.startswith(tokens.diff_git, position)
+        first = True
+        while position < size:
+            if not first and (text.startswith(tokens.hunk, position) or text.startswith(tokens.diff, position)):
+                break
+            line_end = text.find(tokens.newline, position)
+            if line_end == -1:
+                if not final:
+                    return None
+                line_end = size
+            self._header_line(header, text[position:line_end], tokens, prefixed)
+            first = False
+            position = line_end + 1
+        else:
+            if not final:
+                # the first hunk (or the next file) might be on its way
+                return None
+        header.end = min(position, size) + self.offset
+        return header
+
+    def _header_line(self, header, line, tokens, prefixed):
+        if line.startswith(tokens.diff_git):
+            names = line[len(tokens.diff_git):].rstrip(tokens.cr)
+            # "a/name b/name" can only be split reliably when both are the
+            # same; otherwise the ---/+++ or rename lines say
+            half = (len(names) - 1) // 2
+            if len(names) % 2 and names[half:half + 1] == tokens.space and names[2:half] == names[half + 3:]:
+                header.old_path = _path(names[:half], True)
+                header.new_path = _path(names[half + 1:], True)
+        elif line.startswith(tokens.old):
+            header.old_path = _path(line[len(tokens.old):], prefixed)
+        elif line.startswith(tokens.new):
+            header.new_path = _path(line[len(tokens.new):], prefixed)
+        elif line.startswith(tokens.rename_from) or line.startswith(tokens.copy_from):
+            header.renamed = line.startswith(tokens.rename_from)
+            header.old_path = _path(line.split(tokens.space, 2)[2], False)
+        elif line.startswith(tokens.rename_to) or line.startswith(tokens.copy_to):
+            header.new_path = _path(line.split(tokens.space, 2)[2], False)
+        elif line.startswith(tokens.new_file):
+            header.old_path = None
+        elif line.startswith(tokens.deleted_file):
+            header.new_path = None
+        elif line.startswith(tokens.binary_files) or line.startswith(tokens.binary_patch):
+            header.binary = True
+
+    def _hunk(self, text, tokens, position, line_end, final):
+        # None if the line isn't a hunk header after all, False if the hunk
+        # isn't all here yet
+        ranges_end = text.find(tokens.hunk_end, position + 3, line_end)
+        if ranges_end == -1:
+            return None
+        try:
+            old, new = text[position + 3:ranges_end].split(tokens.space)
+            if not old.startswith(tokens.minus) or not new.startswith(tokens.plus):
+                raise ValueError
+            old_start, old_count = _hunk_range(old[1:])
+            new_start, new_count = _hunk_range(new[1:])
+        except ValueError:
+            return None
+        body = line_end + 1
+        hunk = Hunk(self.file, position + self.offset, body + self.offset, old_start, old_count, new_start, new_count)
+        end = self._fast_end(text, tokens, hunk, body, final)
+        if end is None:
+            end = self._walk(text, tokens, hunk, body, final)
+            if end is None:
+                return False
+        hunk.end = end + self.offset
+        return hunk
+
+    def _fast_end(self, text, tokens, hunk, body, final):
+        # Guess the hunk runs to the next hunk or file header and check the
+        # guess by counting line types, which happens in C. Only a hunk with
+        # a "\ No newline" marker or something unusual after it needs
+        # walking line by line.
+        size = len(text)
+        end = size
+        for token in (tokens.next_hunk, tokens.next_diff):
+            found = text.find(token, body - 1, end)
+            if found != -1:
+                end = found + 1
+        if end == size and not final:
+            return None
+        lines = text.count(tokens.newline, body, end)
+        if end == size and end > body and not text.endswith(tokens.newline):
+            lines += 1
+        context = text.count(tokens.context_line, body - 1, end)
+        removed = text.count(tokens.minus_line, body - 1, end)
+        added = text.count(tokens.plus_line, body - 1, end)
+        if context + removed != hunk.old_count or context + added != hunk.new_count or context + removed + added != lines:
+            return None
+        return end
+
+    def _walk(self, text, tokens, hunk, position, final):
+        size = len(text)
+        old, new = hunk.old_count, hunk.new_count
+        last = None
+        while position < size:
+            kind = text[position:position + 1]
+            if kind == tokens.backslash:
+                # only belongs to us straight after one of our lines
+                if last is None:
+                    break
+                if last != tokens.plus:
+                    hunk.no_newline_old = True
+                if last != tokens.minus:
+                    hunk.no_newline_new = True
+            elif old <= 0 and new <= 0:
+                break
+            elif kind in (tokens.space, tokens.newline, tokens.cr):
+                # some editors strip the space off empty context lines
+                old -= 1
+                new -= 1
+            elif kind == tokens.minus:
+                old -= 1
+            elif kind == tokens.plus:
+                new -= 1
+            else:
+                # cut short; what's here is all there is
+                break
+            last = kind
+            line_end = text.find(tokens.newline, position)
+            if line_end == -1:
+                if not final:
+                    return None
+                return size
+            position = line_end + 1
+        else:
+            if not final:
+                # more lines, or a "\ No newline", might be on their way
+                return None
+        return position
+
+
+def parse(data, start=0):
+    # the records in a whole diff, with offsets into it
+    parser = DiffParser()
+    return parser.records(data, start, True)
+
+
+def iter_records(chunks):
+    # the records in a diff arriving as an iterable of chunks or lines
+    parser = DiffParser()
+    for chunk in chunks:
+        for record in parser.feed(chunk):
+            yield record
+    for record in parser.close():
+        yield record
+
+
+def hunk_changes(data, hunk):
+    # the changes a hunk makes, as linediff.diff() would describe them
+    tokens = _tokens(data)
+    old = hunk.old_start - 1 if hunk.old_count else hunk.old_start
+    new = hunk.new_start - 1 if hunk.new_count else hunk.new_start
+    change = None
+    position = hunk.body
+    while position < hunk.end:
+        kind = data[position:position + 1]
+        if kind == tokens.minus or kind == tokens.plus:
+            if change is None:
+                change = [old, old, new, new]
+            if kind == tokens.minus:
+                old += 1
+                change[1] = old
+            else:
+                new += 1
+                change[3] = new
+        elif kind != tokens.backslash:
+            if change is not None:
+                yield tuple(change)
+                change = None
+            old += 1
+            new += 1
+        line_end = data.find(tokens.newline, position, hunk.end)
+        if line_end == -1:
+            break
+        position = line_end + 1
+    if change is not None:
+        yield tuple(change)
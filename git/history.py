@@ -1,10 +1,10 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-import functools
 import re
 
 import sublime
 from . import GitTextCommand, GitWindowCommand, plugin_file
+from .catfile import format_object
 
 
 class GitBlameCommand(GitTextCommand):
@@ -19,14 +19,19 @@ class GitBlameCommand(GitTextCommand):
         if line_ranges:
             for (range_start, range_end, *line_range_len) in line_ranges:
                 command.extend(('-L', str(range_start) + ',' + str(range_end)))
-            
-            callback = self.blame_done
+
+            focused_line = 1
         else:
-            callback = functools.partial(self.blame_done,
-                                         focused_line=self.get_current_line())
+            focused_line = self.get_current_line()
 
         command.append(self.get_file_name())
-        self.run_command(command, callback)
+        self.blame(command, focused_line)
+
+    def blame(self, command, focused_line):
+        self.scratch_stream(
+            command, title="Git Blame", focused_line=focused_line,
+            syntax=plugin_file("syntax/Git Blame.tmLanguage")
+        )
 
     def get_current_line(self):
         (current_line, column) = self.view.rowcol(self.view.sel()[0].a)
@@ -45,45 +50,102 @@ class GitBlameCommand(GitTextCommand):
         # add one to each, to line up sublime's index with git's
         return begin_line + 1, end_line + 1
 
-    def blame_done(self, result, focused_line=1):
-        self.scratch(
-            result, title="Git Blame", focused_line=focused_line,
-            syntax=plugin_file("syntax/Git Blame.tmLanguage")
-        )
+
+# what the log quick panels ask git for about each commit: fields end in a
+# NUL and -z puts another between commits, so nothing in a subject (or a
+# name) can throw the split out
+LOG_FORMAT = '--pretty=format:%H%x00%h%x00%s%x00%an <%aE>%x00%ad (%ar)'
+LOG_FIELDS = 5
+
+
+def parse_log(result):
+    # -> (hash, [panel item]) for each commit
+    fields = result.split('\0')
+    commits = []
+    for index in range(0, len(fields) - LOG_FIELDS + 1, LOG_FIELDS):
+        full, short, subject, author, date = fields[index:index + LOG_FIELDS]
+        commits.append((full, ['%s (%s)' % (subject, short), author, date]))
+    return commits
+
+
+class GitLogList(object):
+    # A quick panel of commits, `log_page_size` at a time, with an item at
+    # the end for older ones (fetched in the background while this page is
+    # up). log_picked(hash) gets the chosen commit.
+
+    def show_log(self, args):
+        # args are the revisions and paths for `git log`
+        self.log_args = [arg for arg in args if arg]
+        self.log_commits = []
+        self.log_next = None  # the next page's commits, once fetched
+        self.log_wanted = False  # whether they're to be shown when they are
+        self.log_more = False
+        self.load_log_page(0, True)
+
+    def load_log_page(self, start, show):
+        size = sublime.load_settings("Git.sublime-settings").get('log_page_size') or 500
+        # one more than a page, to know whether there's anything after it
+        command = [
+            'git', 'log', '--no-color', '-z', LOG_FORMAT, '--date=local',
+            '--skip=%d' % start, '--max-count=%d' % (size + 1),
+        ] + self.log_args
+        self.run_command(command, self.log_page_done, args=self.log_args, start=start, size=size, show=show)
+
+    def log_page_done(self, result, args, start, size, show):
+        if args is not self.log_args:
+            # from a list which has since been replaced by another
+            return
+        commits = parse_log(result)
+        if not commits and not start:
+            if result.strip():
+                self.panel(result)
+            else:
+                sublime.status_message("No commits to show")
+            return
+        page = (commits[:size], len(commits) > size)
+        if start and not (show or self.log_wanted):
+            # fetched ahead of time
+            self.log_next = page
+            return
+        self.add_log_page(page)
+
+    def add_log_page(self, page):
+        commits, more = page
+        selected = len(self.log_commits)
+        self.log_commits.extend(commits)
+        self.log_more = more
+        self.log_next = None
+        self.log_wanted = False
+        self.results = [item for full, item in self.log_commits]
+        if more:
+            self.results.append(["Load older commits\u2026", "%d shown so far" % len(self.log_commits), ""])
+            self.load_log_page(len(self.log_commits), False)
+        # (with the first of the new commits selected)
+        self.quick_panel(self.results, self.log_list_done, 0, selected)
+
+    def log_list_done(self, picked):
+        if 0 > picked < len(self.results):
+            return
+        if picked == len(self.log_commits):
+            if self.log_next is not None:
+                # a quick panel can't be shown from inside another's callback
+                sublime.set_timeout(lambda: self.add_log_page(self.log_next), 0)
+            else:
+                # still on its way
+                self.log_wanted = True
+            return
+        self.log_picked(self.log_commits[picked][0])
 
 
-class GitLog(object):
+class GitLog(GitLogList):
     def run(self, edit=None):
         fn = self.get_file_name()
         return self.run_log(fn != '', '--', fn)
 
     def run_log(self, follow, *args):
-        # the ASCII bell (\a) is just a convenient character I'm pretty sure
-        # won't ever come up in the subject of the commit (and if it does then
-        # you positively deserve broken output...)
-        # 9000 is a pretty arbitrarily chosen limit; picked entirely because
-        # it's about the size of the largest repo I've tested this on... and
-        # there's a definite hiccup when it's loading that
-        command = [
-            'git', 'log', '--no-color', '--pretty=%s (%h)\a%an <%aE>\a%ad (%ar)',
-            '--date=local', '--max-count=9000',
-            '--follow' if follow else None
-        ]
-        command.extend(args)
-        self.run_command(
-            command,
-            self.log_done)
+        self.show_log(['--follow' if follow else None] + list(args))
 
-    def log_done(self, result):
-        self.results = [r.split('\a', 2) for r in result.strip().split('\n')]
-        self.quick_panel(self.results, self.log_panel_done)
-
-    def log_panel_done(self, picked):
-        if 0 > picked < len(self.results):
-            return
-        item = self.results[picked]
-        # the commit hash is the last thing on the first line, in brackets
-        ref = item[0].split(' ')[-1].strip('()')
+    def log_picked(self, ref):
         self.log_result(ref)
 
     def log_result(self, ref):
@@ -107,27 +169,13 @@ class GitLogAllCommand(GitLog, GitWindowCommand):
     pass
 
 
-class GitShow(object):
+class GitShow(GitLogList):
     def run(self, edit=None):
-        # GitLog Copy-Past
-        self.run_command(
-            ['git', 'log', '--no-color', '--pretty=%s (%h)\a%an <%aE>\a%ad (%ar)',
-             '--date=local', '--max-count=9000', '--', self.get_file_name()],
-            self.show_done)
-
-    def show_done(self, result):
-        # GitLog Copy-Past
-        self.results = [r.split('\a', 2) for r in result.strip().split('\n')]
-        self.quick_panel(self.results, self.panel_done)
+        self.show_log(['--', self.get_file_name()])
 
-    def panel_done(self, picked):
-        if 0 > picked < len(self.results):
-            return
-        item = self.results[picked]
-        # the commit hash is the last thing on the first line, in brackets
-        ref = item[0].split(' ')[-1].strip('()')
-        self.run_command(
-            ['git', 'show', '%s:%s' % (ref, self.get_relative_file_path())],
+    def log_picked(self, ref):
+        self.read_object(
+            '%s:%s' % (ref, self.get_relative_file_path()),
             self.details_done,
             ref=ref)
 
@@ -164,14 +212,11 @@ class GitShowCommitCommand(GitWindowCommand):
 class GitGraph(object):
     def run(self, edit=None):
         filename = self.get_file_name()
-        self.run_command(
+        self.scratch_stream(
             ['git', 'log', '--graph', '--pretty=%h -%d (%cr) (%ci) <%an> %s', '--abbrev-commit', '--no-color', '--decorate', '--date=relative', '--follow' if filename else None, '--', filename],
-            self.log_done
+            title="Git Log Graph", syntax=plugin_file("syntax/Git Graph.tmLanguage")
         )
 
-    def log_done(self, result):
-        self.scratch(result, title="Git Log Graph", syntax=plugin_file("syntax/Git Graph.tmLanguage"))
-
 
 class GitGraphCommand(GitGraph, GitTextCommand):
     pass
@@ -219,21 +264,23 @@ class GitOpenFileCommand(GitLog, GitWindowCommand):
         self.filename = item[0]
         self.fileRef = item[1]
 
-        self.run_command(
-            ['git', 'show', self.fileRef],
-            self.show_done)
+        self.read_object(self.fileRef, self.show_done)
 
     def show_done(self, result):
         self.scratch(result, title="%s:%s" % (self.fileRef, self.filename))
 
 
 class GitDocumentCommand(GitBlameCommand):
-    def blame_done(self, result, focused_line=1):
+    def blame(self, command, focused_line):
+        self.run_command(command, self.blame_done)
+
+    def blame_done(self, result):
         shas = set((sha for sha in re.findall(r'^[0-9a-f]+', result, re.MULTILINE) if not re.match(r'^0+$', sha)))
-        command = ['git', 'show', '-s', '-z', '--no-color', '--date=iso']
-        command.extend(shas)
+        # equivalent to `git show -s -z --date=iso <shas>`
+        self.read_object(sorted(shas), self.show_done, formatter=self.format_commits)
 
-        self.run_command(command, self.show_done)
+    def format_commits(self, objects):
+        return b'\0'.join(format_object(spec, obj) for spec, obj in objects)
 
     def show_done(self, result):
         commits = []
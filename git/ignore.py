@@ -5,7 +5,44 @@ import os
 
 import sublime
 import sublime_plugin
-from . import GitTextCommand
+from . import GitTextCommand, BACKGROUND_TIMEOUT, git_root
+from . import watcher
+
+
+# window id -> ignore_generations() as of its last sync
+_synced = {}
+
+
+def folder_path(window, folderpath):
+    project_file_name = window.project_file_name()
+    if project_file_name:
+        return os.path.join(os.path.dirname(project_file_name), folderpath)
+    return folderpath
+
+
+def ignore_generations(window):
+    # Where each of the window's repos is up to, as far as ignores go. A
+    # None in there means one isn't being watched, so can't be trusted.
+    generations = []
+    for folder in (window.project_data() or {}).get('folders', []):
+        root = git_root(folder_path(window, folder['path']))
+        if root and watcher.watch(root):
+            generations.append((root, watcher.generation(root, (watcher.IGNORE,))))
+        else:
+            generations.append((root, None if root else 0))
+    return generations
+
+
+def resync_ignores(root, kinds):
+    if watcher.IGNORE not in kinds or not sublime.load_settings("Git.sublime-settings").get("gitignore_sync"):
+        return
+    for window in sublime.windows():
+        view = window.active_view()
+        if view is not None and root in [known_root for known_root, generation in _synced.get(window.id(), [])]:
+            view.run_command("git_update_ignore")
+
+
+watcher.subscribe('ignore', resync_ignores)
 
 
 class GitIgnoreEventListener(sublime_plugin.EventListener):
@@ -15,8 +52,13 @@ class GitIgnoreEventListener(sublime_plugin.EventListener):
         return s.get("gitignore_sync")
 
     def on_activated(self, view):
-        if self.is_enabled():
-            view.run_command("git_update_ignore")
+        if not self.is_enabled() or view.window() is None:
+            return
+        generations = ignore_generations(view.window())
+        if _synced.get(view.window().id()) == generations and None not in [generation for root, generation in generations]:
+            # no .gitignore (or info/exclude) has changed since the last sync
+            return
+        view.run_command("git_update_ignore")
 
     def on_post_save(self, view):
         if self.is_enabled():
@@ -25,12 +67,10 @@ class GitIgnoreEventListener(sublime_plugin.EventListener):
 
 class GitUpdateIgnoreCommand(GitTextCommand):
     def path(self, folderpath):
-        project_file_name = self.view.window().project_file_name()
-        if project_file_name:
-            return os.path.join(os.path.dirname(project_file_name), folderpath)
-        return folderpath
+        return folder_path(self.view.window(), folderpath)
 
     def run(self, edit):
+        _synced[self.view.window().id()] = ignore_generations(self.view.window())
         self.count = 0
         self.excludes = {}
 
@@ -45,19 +85,32 @@ class GitUpdateIgnoreCommand(GitTextCommand):
             path = self.path(folder['path'])
             callback = functools.partial(self.ignored_files_found, folder_index=index)
             self.run_command(
-                ['git', 'status', '--ignored', '--porcelain'],
+                ['git', '--no-optional-locks', 'status', '--ignored', '--porcelain'],
                 callback=callback,
                 working_dir=path,
                 error_suppresses_output=True,
-                show_status=False
+                show_status=False,
+                timeout=BACKGROUND_TIMEOUT
             )
             self.run_command(
-                ['git', 'submodule', 'foreach', 'git status --ignored --porcelain'],
+                ['git', 'submodule', 'foreach', 'git --no-optional-locks status --ignored --porcelain'],
                 callback=callback,
                 working_dir=path,
                 error_suppresses_output=True,
-                show_status=False
+                show_status=False,
+                timeout=BACKGROUND_TIMEOUT
             )
+            root = git_root(path)
+            if root and watcher.is_watching(root):
+                # the watcher only knows about the root .gitignore by itself
+                self.run_command(
+                    ['git', 'ls-files', '-z', '--cached', '--others', '--exclude-standard', '--', '*/.gitignore'],
+                    callback=functools.partial(self.ignore_files_found, root=root),
+                    working_dir=root,
+                    error_suppresses_output=True,
+                    show_status=False,
+                    timeout=BACKGROUND_TIMEOUT
+                )
 
     def ignored_files_found(self, result, folder_index):
         self.count -= 1
@@ -67,6 +120,13 @@ class GitUpdateIgnoreCommand(GitTextCommand):
         if self.count == 0:
             self.all_ignored_files_found()
 
+    def ignore_files_found(self, result, root):
+        if not result:
+            # none, or we couldn't tell; leave things as they were
+            return
+        directories = set(os.path.join(root, *os.path.dirname(path).split('/')) for path in result.split('\0') if path)
+        watcher.watch_ignore_files(root, directories)
+
     def process_ignored_files(self, result, folder_index):
         data = self.view.window().project_data()
         folder = data['folders'][folder_index]
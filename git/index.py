@@ -9,24 +9,24 @@ from .status import GitStatusCommand
 
 
 class GitUpdateIndexAssumeUnchangedCommand(GitStatusCommand):
-    def status_filter(self, item):
-        return super(GitUpdateIndexAssumeUnchangedCommand, self).status_filter(item) and not item[1].isspace()
-
-    def show_status_list(self):
-        self.results = [] + [[a, ''] for a in self.results]
-        return super(GitUpdateIndexAssumeUnchangedCommand, self).show_status_list()
+    def status_filter(self, entry):
+        # only what's changed in the working tree
+        return super(GitUpdateIndexAssumeUnchangedCommand, self).status_filter(entry) and entry[0][1] != ' '
 
     def panel_followup(self, picked_status, picked_file, picked_index):
         working_dir = git_root(self.get_working_dir())
 
-        command = ['git']
-        picked_file = picked_file.strip('"')
         if os.path.exists(working_dir + "/" + picked_file):
-            command += ['update-index', '--assume-unchanged']
-        command += ['--', picked_file]
+            # git stops looking at the file's working tree changes, so only
+            # what's staged (if anything) is left
+            self.change_entries(
+                [(['git', 'update-index', '--assume-unchanged'], [(picked_status, picked_file, None)])],
+                lambda entry: (entry[0][0] + ' ', entry[1], entry[2]) if entry[0][0] not in ' ?' else None
+            )
+            return
 
         self.run_command(
-            command, self.rerun,
+            ['git', '--', picked_file], self.rerun,
             working_dir=working_dir
         )
 
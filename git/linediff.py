@@ -0,0 +1,287 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import bisect
+import collections
+
+
+# Give up looking for the shortest edit script after this many edits and
+# call whatever's left one big change, like xdiff's cost limit. Without it a
+# wholesale rewrite of a long file is quadratic.
+MAX_COST = 2000
+
+ALGORITHMS = ('myers', 'patience')
+
+
+def split_lines(text):
+    # lines of text as git sees them: no BOM, no line endings
+    if text.startswith('\ufeff'):
+        text = text[1:]
+    lines = text.split('\n')
+    if lines[-1] == '':
+        lines.pop()
+    if '\r' in text:
+        lines = [line[:-1] if line.endswith('\r') else line for line in lines]
+    return lines
+
+
+def _common_prefix(a, b, a_lo, a_hi, b_lo, b_hi):
+    # How many lines match from a[a_lo] and b[b_lo] onwards. Long runs of
+    # matching lines are the norm, so compare them a chunk at a time, which
+    # happens in C, and only go line by line to find where a chunk differs.
+    start = a_lo
+    chunk = 64
+    while a_lo < a_hi and b_lo < b_hi:
+        size = min(chunk, a_hi - a_lo, b_hi - b_lo)
+        if a[a_lo:a_lo + size] == b[b_lo:b_lo + size]:
+            a_lo += size
+            b_lo += size
+            chunk *= 2
+            continue
+        while a[a_lo] == b[b_lo]:
+            a_lo += 1
+            b_lo += 1
+        break
+    return a_lo - start
+
+
+def _common_suffix(a, b, a_lo, a_hi, b_lo, b_hi):
+    # Same, working backwards from a[a_hi - 1] and b[b_hi - 1]
+    end = a_hi
+    chunk = 64
+    while a_lo < a_hi and b_lo < b_hi:
+        size = min(chunk, a_hi - a_lo, b_hi - b_lo)
+        if a[a_hi - size:a_hi] == b[b_hi - size:b_hi]:
+            a_hi -= size
+            b_hi -= size
+            chunk *= 2
+            continue
+        while a[a_hi - 1] == b[b_hi - 1]:
+            a_hi -= 1
+            b_hi -= 1
+        break
+    return end - a_hi
+
+
+def _myers(a, b, a_lo, a_hi, b_lo, b_hi, max_cost):
+    # Myers' O(ND) greedy algorithm over a[a_lo:a_hi] and b[b_lo:b_hi],
+    # keeping the furthest-reaching x for each diagonal at every cost so the
+    # path can be walked back. Returns the matched runs as
+    # (a_start, b_start, length), in order.
+    n = a_hi - a_lo
+    m = b_hi - b_lo
+    if not n or not m:
+        return []
+    offset = n + m + 1
+    v = [0] * (2 * offset + 1)
+    trace = []
+    for d in range(min(n + m, max_cost) + 1):
+        for k in range(-d, d + 1, 2):
+            if k == -d or (k != d and v[offset + k - 1] < v[offset + k + 1]):
+                x = v[offset + k + 1]
+            else:
+                x = v[offset + k - 1] + 1
+            y = x - k
+            if x < n and y < m and a[a_lo + x] == b[b_lo + y]:
+                x += _common_prefix(a, b, a_lo + x, a_hi, b_lo + y, b_hi)
+                y = x - k
+            v[offset + k] = x
+            if x >= n and y >= m:
+                trace.append(v[offset - d:offset + d + 1])
+                return _backtrack(trace, n, m, a_lo, b_lo)
+        trace.append(v[offset - d:offset + d + 1])
+    # too expensive: no matches in here, as far as we're concerned
+    return []
+
+
+def _backtrack(trace, x, y, a_lo, b_lo):
+    matches = []
+    for d in range(len(trace) - 1, 0, -1):
+        previous = trace[d - 1]  # indexed by k + (d - 1)
+        k = x - y
+        if k == -d or (k != d and previous[k - 1 + d - 1] < previous[k + 1 + d - 1]):
+            previous_k = k + 1
+            mid_x = previous[previous_k + d - 1]
+        else:
+            previous_k = k - 1
+            mid_x = previous[previous_k + d - 1] + 1
+        mid_y = mid_x - k
+        if x > mid_x:
+            matches.append((a_lo + mid_x, b_lo + mid_y, x - mid_x))
+        x = previous[previous_k + d - 1]
+        y = x - previous_k
+    if x:
+        matches.append((a_lo, b_lo, x))
+    matches.reverse()
+    return matches
+
+
+def _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi):
+    # Lines which occur exactly once on each side, as (a_index, b_index)
+    # pairs forming the longest sequence increasing on both sides. Counter
+    # and dict(zip()) do the counting and indexing in C.
+    a_lines = a[a_lo:a_hi]
+    b_lines = b[b_lo:b_hi]
+    b_counts = collections.Counter(b_lines)
+    unique = [line for line, count in collections.Counter(a_lines).items() if count == 1 and b_counts.get(line) == 1]
+    if not unique:
+        return []
+    a_positions = dict(zip(a_lines, range(a_lo, a_hi)))
+    b_positions = dict(zip(b_lines, range(b_lo, b_hi)))
+    pairs = sorted((a_positions[line], b_positions[line]) for line in unique)
+    b_order = [b_index for a_index, b_index in pairs]
+    if b_order == sorted(b_order):
+        # nothing moved, which is the usual case
+        return pairs
+    # patience sort on the b side, remembering each card's predecessor
+    tops = []
+    top_cards = []
+    previous = []
+    for card, b_index in enumerate(b_order):
+        pile = bisect.bisect_left(tops, b_index)
+        previous.append(top_cards[pile - 1] if pile else -1)
+        if pile == len(tops):
+            tops.append(b_index)
+            top_cards.append(card)
+        else:
+            tops[pile] = b_index
+            top_cards[pile] = card
+    anchors = []
+    card = top_cards[-1]
+    while card != -1:
+        anchors.append(pairs[card])
+        card = previous[card]
+    anchors.reverse()
+    return anchors
+
+
+def _patience(a, b, a_lo, a_hi, b_lo, b_hi, max_cost):
+    matches = []
+    prefix = _common_prefix(a, b, a_lo, a_hi, b_lo, b_hi)
+    if prefix:
+        matches.append((a_lo, b_lo, prefix))
+        a_lo += prefix
+        b_lo += prefix
+    suffix = _common_suffix(a, b, a_lo, a_hi, b_lo, b_hi)
+    a_hi -= suffix
+    b_hi -= suffix
+    anchors = []
+    if a_lo < a_hi and b_lo < b_hi:
+        anchors = _unique_anchors(a, b, a_lo, a_hi, b_lo, b_hi)
+    if not anchors:
+        matches.extend(_myers(a, b, a_lo, a_hi, b_lo, b_hi, max_cost))
+    else:
+        for a_anchor, b_anchor in anchors + [(a_hi, b_hi)]:
+            if a_lo < a_anchor and a_anchor - a_lo == b_anchor - b_lo and a[a_lo:a_anchor] == b[b_lo:b_anchor]:
+                # a run of matching (but not unique) lines, e.g. a blank one
+                last = matches[-1] if matches else None
+                if last and last[0] + last[2] == a_lo and last[1] + last[2] == b_lo:
+                    matches[-1] = (last[0], last[1], last[2] + a_anchor - a_lo)
+                else:
+                    matches.append((a_lo, b_lo, a_anchor - a_lo))
+            elif a_anchor > a_lo and b_anchor > b_lo:
+                matches.extend(_patience(a, b, a_lo, a_anchor, b_lo, b_anchor, max_cost))
+            if a_anchor == a_hi:
+                break
+            last = matches[-1] if matches else None
+            if last and last[0] + last[2] == a_anchor and last[1] + last[2] == b_anchor:
+                # most anchors just carry on from the one before
+                matches[-1] = (last[0], last[1], last[2] + 1)
+            else:
+                matches.append((a_anchor, b_anchor, 1))
+            a_lo, b_lo = a_anchor + 1, b_anchor + 1
+    if suffix:
+        matches.append((a_hi, b_hi, suffix))
+    return matches
+
+
+def diff(a, b, algorithm='myers', max_cost=MAX_COST):
+    # The changed stretches of two lists of lines, as (a_start, a_end,
+    # b_start, b_end): a[a_start:a_end] was replaced by b[b_start:b_end].
+
+    # Most edits leave the start and end of a file alone, and those are
+    # cheap to skip before doing anything clever
+    a_hi, b_hi = len(a), len(b)
+    a_lo = b_lo = _common_prefix(a, b, 0, a_hi, 0, b_hi)
+    suffix = _common_suffix(a, b, a_lo, a_hi, b_lo, b_hi)
+    a_hi -= suffix
+    b_hi -= suffix
+    if a_lo == a_hi and b_lo == b_hi:
+        return []
+
+    engine = _patience if algorithm == 'patience' else _myers
+    matches = engine(a, b, a_lo, a_hi, b_lo, b_hi, max_cost)
+
+    changes = []
+    a_position, b_position = a_lo, b_lo
+    for a_start, b_start, length in matches + [(a_hi, b_hi, 0)]:
+        if a_start > a_position or b_start > b_position:
+            changes.append((a_position, a_start, b_position, b_start))
+        a_position, b_position = a_start + length, b_start + length
+    return changes
+
+
+class Alignment(object):
+    # A diff between base and buffer (lists of anything comparable) which
+    # after an edit re-diffs only the stretch around it, so it costs what
+    # the edit costs rather than what the file does
+
+    def __init__(self, base, buffer, algorithm='myers', max_cost=MAX_COST):
+        self.base = base
+        self.buffer = buffer
+        self.algorithm = algorithm
+        self.max_cost = max_cost
+        self.changes = diff(base, buffer, algorithm, max_cost)
+
+    def replace(self, start, end, lines):
+        # buffer[start:end] has become lines
+        changes = self.changes
+        delta = len(lines) - (end - start)
+        # the changes which overlap or touch the edited lines
+        first = bisect.bisect_left([change[3] for change in changes], start)
+        last = first
+        while last < len(changes) and changes[last][2] <= end:
+            last += 1
+        touched = changes[first:last]
+        # offset from base to buffer lines just before and after them
+        before = changes[first - 1][3] - changes[first - 1][1] if first else 0
+        after = touched[-1][3] - touched[-1][1] if touched else before
+        lo = min(start, touched[0][2]) if touched else start
+        hi = max(end, touched[-1][3]) if touched else end
+        a_lo, a_hi = lo - before, hi - after
+
+        self.buffer[start:end] = lines
+        spliced = [
+            (a_start + a_lo, a_end + a_lo, b_start + lo, b_end + lo)
+            for a_start, a_end, b_start, b_end in diff(
+                self.base[a_lo:a_hi], self.buffer[lo:hi + delta], self.algorithm, self.max_cost)
+        ]
+        if delta:
+            spliced.extend(
+                (a_start, a_end, b_start + delta, b_end + delta)
+                for a_start, a_end, b_start, b_end in changes[last:]
+            )
+        else:
+            spliced.extend(changes[last:])
+        self.changes = changes[:first] + spliced
+
+    def update(self, buffer):
+        # the buffer is now this; work out what changed and replace() it
+        old = self.buffer
+        prefix = _common_prefix(old, buffer, 0, len(old), 0, len(buffer))
+        if prefix == len(old) == len(buffer):
+            return
+        suffix = _common_suffix(old, buffer, prefix, len(old), prefix, len(buffer))
+        self.replace(prefix, len(old) - suffix, buffer[prefix:len(buffer) - suffix])
+
+
+def annotations(changes):
+    # diff() output as the [type, line] list annotate() wants: 'x' for a
+    # changed line, '+' an added one, '-' a deletion (at the line after it)
+    result = []
+    for a_start, a_end, b_start, b_end in changes:
+        if b_start == b_end:
+            result.append(['-', b_start])
+        else:
+            change_type = 'x' if a_start != a_end else '+'
+            result.extend([change_type, line] for line in range(b_start, b_end))
+    return result
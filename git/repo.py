@@ -3,7 +3,8 @@ from __future__ import absolute_import, unicode_literals, print_function, divisi
 import os
 
 import sublime
-from . import GitWindowCommand, git_root_exist
+from . import GitWindowCommand, git_root, git_root_exist
+from .statusbar import refresh_repo_status
 
 
 class GitInit(object):
@@ -56,8 +57,7 @@ class GitBranchCommand(GitWindowCommand):
         self.panel(result)
         global branch
         branch = ""
-        for view in self.window.views():
-            view.run_command("git_branch_status")
+        refresh_repo_status(git_root(self.get_working_dir()), self.window.views())
 
 
 class GitMergeCommand(GitBranchCommand):
@@ -88,8 +88,7 @@ class GitNewBranchCommand(GitWindowCommand):
 
     def branch_done(self, result):
         self.panel(result)
-        for view in self.window.views():
-            view.run_command("git_branch_status")
+        refresh_repo_status(git_root(self.get_working_dir()), self.window.views())
 
 
 class GitTrackRemoteBranchCommand(GitBranchCommand):
@@ -0,0 +1,487 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+import functools
+import gc
+import itertools
+import operator
+import os
+import stat
+import threading
+import time
+
+
+_states = {}
+
+
+def find_git_dirs(root):
+    # (git_dir, common_dir) for a worktree root. For linked worktrees and
+    # submodules .git is a file pointing at the real one, which may point
+    # in turn at the directory the worktrees share (refs, packed-refs)
+    git_dir = os.path.join(root, '.git')
+    if os.path.isfile(git_dir):
+        try:
+            with open(git_dir) as f:
+                contents = f.read().strip()
+        except (IOError, OSError):
+            contents = ''
+        if contents.startswith('gitdir:'):
+            git_dir = os.path.normpath(os.path.join(root, contents[len('gitdir:'):].strip()))
+    common_dir = git_dir
+    try:
+        with open(os.path.join(git_dir, 'commondir')) as f:
+            common_dir = os.path.normpath(os.path.join(git_dir, f.read().strip()))
+    except (IOError, OSError):
+        pass
+    return git_dir, common_dir
+
+
+def _identity(path):
+    # What tells GitRootCache a .git is still the one it found, or None if
+    # it's gone. A .git directory's mtime moves whenever the index or a ref
+    # is rewritten, so directories go by inode; a .git file (linked
+    # worktrees, submodules) only changes when it's repointed, so for those
+    # the mtime and size count too.
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if stat.S_ISDIR(st.st_mode):
+        return (True, st.st_dev, st.st_ino)
+    return (False, st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+
+
+def is_worktree_root(directory):
+    dot_git = os.path.join(directory, '.git')
+    if os.path.isdir(dot_git):
+        return True
+    if os.path.isfile(dot_git):
+        # a gitfile only makes a repo if it points at a git dir which exists
+        git_dir, common_dir = find_git_dirs(directory)
+        return os.path.isdir(git_dir) and os.path.isdir(common_dir)
+    return False
+
+
+class GitRootCache(object):
+    # Which worktree root each directory is in, for the last max_size
+    # directories asked about. A walk up the tree records every directory it
+    # passed and stops at one that's already known. Roots are trusted until
+    # their .git changes; other directories until a .git appears in them or
+    # ttl seconds pass, since a new repo could appear between them and
+    # their root.
+    ttl = 5
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self.entries = collections.OrderedDict()  # directory -> (root, identity, expires)
+        self.lock = threading.Lock()
+
+    def _get(self, directory):
+        # With the lock held. Returns the root, False for "not in a repo", or
+        # None if we don't know (or knew, but it's out of date)
+        entry = self.entries.pop(directory, None)
+        if entry is None:
+            return None
+        root, identity, expires = entry
+        if root and _identity(os.path.join(root, '.git')) != identity:
+            return None
+        if directory != root and (time.time() >= expires or os.path.lexists(os.path.join(directory, '.git'))):
+            return None
+        # re-inserting makes it the most recently used
+        self.entries[directory] = entry
+        return root
+
+    def _put(self, directories, root):
+        entry = (root, root and _identity(os.path.join(root, '.git')), time.time() + self.ttl)
+        with self.lock:
+            for directory in directories:
+                self.entries.pop(directory, None)
+                self.entries[directory] = entry
+            while len(self.entries) > self.max_size:
+                self.entries.popitem(last=False)
+
+    def lookup(self, directory):
+        with self.lock:
+            root = self._get(directory)
+        if root is not None:
+            return root
+        visited = []
+        root = False
+        while directory:
+            if visited:
+                with self.lock:
+                    known = self._get(directory)
+                if known is not None:
+                    root = known
+                    break
+            visited.append(directory)
+            if is_worktree_root(directory):
+                root = directory
+                break
+            # Resolve symlinks once, on the way out of the leaf (what
+            # realpath(leaf/..) would do); everything above that is real
+            parent = os.path.dirname(os.path.realpath(directory) if len(visited) == 1 else directory)
+            if parent == directory:
+                # /.. == /
+                break
+            directory = parent
+        self._put(visited, root)
+        return root
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+def _read(path):
+    try:
+        with open(path) as f:
+            return f.read()
+    except (IOError, OSError):
+        return None
+
+
+def _stat(path):
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_mtime, st.st_size)
+
+
+def read_head(git_dir, common_dir):
+    # (ref, oid) for HEAD without running git; ref is None when HEAD is
+    # detached, oid is None for an unborn branch
+    head = (_read(os.path.join(git_dir, 'HEAD')) or '').strip()
+    if not head.startswith('ref:'):
+        return None, head or None
+    ref = head[len('ref:'):].strip()
+    oid = _read(os.path.join(common_dir, ref))
+    if oid:
+        return ref, oid.strip()
+    for line in (_read(os.path.join(common_dir, 'packed-refs')) or '').splitlines():
+        if line.endswith(' ' + ref):
+            return ref, line.split(' ', 1)[0]
+    return ref, None
+
+
+class StatusSnapshot(object):
+    # `git status --porcelain=v2 --branch -z`, parsed. entries are (XY,
+    # path, original path) with XY as porcelain v1 has it; index and working
+    # count them by X and Y. index_stat is the index's stat from just before
+    # git was asked. error is what git said if it failed or timed out, in
+    # which case there's nothing else.
+
+    def __init__(self, error=None):
+        self.error = error
+        self.oid = None
+        self.branch = None
+        self.upstream = None
+        self.ahead = 0
+        self.behind = 0
+        self.entries = []
+        self.index = collections.Counter()
+        self.working = collections.Counter()
+        self.index_stat = None
+        self._porcelain = None
+
+    def porcelain(self):
+        # the entries as `git status --porcelain` (v1) would list them
+        if self._porcelain is None:
+            self._porcelain = ''.join(
+                '%s %s -> %s\n' % (xy, original, path) if original else '%s %s\n' % (xy, path)
+                for xy, path, original in self.entries
+            )
+        return self._porcelain
+
+
+# fields before the path in each kind of v2 entry
+_V2_FIELDS = {'1': 8, '2': 9, 'u': 10}
+# v2 writes an unchanged side as '.', v1 (and everything here) as ' '; an
+# untracked or ignored entry's code is its first two characters
+_XY = {'? ': '??', '! ': '!!'}
+
+
+def _xy(code):
+    xy = _XY.get(code)
+    if xy is None:
+        xy = _XY[code] = code.replace('.', ' ')
+    return xy
+
+
+def _parse_header(snapshot, record):
+    key, _, value = record[2:].partition(' ')
+    if key == 'branch.oid':
+        snapshot.oid = None if value == '(initial)' else value
+    elif key == 'branch.head':
+        snapshot.branch = None if value == '(detached)' else value
+    elif key == 'branch.upstream':
+        snapshot.upstream = value
+    elif key == 'branch.ab':
+        ahead, _, behind = value.partition(' ')
+        snapshot.ahead = int(ahead)
+        snapshot.behind = -int(behind)
+
+
+def _bisect(records, low, kinds):
+    # The first record from low on which starts with one of kinds, given
+    # that those all come after the rest: git lists tracked changes, then
+    # untracked files, then ignored ones
+    high = len(records)
+    while low < high:
+        middle = (low + high) // 2
+        if records[middle][:1] in kinds:
+            high = middle
+        else:
+            low = middle + 1
+    return low
+
+
+def _tracked_entries(records, index):
+    # One record at a time, since a rename's or copy's source is the record
+    # after it, and could start with anything. Returns the entries and
+    # where the untracked records start.
+    entries = []
+    append = entries.append
+    xy_of = _XY.get
+    # where the path starts in a '1' entry, which depends on how long object
+    # names are; found from the first one
+    ordinary = None
+    count = len(records)
+    while index < count:
+        record = records[index]
+        kind = record[:1]
+        if kind == '1':
+            if ordinary is None:
+                ordinary = len(record) - len(record.split(' ', _V2_FIELDS[kind])[-1])
+            code = record[2:4]
+            append((xy_of(code) or _xy(code), record[ordinary:], None))
+        elif kind == '2':
+            index += 1
+            append((_xy(record[2:4]), record.split(' ', _V2_FIELDS[kind])[-1], records[index] if index < count else ''))
+        elif kind == 'u':
+            append((_xy(record[2:4]), record.split(' ', _V2_FIELDS[kind])[-1], None))
+        elif kind == '?' or kind == '!':
+            break
+        index += 1
+    return entries, index
+
+
+def parse_status(output):
+    # Status lists can run to hundreds of thousands of entries. Making that
+    # many would otherwise set off several garbage collections, none of
+    # which can find anything
+    enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _parse_status(output)
+    finally:
+        if enabled:
+            gc.enable()
+
+
+def _parse_status(output):
+    # As little per entry as possible: everything before the path in an
+    # ordinary change is of fixed width, so one slice gets the path, and
+    # unless there are renames or conflicts the entries are made in bulk
+    # and counted by code rather than by entry
+    snapshot = StatusSnapshot()
+    records = output.split('\0')
+    if records[-1] == '':
+        records.pop()
+    headers = 0
+    while headers < len(records) and records[headers][:1] == '#':
+        _parse_header(snapshot, records[headers])
+        headers += 1
+
+    untracked = _bisect(records, headers, ('?', '!'))
+    tracked = records[headers:untracked]
+    codes = list(map(operator.itemgetter(slice(0, 4)), tracked))
+    code_counts = collections.Counter(codes)
+    if all(code.startswith('1 ') for code in code_counts):
+        # nothing but ordinary changes
+        xy_of = dict((code, _xy(code[2:])) for code in code_counts)
+        if tracked:
+            first = tracked[0]
+            ordinary = len(first) - len(first.split(' ', _V2_FIELDS['1'])[-1])
+            snapshot.entries = list(zip(
+                map(xy_of.__getitem__, codes), map(operator.itemgetter(slice(ordinary, None)), tracked),
+                itertools.repeat(None)
+            ))
+        counts = collections.Counter()
+        for code, count in code_counts.items():
+            counts[xy_of[code]] += count
+    else:
+        snapshot.entries, untracked = _tracked_entries(records, headers)
+        counts = collections.Counter(map(operator.itemgetter(0), snapshot.entries))
+
+    ignored = _bisect(records, untracked, ('!',))
+    counts['??'] += ignored - untracked
+    counts['!!'] += len(records) - ignored
+    snapshot.entries.extend(zip(
+        itertools.chain(itertools.repeat('??', ignored - untracked), itertools.repeat('!!', len(records) - ignored)),
+        map(operator.itemgetter(slice(2, None)), records[untracked:]), itertools.repeat(None)
+    ))
+
+    # there are only a handful of different codes, however many entries
+    for xy, count in counts.items():
+        if count and xy[0] != ' ':
+            snapshot.index[xy[0]] += count
+        if count and xy[1] != ' ':
+            snapshot.working[xy[1]] += count
+    return snapshot
+
+
+def _outlasts(timeout, other):
+    # whether a fetch given `timeout` seconds gets at least as long as one
+    # given `other` (None or 0 being no limit)
+    return not timeout or bool(other) and timeout >= other
+
+
+class RepoState(object):
+    # What we last saw of a repo's HEAD and `git status`, handed out again
+    # until HEAD, the index or the current ref change on disk, something
+    # says the worktree changed (e.g. a save), or it's max_age seconds old
+    max_age = 2
+    # give up on a fetch which hasn't come back after this long
+    fetch_timeout = 30
+
+    def __init__(self, root):
+        self.root = root
+        self.git_dir, self.common_dir = find_git_dirs(root)
+        self.generation = 0
+        self.signature = None
+        self.fetched = 0
+        self.snapshot = None
+        self.waiting = None
+        self.waiting_signature = None
+        self.waiting_since = 0
+        self.waiting_timeout = None
+        # counts fetches, so only the latest one's result is used
+        self.fetches = 0
+        self.last_head = None  # (signature, ref, oid)
+
+    def head_signature(self, ref):
+        return (
+            _stat(os.path.join(self.git_dir, 'HEAD')),
+            ref and _stat(os.path.join(self.common_dir, ref)),
+            _stat(os.path.join(self.common_dir, 'packed-refs')),
+        )
+
+    def read_head(self):
+        # (ref, oid) for HEAD, re-read only when the stats of HEAD or its
+        # ref say one of them has changed
+        last = self.last_head
+        # stat before reading, so a change made in between is caught next time
+        signature = self.head_signature(last and last[1])
+        if last is not None and last[0] == signature:
+            return last[1], last[2]
+        ref, oid = read_head(self.git_dir, self.common_dir)
+        if last is None or ref != last[1]:
+            # we stat'd the wrong ref file; don't trust this until next time
+            signature = None
+        self.last_head = (signature, ref, oid)
+        return ref, oid
+
+    def current_signature(self):
+        ref, oid = self.read_head()
+        return (
+            self.generation,
+            _stat(os.path.join(self.git_dir, 'HEAD')),
+            self.index_stat(),
+            _stat(os.path.join(self.common_dir, 'packed-refs')),
+            ref and _stat(os.path.join(self.common_dir, ref)),
+            oid,
+        )
+
+    def index_stat(self):
+        return _stat(os.path.join(self.git_dir, 'index'))
+
+    def invalidate(self):
+        self.generation += 1
+
+    @property
+    def ref(self):
+        return self.read_head()[0]
+
+    @property
+    def head(self):
+        return self.read_head()[1]
+
+    @property
+    def branch(self):
+        # what `git rev-parse --abbrev-ref HEAD` would say
+        ref = self.ref
+        if ref is None:
+            return 'HEAD'
+        if ref.startswith('refs/heads/'):
+            return ref[len('refs/heads/'):]
+        return ref
+
+    def is_fresh(self, signature):
+        return (
+            self.snapshot is not None
+            and signature == self.signature
+            and time.time() - self.fetched < self.max_age
+        )
+
+    def status_snapshot(self, run_command, callback, timeout=None):
+        # Calls callback with a StatusSnapshot, straight away if nothing's
+        # changed, otherwise once run_command(command, callback, parse=...)
+        # has asked git. Requests made meanwhile share that fetch, unless it
+        # was given less than timeout seconds.
+        signature = self.current_signature()
+        if self.is_fresh(signature):
+            callback(self.snapshot)
+            return
+        if (
+            self.waiting is not None
+            and self.waiting_signature == signature
+            and time.time() - self.waiting_since < self.fetch_timeout
+            and _outlasts(self.waiting_timeout, timeout)
+        ):
+            self.waiting.append(callback)
+            return
+        # (anything still waiting on an older fetch gets this one's result)
+        self.waiting = (self.waiting or []) + [callback]
+        self.waiting_signature = signature
+        self.waiting_since = time.time()
+        self.waiting_timeout = timeout
+        self.fetches += 1
+        run_command(
+            ['git', '--no-optional-locks', 'status', '--porcelain=v2', '--branch', '-z'],
+            functools.partial(self.status_done, self.fetches, signature), parse=parse_status
+        )
+
+    def status_done(self, fetch, signature, result):
+        if fetch != self.fetches or self.waiting is None:
+            # superseded by a later fetch, which will deal with the callbacks
+            return
+        waiting, self.waiting, self.waiting_signature = self.waiting, None, None
+        if not isinstance(result, StatusSnapshot):
+            # git failed or timed out (or couldn't be run at all): tell
+            # everyone, but don't keep it
+            error = StatusSnapshot(result.strip() if result else "git status failed")
+            for callback in waiting:
+                callback(error)
+            return
+        # Store this against the signature from *before* git ran, so that
+        # anything which changed in the meantime triggers another look
+        result.index_stat = signature[2]
+        self.snapshot = result
+        self.signature = signature
+        self.fetched = time.time()
+        for callback in waiting:
+            callback(self.snapshot)
+
+
+def repo_state(root):
+    if root not in _states:
+        _states[root] = RepoState(root)
+    return _states[root]
+
+
+def worktree_changed(root):
+    # Something (e.g. a save) changed the worktree behind git's back
+    if root in _states:
+        _states[root].invalidate()
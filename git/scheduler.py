@@ -0,0 +1,141 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+import threading
+import time
+import traceback
+
+
+# Subcommands which never touch the index, refs or worktree. Anything not
+# listed here is treated as a write and runs exclusively within its repo,
+# because guessing wrong the other way round corrupts things.
+READ_ONLY_SUBCOMMANDS = frozenset((
+    'blame', 'cat-file', 'describe', 'diff', 'grep', 'log', 'ls-files',
+    'ls-tree', 'rev-list', 'rev-parse', 'shortlog', 'show', 'status',
+))
+
+# Subcommands which only list things when they're given no positional
+# arguments (`git branch` vs `git branch -d foo`)
+LISTING_SUBCOMMANDS = frozenset(('branch', 'remote', 'tag'))
+
+
+def is_read_only(command):
+    # whether a git argv can safely run alongside other reads
+    args = [arg for arg in command[1:] if arg]
+    # skip global options, e.g. `git --no-optional-locks status`
+    while args and args[0].startswith('-'):
+        args = args[2:] if args[0] in ('-c', '-C') else args[1:]
+    if not args:
+        return False
+    subcommand, rest = args[0], args[1:]
+    if subcommand in READ_ONLY_SUBCOMMANDS:
+        return True
+    if subcommand in LISTING_SUBCOMMANDS:
+        return not [arg for arg in rest if not arg.startswith('-')]
+    if subcommand == 'stash':
+        return bool(rest) and rest[0] in ('list', 'show')
+    if subcommand == 'config':
+        return len([arg for arg in rest if not arg.startswith('-')]) == 1
+    return False
+
+
+class CommandScheduler(object):
+    # Runs jobs (anything with repo, exclusive and run()) on at most
+    # max_workers threads, with at most max_per_repo reads at once per repo.
+    # An exclusive job waits for its repo to drain and then runs alone, and
+    # nothing queued after it for that repo starts before it.
+    idle_timeout = 30
+
+    def __init__(self, max_workers=4, max_per_repo=2):
+        self.max_workers = max(1, max_workers)
+        self.max_per_repo = max(1, max_per_repo)
+        self.condition = threading.Condition()
+        self.pending = collections.deque()
+        self.running = {}  # repo -> number of running jobs
+        self.exclusive = set()  # repos with an exclusive job running
+        self.workers = 0
+        self.idle_workers = 0
+
+    def submit(self, job):
+        with self.condition:
+            self.pending.append(job)
+            if self.idle_workers:
+                self.condition.notify()
+            elif self.workers < self.max_workers:
+                self.workers += 1
+                worker = threading.Thread(target=self._work, name='GitCommandWorker')
+                worker.daemon = True
+                worker.start()
+
+    def discard(self, job):
+        # drop a job that hasn't started yet; returns whether it was found
+        with self.condition:
+            try:
+                self.pending.remove(job)
+            except ValueError:
+                return False
+            # it might have been the thing holding up a later job
+            self.condition.notify_all()
+            return True
+
+    def _next_job(self):
+        # Called with the condition held. Walk the queue in order, keeping
+        # track of which repos have an earlier job still waiting, so that
+        # nothing overtakes an exclusive job (or is overtaken by one).
+        blocked = set()
+        waiting_reads = set()
+        for job in self.pending:
+            repo = job.repo
+            if repo in blocked:
+                continue
+            running = self.running.get(repo, 0)
+            if job.exclusive:
+                if not running and repo not in waiting_reads:
+                    self.pending.remove(job)
+                    return job
+                blocked.add(repo)
+            else:
+                if repo not in self.exclusive and running < self.max_per_repo:
+                    self.pending.remove(job)
+                    return job
+                waiting_reads.add(repo)
+        return None
+
+    def _work(self):
+        try:
+            self._work_loop()
+        finally:
+            # however the thread ends, make room for another
+            with self.condition:
+                self.workers -= 1
+                self.condition.notify_all()
+
+    def _work_loop(self):
+        while True:
+            with self.condition:
+                job = self._next_job()
+                while job is None:
+                    self.idle_workers += 1
+                    started = time.time()
+                    self.condition.wait(self.idle_timeout)
+                    self.idle_workers -= 1
+                    job = self._next_job()
+                    if job is None and not self.pending and time.time() - started >= self.idle_timeout:
+                        # nothing to do for a while; let the thread go
+                        return
+                self.running[job.repo] = self.running.get(job.repo, 0) + 1
+                if job.exclusive:
+                    self.exclusive.add(job.repo)
+            try:
+                job.run()
+            except Exception:
+                # one broken job mustn't take the worker (and so, eventually,
+                # every git command) down with it
+                traceback.print_exc()
+            finally:
+                with self.condition:
+                    self.running[job.repo] -= 1
+                    if not self.running[job.repo]:
+                        del self.running[job.repo]
+                    self.exclusive.discard(job.repo)
+                    self.condition.notify_all()
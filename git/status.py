@@ -1,47 +1,223 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
+import collections
+import functools
 import os
-import re
 
 import sublime
 from . import GitWindowCommand, git_root
+from . import telemetry
+from .repostate import repo_state
+
+
+def status_line(entry):
+    # an entry as `git status --porcelain` shows it
+    xy, path, original = entry
+    if original is not None:
+        return '%s %s -> %s' % (xy, original, path)
+    return '%s %s' % (xy, path)
+
+
+# what a directory's entries are, by the letter of theirs which matters most
+# (the working tree's, if it has one)
+STATUS_NAMES = {
+    'M': 'modified', 'T': 'modified', 'A': 'added', 'D': 'deleted', 'R': 'renamed',
+    'C': 'copied', 'U': 'conflicted', '?': 'untracked', '!': 'ignored',
+}
+
+# an item which shows another page of the list: the entries under prefix,
+# from the start'th item on
+PageLink = collections.namedtuple('PageLink', 'prefix start')
+
+
+def staged_entry(entry):
+    # what an entry becomes once `git add` (or `git rm`) has staged it;
+    # None if that leaves nothing to show
+    xy, path, original = entry
+    if xy == '??':
+        return ('A ', path, None)
+    x, y = xy
+    if y == 'D':
+        return None if x == 'A' else ('D ', path, None)
+    if x in 'ARC':
+        # still added, renamed or copied, just with the newer content
+        return (x + ' ', path, original)
+    return (('T' if y == 'T' else 'M') + ' ', path, original)
+
+
+class StatusPage(object):
+    # One quick panel's worth of a status list which may be huge. Past
+    # `size` entries under `prefix`, each directory with several becomes one
+    # item to drill into, and items are shown `size` at a time. targets
+    # holds, per item, its entry, a PageLink or the index of a header item.
+
+    def __init__(self, entries, prefix='', start=0, size=1000, header=()):
+        self.prefix = prefix
+        if prefix:
+            entries = [entry for entry in entries if entry[1].startswith(prefix)]
+        self.items = []
+        self.targets = []
+        for index, item in enumerate(header):
+            self.add(item, index)
+        if len(entries) <= size and not start:
+            for entry in entries:
+                self.add(status_line(entry), entry)
+            return
+        groups, files = self.group(entries, len(prefix))
+        rows = [PageLink(directory, 0) for directory in sorted(groups)] + files
+        for row in rows[start:start + size]:
+            if isinstance(row, PageLink):
+                self.add(self.group_line(row.prefix, groups[row.prefix]), row)
+            else:
+                self.add(status_line(row), row)
+        if start + size < len(rows):
+            self.add("\u2026 %s more" % format(len(rows) - start - size, ','), PageLink(prefix, start + size))
+
+    def add(self, item, target):
+        self.items.append(item)
+        self.targets.append(target)
+
+    def group(self, entries, depth):
+        # -> ({subdirectory/: Counter of XY codes}, [entries directly in
+        # here]), with a subdirectory of just one entry left as that entry.
+        # (An untracked directory shows up as 'build/': that's an entry
+        # directly in here, not a subdirectory.) This can be 100k+ entries
+        # on the main thread, so the per-entry work is in comprehensions
+        # and Counter.
+        directories = [path[:path.find('/', depth, -1) + 1] or path for xy, path, original in entries]
+        sizes = collections.Counter(directories)
+        files = [entry for entry, directory in zip(entries, directories) if sizes[directory] == 1]
+        groups = collections.defaultdict(collections.Counter)
+        for (directory, xy), count in collections.Counter(zip(directories, [entry[0] for entry in entries])).items():
+            if sizes[directory] > 1:
+                groups[directory][xy] += count
+        return groups, files
+
+    def group_line(self, directory, counts):
+        kinds = collections.Counter()
+        for xy, count in counts.items():
+            kinds[STATUS_NAMES.get(xy[1] if xy[1] != ' ' else xy[0], 'changed')] += count
+        return "%s \u2014 %s" % (directory, ', '.join(
+            "%s %s" % (format(count, ','), name) for name, count in kinds.most_common()
+        ))
 
 
 class GitStatusCommand(GitWindowCommand):
     force_open = False
+    # how long the paths on one command line may get (Windows allows 32k
+    # characters in all)
+    batch_chars = 16000
 
     def run(self):
-        self.run_command(['git', 'status', '--porcelain'], self.status_done)
+        self.repo_snapshot(self.status_done)
 
-    def status_done(self, result):
-        self.results = list(filter(self.status_filter, result.rstrip().split('\n')))
-        if len(self.results):
+    def status_done(self, snapshot):
+        if snapshot.error:
+            self.panel(snapshot.error)
+            return
+        # (XY, path, original path) records, as git gave them: paths aren't
+        # quoted, so there's nothing to undo before handing them back to git
+        self.entries = [entry for entry in snapshot.entries if self.status_filter(entry)]
+        self.index_stat = snapshot.index_stat
+        if len(self.entries):
             self.show_status_list()
         else:
             sublime.status_message("Nothing to show")
 
-    def show_status_list(self):
+    def status_list_header(self, prefix):
+        # items to offer above the entries on the first page of the list (or
+        # of a directory in it)
+        return []
+
+    def show_status_list(self, prefix='', start=0):
+        size = sublime.load_settings("Git.sublime-settings").get('status_list_page_size') or 1000
+        header = self.status_list_header(prefix) if not start else []
+        self.page = StatusPage(self.entries, prefix, start, size, header)
+        self.results = self.page.items
         self.quick_panel(
             self.results, self.panel_done,
             sublime.MONOSPACE_FONT
         )
 
-    def status_filter(self, item):
+    def status_filter(self, entry):
         # for this class we don't actually care
-        if not re.match(r'^[ MADRCU?!]{1,2}\s+.*', item):
-            return False
-        return len(item) > 0
+        return True
 
     def panel_done(self, picked):
         if 0 > picked < len(self.results):
             return
-        picked_file = self.results[picked]
-        if isinstance(picked_file, (list, tuple)):
-            picked_file = picked_file[0]
-        # first 2 characters are status codes, the third is a space
-        picked_status = picked_file[:2]
-        picked_file = picked_file[3:]
-        self.panel_followup(picked_status, picked_file, picked)
+        target = self.page.targets[picked]
+        if isinstance(target, PageLink):
+            # a quick panel can't be shown from inside another's callback
+            sublime.set_timeout(lambda: self.show_status_list(target.prefix, target.start), 0)
+        elif isinstance(target, tuple):
+            picked_status, picked_file, original = target
+            self.panel_followup(picked_status, picked_file, None)
+        else:
+            self.panel_followup('', '', target)
+
+    def change_entries(self, jobs, update):
+        # jobs are (command, entries): each command is run on its entries'
+        # paths, or as it is for None. update(entry) gives what a touched
+        # entry has become (None for gone), so the list needn't be re-read
+        # unless a command failed or something else changed the index.
+        root = git_root(self.get_working_dir())
+        commands = []
+        touched = set()
+        for command, entries in jobs:
+            if entries is None:
+                commands.append(command)
+                touched = None
+                continue
+            batch = []
+            size = 0
+            for xy, path, original in entries:
+                if batch and size + len(path) > self.batch_chars:
+                    commands.append(command + ['--'] + batch)
+                    batch = []
+                    size = 0
+                batch.append(path)
+                size += len(path) + 1
+            if batch:
+                commands.append(command + ['--'] + batch)
+            if touched is not None:
+                touched.update(path for xy, path, original in entries)
+        unexpected = repo_state(root).index_stat() != self.index_stat
+        done = functools.partial(self.entries_changed, update, touched, unexpected, root)
+        self.run_commands(commands, root, done)
+
+    def run_commands(self, commands, root, callback, result='', failed=False):
+        # one after the other, since each takes the index lock
+        failed = failed or 'fatal: ' in result or 'error: ' in result
+        if not commands:
+            callback(failed)
+            return
+        self.run_command(
+            commands[0], functools.partial(self.run_commands, commands[1:], root, callback),
+            working_dir=root, failed=failed
+        )
+
+    def entries_changed(self, update, touched, unexpected, root, failed):
+        if unexpected or failed:
+            self.run()
+            return
+        entries = []
+        for entry in self.entries:
+            if touched is None or entry[1] in touched:
+                entry = update(entry)
+                if entry is None or not self.status_filter(entry):
+                    continue
+            entries.append(entry)
+        self.entries = entries
+        self.index_stat = repo_state(root).index_stat()
+        telemetry.count('status list rescans avoided')
+        if not entries:
+            sublime.status_message("Nothing to show")
+            return
+        prefix = self.page.prefix
+        if not any(entry[1].startswith(prefix) for entry in entries):
+            prefix = ''
+        self.show_status_list(prefix)
 
     def panel_followup(self, picked_status, picked_file, picked_index):
         # split out solely so I can override it for laughs
@@ -57,13 +233,10 @@ class GitStatusCommand(GitWindowCommand):
                 sublime.set_timeout(lambda: self.window.open_file(file_name), 0)
         else:
             if s.get('diff_tool'):
-                self.run_command(
-                    ['git', 'difftool', '--', picked_file.strip('"')],
-                    working_dir=root
-                )
+                self.launch(['git', 'difftool', '--', picked_file], working_dir=root)
             else:
                 self.run_command(
-                    ['git', 'diff', '--no-color', '--', picked_file.strip('"')],
+                    ['git', 'diff', '--no-color', '--', picked_file],
                     self.diff_done, working_dir=root
                 )
 
@@ -73,9 +246,62 @@ class GitStatusCommand(GitWindowCommand):
         self.scratch(result, title="Git Diff")
 
 
+def looks_binary(path):
+    # git's test: a NUL in the first 8000 bytes
+    try:
+        with open(path, 'rb') as f:
+            return b'\0' in f.read(8000)
+    except (IOError, OSError):
+        return True
+
+
+class FileOpener(object):
+    # Opens files `batch` at a time, `interval` ms apart, so the editor can
+    # draw in between; binary files and those over `max_size` are skipped
+    batch = 8
+    interval = 50
+
+    def __init__(self, window, paths, max_size):
+        self.window = window
+        self.queue = collections.deque(paths)
+        self.max_size = max_size
+        self.opened = 0
+        self.skipped = 0
+
+    def start(self):
+        # (deferred, as opening files from a panel callback leaves the
+        # new view without focus in Sublime Text 3)
+        sublime.set_timeout(self.open_batch, 0)
+
+    def open_batch(self):
+        for _ in range(min(self.batch, len(self.queue))):
+            path = self.queue.popleft()
+            try:
+                size = os.path.getsize(path)
+            except OSError:
+                # deleted
+                continue
+            if (self.max_size and size > self.max_size) or looks_binary(path):
+                self.skipped += 1
+                continue
+            self.window.open_file(path)
+            self.opened += 1
+        if self.queue:
+            sublime.set_timeout(self.open_batch, self.interval)
+        elif self.skipped:
+            sublime.status_message("Opened %d files; skipped %d binary or very large ones" % (self.opened, self.skipped))
+
+
 class GitOpenModifiedFilesCommand(GitStatusCommand):
     force_open = True
 
     def show_status_list(self):
-        for line_index in range(0, len(self.results)):
-            self.panel_done(line_index)
+        s = sublime.load_settings("Git.sublime-settings")
+        root = git_root(self.get_working_dir())
+        paths = [os.path.join(root, picked_file) for picked_status, picked_file, original in self.entries]
+        limit = s.get('open_modified_files_limit')
+        if limit and len(paths) > limit and not sublime.ok_cancel_dialog(
+            "%d files have changed. Open them all?" % len(paths), "Open All"
+        ):
+            return
+        FileOpener(self.window, paths, s.get('open_modified_files_max_size')).start()
@@ -1,67 +1,198 @@
 from __future__ import absolute_import, unicode_literals, print_function, division
 
-import re
+import functools
+import os
 
 import sublime
 import sublime_plugin
-from . import GitTextCommand
+from . import GitTextCommand, BACKGROUND_TIMEOUT, git_root
+from . import watcher
+from .repostate import repo_state, worktree_changed
+
+
+def view_root(view):
+    return view.file_name() and git_root(os.path.dirname(view.file_name()))
+
+
+class StatusBars(object):
+    # The status bar entries of every view, kept per repo: worked out once
+    # and set on all of the repo's views, in every window
+
+    def __init__(self):
+        self.views = {}  # root -> {view id: view}
+        self.roots = {}  # view id -> root
+        self.entries = {}  # root -> {status key: text} as last set
+        self.generations = {}  # root -> watcher generation they're as of
+
+    def register(self, view, root):
+        old = self.roots.get(view.id())
+        if old is not None and old != root:
+            self.forget(view)
+        self.roots[view.id()] = root
+        self.views.setdefault(root, {})[view.id()] = view
+
+    def forget(self, view):
+        root = self.roots.pop(view.id(), None)
+        views = self.views.get(root)
+        if views is None:
+            return
+        views.pop(view.id(), None)
+        if not views:
+            del self.views[root]
+            self.entries.pop(root, None)
+            self.generations.pop(root, None)
+
+    def is_current(self, root):
+        generation = self.generations.get(root)
+        return root in self.entries and generation is not None and generation == watcher.generation(root)
+
+    def show(self, view):
+        # what the rest of the view's repo has
+        for key, text in self.entries.get(self.roots.get(view.id()), {}).items():
+            view.set_status(key, text)
+
+    def set(self, root, entries):
+        self.entries.setdefault(root, {}).update(entries)
+        for view in list(self.views.get(root, {}).values()):
+            if not view.is_valid():
+                self.forget(view)
+                continue
+            for key, text in entries.items():
+                view.set_status(key, text)
+
+    def refresh(self, root, views=()):
+        # views are any more which might be in the repo, e.g. a window's
+        # which haven't all been activated yet
+        for view in views:
+            if view_root(view) == root:
+                self.register(view, root)
+        for view in list(self.views.get(root, {}).values()):
+            if view.is_valid():
+                view.run_command("git_branch_status")
+                return
+            self.forget(view)
+
+
+_status_bars = StatusBars()
+
+
+def refresh_status_bars(root, kinds=None):
+    _status_bars.refresh(root)
+
+
+watcher.subscribe('statusbar', refresh_status_bars)
+
+
+def refresh_repo_status(root, views=()):
+    # e.g. after a checkout
+    if root:
+        _status_bars.refresh(root, views)
 
 
 class GitBranchStatusListener(sublime_plugin.EventListener):
     def on_activated(self, view):
+        root = view_root(view)
+        if not root:
+            return
+        _status_bars.register(view, root)
+        if watcher.watch(root) and _status_bars.is_current(root):
+            # nothing's changed since the repo's status was last worked out
+            _status_bars.show(view)
+            return
         view.run_command("git_branch_status")
 
     def on_post_save(self, view):
+        # the save changed the worktree, so any status we have is stale
+        root = view_root(view)
+        if root:
+            worktree_changed(root)
         view.run_command("git_branch_status")
 
+    def on_close(self, view):
+        _status_bars.forget(view)
+
+
+# the change letters the status bar counts, in the order it shows them
+STATUS_SYMBOLS = [
+    ('M', 'modified'), ('A', 'added'), ('D', 'deleted'), ('?', 'untracked'),
+    ('U', 'conflicts'), ('R', 'renamed'), ('C', 'copied'),
+]
+
 
 class GitBranchStatusCommand(GitTextCommand):
     def run(self, view):
+        root = view_root(self.view)
+        if not root:
+            return
+        _status_bars.register(self.view, root)
+        _status_bars.generations[root] = watcher.generation(root)
         s = sublime.load_settings("Git.sublime-settings")
         if s.get("statusbar_branch"):
-            self.run_command(['git', 'rev-parse', '--abbrev-ref', 'HEAD'], self.branch_done, show_status=False, no_save=True, error_suppresses_output=True)
+            # HEAD can be read straight from .git, so show that right away;
+            # ahead/behind comes with the status
+            self.branch_done(repo_state(root).branch)
         else:
             self.branch_done(False)
-        if (s.get("statusbar_status")):
-            self.run_command(['git', 'status', '--porcelain'], self.status_done, show_status=False, no_save=True, error_suppresses_output=True)
-        else:
-            self.status_done(False)
+        if s.get("statusbar_status"):
+            self.repo_snapshot(functools.partial(self.snapshot_done, root), show_status=False, no_save=True, timeout=BACKGROUND_TIMEOUT)
+            return
+        self.status_done(False)
+        if s.get("statusbar_branch"):
+            # a whole status just for ahead/behind is a lot of work in a big
+            # repo; this fails (and the plain branch stands) without an upstream
+            self.run_command(
+                ['git', 'rev-list', '--count', '--left-right', '@{upstream}...HEAD'],
+                functools.partial(self.counts_done, root, repo_state(root).branch),
+                working_dir=root, show_status=False, no_save=True,
+                error_suppresses_output=True, timeout=BACKGROUND_TIMEOUT
+            )
 
-    def branch_done(self, result):
-        if result is False:
-            self.view.set_status("git-branch", "")
-        else:
-            self.view.set_status("git-branch", "Git branch: " + result.strip())
+    def snapshot_done(self, root, snapshot):
+        if snapshot.error:
+            # no idea what the changes are; the branch shown from .git stands
+            self.status_done(False, root)
+            return
+        s = sublime.load_settings("Git.sublime-settings")
+        if s.get("statusbar_branch"):
+            self.branch_done(self.branch_string(snapshot.branch, snapshot.ahead, snapshot.behind), root)
+        if s.get("statusbar_status"):
+            self.status_done(snapshot, root)
+
+    def counts_done(self, root, branch, result):
+        # `git rev-list --left-right --count` says "behind<tab>ahead"
+        counts = (result or '').split()
+        if len(counts) == 2 and all(count.isdigit() for count in counts):
+            self.branch_done(self.branch_string(branch, int(counts[1]), int(counts[0])), root)
+
+    def branch_done(self, result, root=None):
+        _status_bars.set(root or view_root(self.view), {
+            "git-branch": "" if result is False else "Git branch: " + result.strip(),
+        })
+
+    def branch_string(self, name, ahead, behind):
+        symbols = sublime.load_settings("Git.sublime-settings").get("statusbar_status_symbols")
+        branch = [name or 'HEAD']
+        if ahead:
+            branch.append("%d%s" % (ahead, symbols.get('ahead', '\u2191')))
+        if behind:
+            branch.append("%d%s" % (behind, symbols.get('behind', '\u2193')))
+        return ' '.join(branch)
 
-    def status_done(self, result):
-        if result is False:
-            self.view.set_status("git-status-index", "")
-            self.view.set_status("git-status-working", "")
+    def status_done(self, snapshot, root=None):
+        if snapshot is False:
+            entries = {"git-status-index": "", "git-status-working": ""}
         else:
-            lines = [line for line in result.splitlines() if re.match(r'^[ MADRCU?!]{1,2}\s+.*', line)]
-            index = [line[0] for line in lines if not line[0].isspace()]
-            working = [line[1] for line in lines if not line[1].isspace()]
-            self.view.set_status("git-status-index", "index: " + self.status_string(index))
-            self.view.set_status("git-status-working", "working: " + self.status_string(working))
+            entries = {
+                "git-status-index": "index: " + self.status_string(snapshot.index),
+                "git-status-working": "working: " + self.status_string(snapshot.working),
+            }
+        _status_bars.set(root or view_root(self.view), entries)
 
-    def status_string(self, statuses):
+    def status_string(self, counts):
         s = sublime.load_settings("Git.sublime-settings")
         symbols = s.get("statusbar_status_symbols")
-        if not statuses:
+        if not counts:
             return symbols['clean']
-        status = []
-        if statuses.count('M'):
-            status.append("%d%s" % (statuses.count('M'), symbols['modified']))
-        if statuses.count('A'):
-            status.append("%d%s" % (statuses.count('A'), symbols['added']))
-        if statuses.count('D'):
-            status.append("%d%s" % (statuses.count('D'), symbols['deleted']))
-        if statuses.count('?'):
-            status.append("%d%s" % (statuses.count('?'), symbols['untracked']))
-        if statuses.count('U'):
-            status.append("%d%s" % (statuses.count('U'), symbols['conflicts']))
-        if statuses.count('R'):
-            status.append("%d%s" % (statuses.count('R'), symbols['renamed']))
-        if statuses.count('C'):
-            status.append("%d%s" % (statuses.count('C'), symbols['copied']))
-        return symbols['separator'].join(status)
+        return symbols['separator'].join(
+            "%d%s" % (counts[letter], symbols[name]) for letter, name in STATUS_SYMBOLS if counts[letter]
+        )
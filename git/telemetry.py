@@ -0,0 +1,191 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+import math
+import os
+import threading
+import time
+
+# monotonic where we can get it
+clock = getattr(time, 'perf_counter', time.time)
+
+MAX_RECORDS = 2000
+
+_records = collections.deque(maxlen=MAX_RECORDS)
+_counters = collections.Counter()
+_lock = threading.Lock()
+
+# global options which take their value as the next argument
+VALUE_OPTIONS = ('-c', '-C', '--git-dir', '--work-tree', '--namespace')
+
+
+def redact(command):
+    # Keep the binary, subcommand and bare flags of a command line; option
+    # values, paths, refs, messages and so on become '...'
+    redacted = [os.path.basename(command[0])] if command else []
+    subcommand_seen = False
+    value_next = False
+    for arg in command[1:]:
+        if value_next:
+            # e.g. the setting after `-c`
+            value_next = False
+            redacted.append('...')
+        elif arg.startswith('-'):
+            if '=' in arg:
+                arg = arg.split('=', 1)[0] + '=...'
+            elif not subcommand_seen and arg in VALUE_OPTIONS:
+                value_next = True
+            redacted.append(arg)
+        elif not subcommand_seen:
+            subcommand_seen = True
+            redacted.append(arg)
+        elif redacted[-1] != '...':
+            redacted.append('...')
+    return redacted
+
+
+def command_kind(command):
+    # e.g. "git status", for grouping
+    redacted = redact(command)
+    words = [word for word in redacted[1:] if not word.startswith('-') and word != '...']
+    return ' '.join(redacted[:1] + words[:1])
+
+
+class CommandTiming(object):
+    # Where the time went for one command, from queueing to callback, as
+    # clock() readings; anything that didn't happen (e.g. no process for a
+    # cat-file read) stays None
+    __slots__ = (
+        'argv', 'kind', 'repo', 'source', 'queued', 'started', 'spawned',
+        'exited', 'decoded', 'callback_seconds', 'output_size', 'subscribers',
+    )
+
+    def __init__(self, command, repo, source):
+        self.argv = ' '.join(redact(command))
+        self.kind = command_kind(command)
+        self.repo = repo
+        self.source = source
+        self.queued = clock()
+        self.started = self.spawned = self.exited = self.decoded = None
+        self.callback_seconds = 0.0
+        self.output_size = 0
+        self.subscribers = 1
+
+    def _between(self, start, end):
+        if start is None or end is None:
+            return None
+        return end - start
+
+    @property
+    def queue_wait(self):
+        return self._between(self.queued, self.started)
+
+    @property
+    def spawn(self):
+        return self._between(self.started, self.spawned)
+
+    @property
+    def run(self):
+        return self._between(self.spawned or self.started, self.exited)
+
+    @property
+    def decode(self):
+        return self._between(self.exited, self.decoded)
+
+    @property
+    def total(self):
+        end = self.decoded or self.exited or self.started
+        return (self._between(self.queued, end) or 0) + self.callback_seconds
+
+
+def record(timing):
+    with _lock:
+        _records.append(timing)
+
+
+def records():
+    with _lock:
+        return list(_records)
+
+
+def count(name, n=1):
+    # for things which aren't commands, e.g. work we managed to skip
+    with _lock:
+        _counters[name] += n
+
+
+def counters():
+    with _lock:
+        return dict(_counters)
+
+
+def clear():
+    with _lock:
+        _records.clear()
+        _counters.clear()
+
+
+def percentile(values, fraction):
+    # nearest-rank
+    if not values:
+        return None
+    values = sorted(values)
+    index = max(0, min(len(values) - 1, int(math.ceil(fraction * len(values))) - 1))
+    return values[index]
+
+
+def _ms(seconds):
+    if seconds is None:
+        return '-'
+    return '%.1f' % (seconds * 1000)
+
+
+def _table(title, groups):
+    lines = [
+        title,
+        '',
+        '%-40s %6s %8s %8s %8s %8s %8s %8s %8s %10s' % (
+            '', 'count', 'p50', 'p95', 'p99', 'queue', 'run', 'decode', 'callback', 'output'),
+    ]
+    ordered = sorted(groups.items(), key=lambda item: -sum(t.total for t in item[1]))
+    for name, timings in ordered:
+        totals = [t.total for t in timings]
+
+        def mean(attr):
+            values = [getattr(t, attr) for t in timings if getattr(t, attr) is not None]
+            return sum(values) / len(values) if values else None
+
+        lines.append('%-40s %6d %8s %8s %8s %8s %8s %8s %8s %10d' % (
+            name[-40:], len(timings),
+            _ms(percentile(totals, 0.5)), _ms(percentile(totals, 0.95)), _ms(percentile(totals, 0.99)),
+            _ms(mean('queue_wait')), _ms(mean('run')), _ms(mean('decode')), _ms(mean('callback_seconds')),
+            sum(t.output_size for t in timings) // len(timings),
+        ))
+    return lines
+
+
+def report(stats=None):
+    # the recorded timings as text, slowest groups first
+    timings = records()
+    lines = [
+        'Git command timings (milliseconds) for the last %d commands' % len(timings),
+        'p50/p95/p99 are the whole time from being asked for to the callback finishing;',
+        'the other columns are means, and output is the mean size in bytes.',
+        '',
+    ]
+    if stats:
+        lines.extend([
+            'Processes spawned: %d, duplicate commands coalesced: %d' % (stats.get('spawned', 0), stats.get('coalesced', 0)),
+            '',
+        ])
+    counted = counters()
+    if counted:
+        lines.extend('%-40s %8d' % (name, counted[name]) for name in sorted(counted))
+        lines.append('')
+    for title, key in (('By command', 'kind'), ('By source', 'source'), ('By repo', 'repo')):
+        groups = {}
+        for timing in timings:
+            groups.setdefault(getattr(timing, key) or '(none)', []).append(timing)
+        lines.extend(_table(title, groups))
+        lines.append('')
+    return '\n'.join(lines)
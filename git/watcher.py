@@ -0,0 +1,443 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import collections
+import ctypes
+import ctypes.util
+import errno
+import functools
+import os
+import select
+import struct
+import sys
+import threading
+import time
+
+import sublime
+
+from .repostate import find_git_dirs, worktree_changed
+
+
+# What a change to git's files means, as published to subscribers
+HEAD, INDEX, REFS, IGNORE = 'head', 'index', 'refs', 'ignore'
+KINDS = (HEAD, INDEX, REFS, IGNORE)
+
+_subscribers = collections.OrderedDict()
+_generations = {}  # root -> Counter of events by kind
+_watcher = None
+# for repos the main watcher can't manage (say inotify ran out of watches)
+_poller = None
+_watcher_lock = threading.Lock()
+
+
+def subscribe(name, callback):
+    # callback(root, kinds) gets called on the main thread when a repo
+    # changes; subscribing under the same name replaces it (e.g. on reload)
+    _subscribers[name] = callback
+
+
+def generation(root, kinds=KINDS):
+    # how many changes of these kinds have been seen in a repo, or None if
+    # it isn't being watched (so changes might go unseen)
+    if not is_watching(root):
+        return None
+    counts = _generations.get(root, {})
+    return sum(counts.get(kind, 0) for kind in kinds)
+
+
+def is_watching(root):
+    return any(watcher is not None and watcher.is_watching(root) for watcher in (_watcher, _poller))
+
+
+def _dispatch(root, kinds):
+    counts = _generations.setdefault(root, collections.Counter())
+    counts.update(kinds)
+    worktree_changed(root)
+    for callback in list(_subscribers.values()):
+        try:
+            callback(root, kinds)
+        except Exception as e:
+            print('Git: repo watcher subscriber failed:', e)
+
+
+def publish(root, kinds):
+    # from the watching thread; subscribers get it on the main thread
+    sublime.set_timeout(functools.partial(_dispatch, root, frozenset(kinds)), 0)
+
+
+class RepoPaths(object):
+    # The files and directories which tell us a repo has changed
+    def __init__(self, root):
+        self.root = root
+        self.git_dir, self.common_dir = find_git_dirs(root)
+        self.refs = os.path.join(self.common_dir, 'refs')
+        self.info = os.path.join(self.common_dir, 'info')
+        # worktree directories below the root with a .gitignore of their own;
+        # see watch_ignore_files()
+        self.ignore_dirs = set()
+
+    def kind(self, directory, name):
+        # which kind of change a file changing in a directory is, or None
+        if name.endswith('.lock'):
+            # git writes foo.lock and renames it over foo; the rename counts
+            return None
+        if directory == self.git_dir:
+            if name == 'HEAD':
+                return HEAD
+            if name == 'index':
+                return INDEX
+        if directory == self.common_dir and name == 'packed-refs':
+            return REFS
+        if directory == self.refs or directory.startswith(self.refs + os.sep):
+            return REFS
+        if directory == self.info and name == 'exclude':
+            return IGNORE
+        if name == '.gitignore' and (directory == self.root or directory in self.ignore_dirs):
+            return IGNORE
+        return None
+
+    def directories(self):
+        # the git dirs, info, the worktree root, the whole of refs/ and any
+        # directories with nested .gitignores
+        directories = [self.root, self.git_dir, self.common_dir, self.info]
+        for directory, subdirectories, files in os.walk(self.refs):
+            directories.append(directory)
+        directories.extend(sorted(self.ignore_dirs))
+        return [directory for index, directory in enumerate(directories) if directory not in directories[:index]]
+
+    def signature(self):
+        # for polling: something which changes whenever kind() would fire,
+        # by kind
+        def stat(path):
+            try:
+                st = os.stat(path)
+            except OSError:
+                return None
+            return (st.st_mtime, st.st_size, st.st_ino)
+
+        refs = [stat(os.path.join(self.common_dir, 'packed-refs'))]
+        # loose refs are replaced by renaming, which touches their directory
+        for directory, subdirectories, files in os.walk(self.refs):
+            refs.append((directory, stat(directory)))
+        return {
+            HEAD: stat(os.path.join(self.git_dir, 'HEAD')),
+            INDEX: stat(os.path.join(self.git_dir, 'index')),
+            REFS: refs,
+            IGNORE: [stat(os.path.join(self.info, 'exclude'))] + [
+                stat(os.path.join(directory, '.gitignore'))
+                for directory in [self.root] + sorted(self.ignore_dirs)
+            ],
+        }
+
+
+class PollingWatcher(object):
+    # Stats every repo's files every interval seconds; works everywhere,
+    # but notices changes up to that late
+    interval = 1.0
+
+    def __init__(self):
+        self.repos = {}  # root -> (RepoPaths, last signature)
+        self.lock = threading.Lock()
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def is_watching(self, root):
+        return root in self.repos
+
+    def watch(self, root):
+        paths = RepoPaths(root)
+        with self.lock:
+            self.repos[root] = (paths, paths.signature())
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name='GitRepoWatcher')
+            self.thread.daemon = True
+            self.thread.start()
+
+    def unwatch(self, root):
+        with self.lock:
+            self.repos.pop(root, None)
+
+    def watch_ignores(self, root, directories):
+        with self.lock:
+            if root not in self.repos:
+                return
+            paths = self.repos[root][0]
+            paths.ignore_dirs = set(directories)
+            self.repos[root] = (paths, paths.signature())
+
+    def _run(self):
+        while not self.stopping.wait(self.interval):
+            with self.lock:
+                repos = list(self.repos.items())
+            for root, (paths, last) in repos:
+                signature = paths.signature()
+                changed = [kind for kind in KINDS if signature[kind] != last[kind]]
+                with self.lock:
+                    if root in self.repos:
+                        self.repos[root] = (paths, signature)
+                if changed:
+                    publish(root, changed)
+
+    def shutdown(self):
+        self.stopping.set()
+
+
+# from <sys/inotify.h>
+IN_MODIFY = 0x2
+IN_CLOSE_WRITE = 0x8
+IN_MOVED_FROM = 0x40
+IN_MOVED_TO = 0x80
+IN_CREATE = 0x100
+IN_DELETE = 0x200
+IN_DELETE_SELF = 0x400
+IN_MOVE_SELF = 0x800
+IN_Q_OVERFLOW = 0x4000
+IN_IGNORED = 0x8000
+IN_ONLYDIR = 0x1000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = 0o4000
+IN_CLOEXEC = 0o2000000
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE
+    | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+# for worktree directories, where only .gitignore matters: without
+# IN_MODIFY, a log file being written there doesn't wake us on every write
+_WORKTREE_MASK = _WATCH_MASK & ~IN_MODIFY
+_EVENT = struct.Struct(str('iIII'))
+
+
+def _libc():
+    if not sys.platform.startswith('linux'):
+        return None
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c') or 'libc.so.6', use_errno=True)
+        libc.inotify_init1
+    except (OSError, AttributeError):
+        return None
+    libc.inotify_init1.argtypes = [ctypes.c_int]
+    libc.inotify_add_watch.argtypes = [ctypes.c_int, ctypes.c_char_p, ctypes.c_uint32]
+    libc.inotify_rm_watch.argtypes = [ctypes.c_int, ctypes.c_int]
+    return libc
+
+
+class InotifyWatcher(object):
+    # One inotify descriptor (through libc with ctypes) and one thread for
+    # every repo. Directories are watched rather than files, since git
+    # renames lock files over them, and events are gathered for settle
+    # seconds, as one git command can touch a file several times.
+    settle = 0.05
+
+    def __init__(self, libc):
+        self.libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), 'inotify_init1 failed')
+        self.wake_read, self.wake_write = os.pipe()
+        self.lock = threading.Lock()
+        self.repos = {}  # root -> RepoPaths
+        self.watches = {}  # watch descriptor -> (directory, set of roots)
+        self.descriptors = {}  # directory -> watch descriptor
+        self.stopping = False
+        self.thread = threading.Thread(target=self._run, name='GitRepoWatcher')
+        self.thread.daemon = True
+        self.thread.start()
+
+    def is_watching(self, root):
+        return root in self.repos
+
+    def _add(self, directory, root, mask=_WATCH_MASK):
+        # with the lock held
+        wd = self.descriptors.get(directory)
+        if wd is None:
+            wd = self.libc.inotify_add_watch(self.fd, directory.encode(sys.getfilesystemencoding() or 'utf-8'), mask)
+            if wd < 0:
+                return False
+            self.descriptors[directory] = wd
+            self.watches[wd] = (directory, set())
+        self.watches[wd][1].add(root)
+        return True
+
+    def watch(self, root):
+        paths = RepoPaths(root)
+        with self.lock:
+            self.repos[root] = paths
+            for directory in paths.directories():
+                mask = _WORKTREE_MASK if directory == paths.root else _WATCH_MASK
+                if not self._add(directory, root, mask) and directory in (paths.git_dir, paths.root):
+                    # can't see the important bits (out of watches?): let
+                    # whoever asked fall back to polling
+                    self._remove(root)
+                    return False
+        return True
+
+    def _remove(self, root):
+        # with the lock held
+        self.repos.pop(root, None)
+        for wd, (directory, roots) in list(self.watches.items()):
+            roots.discard(root)
+            if not roots:
+                self.libc.inotify_rm_watch(self.fd, wd)
+                del self.watches[wd]
+                self.descriptors.pop(directory, None)
+
+    def unwatch(self, root):
+        with self.lock:
+            self._remove(root)
+
+    def _release(self, directory, root):
+        # with the lock held
+        wd = self.descriptors.get(directory)
+        if wd is None:
+            return
+        roots = self.watches[wd][1]
+        roots.discard(root)
+        if not roots:
+            self.libc.inotify_rm_watch(self.fd, wd)
+            del self.watches[wd]
+            del self.descriptors[directory]
+
+    def watch_ignores(self, root, directories):
+        with self.lock:
+            paths = self.repos.get(root)
+            if paths is None:
+                return
+            directories = set(directories)
+            for directory in paths.ignore_dirs - directories:
+                self._release(directory, root)
+            # (one we can't watch just goes unnoticed)
+            paths.ignore_dirs = set(directory for directory in directories if self._add(directory, root, _WORKTREE_MASK))
+
+    def _read_events(self, changes):
+        try:
+            data = os.read(self.fd, 65536)
+        except OSError as e:
+            if e.errno in (errno.EAGAIN, errno.EINTR):
+                return
+            raise
+        offset = 0
+        with self.lock:
+            while offset + _EVENT.size <= len(data):
+                wd, mask, cookie, length = _EVENT.unpack_from(data, offset)
+                name = data[offset + _EVENT.size:offset + _EVENT.size + length].rstrip(b'\0')
+                offset += _EVENT.size + length
+                if mask & IN_Q_OVERFLOW:
+                    # lost track: everything might have changed
+                    for root in self.repos:
+                        changes[root].update(KINDS)
+                    continue
+                watch = self.watches.get(wd)
+                if watch is None:
+                    continue
+                directory, roots = watch
+                if mask & IN_IGNORED:
+                    # the directory went away (e.g. a branch's last ref was
+                    # deleted under refs/heads/some/)
+                    del self.watches[wd]
+                    self.descriptors.pop(directory, None)
+                    continue
+                name = name.decode(sys.getfilesystemencoding() or 'utf-8', 'replace')
+                for root in list(roots):
+                    paths = self.repos.get(root)
+                    if paths is None:
+                        continue
+                    if mask & IN_ISDIR and mask & (IN_CREATE | IN_MOVED_TO) and paths.kind(directory, name) == REFS:
+                        # a new directory of refs (refs/heads/feature/)
+                        for subdirectory, _, _ in os.walk(os.path.join(directory, name)):
+                            self._add(subdirectory, root)
+                    kind = paths.kind(directory, name)
+                    if kind is not None:
+                        changes[root].add(kind)
+
+    def _run(self):
+        changes = collections.defaultdict(set)
+        # when the oldest change not yet published came in
+        first = None
+        while not self.stopping:
+            timeout = None if first is None else max(0, first + self.settle - time.time())
+            try:
+                readable = select.select([self.fd, self.wake_read], [], [], timeout)[0]
+            except (OSError, select.error) as e:
+                if e.args and e.args[0] == errno.EINTR:
+                    continue
+                raise
+            if self.stopping:
+                break
+            if self.fd in readable:
+                self._read_events(changes)
+                if changes and first is None:
+                    first = time.time()
+            # (publish once settled, even if events keep coming)
+            if first is not None and time.time() - first >= self.settle:
+                for root, kinds in changes.items():
+                    publish(root, kinds)
+                changes.clear()
+                first = None
+        os.close(self.fd)
+        os.close(self.wake_read)
+
+    def shutdown(self):
+        self.stopping = True
+        try:
+            os.write(self.wake_write, b'x')
+            os.close(self.wake_write)
+        except OSError:
+            pass
+
+
+def _backend():
+    # With the lock held: the watcher to use, per the repo_watcher setting,
+    # started if need be; None if watching is off
+    global _watcher
+    setting = sublime.load_settings("Git.sublime-settings").get('repo_watcher', 'auto')
+    if not setting:
+        return None
+    if _watcher is None:
+        libc = _libc() if setting in ('auto', 'inotify') else None
+        if libc is not None:
+            try:
+                _watcher = InotifyWatcher(libc)
+            except OSError as e:
+                print('Git: inotify unavailable, polling for repo changes instead:', e)
+        if _watcher is None:
+            _watcher = PollingWatcher()
+    return _watcher
+
+
+def watch(root):
+    # start watching a repo if the settings allow; returns whether it is
+    global _poller
+    if not root:
+        return False
+    with _watcher_lock:
+        watcher = _backend()
+        if watcher is None:
+            return False
+        if is_watching(root):
+            return True
+        if watcher.watch(root) is False:
+            if _poller is None:
+                _poller = PollingWatcher()
+            _poller.watch(root)
+    return True
+
+
+def watch_ignore_files(root, directories):
+    # Also watch the .gitignore files in these directories of a watched
+    # repo's worktree, instead of any given before. Finding them means
+    # walking the worktree, so that's up to the caller.
+    with _watcher_lock:
+        for watcher in (_watcher, _poller):
+            if watcher is not None and watcher.is_watching(root):
+                watcher.watch_ignores(root, [directory for directory in directories if directory != root])
+
+
+def shutdown_all():
+    global _watcher, _poller
+    with _watcher_lock:
+        watchers = (_watcher, _poller)
+        _watcher = _poller = None
+    for watcher in watchers:
+        if watcher is not None:
+            watcher.shutdown()
+    _generations.clear()
@@ -20,12 +20,23 @@ if sys.version_info >= (3,):
 
 # Modules have to be reloaded in dependency order. So list 'em here:
 mods_load_order = [
+    # helpers imported by the package itself have to come first
+    '.catfile',
+    '.diffparse',
+    '.linediff',
+    '.repostate',
+    '.scheduler',
+    '.telemetry',
+    '.watcher',  # imports repostate
+
     '',
 
     '.status',
     '.add',  # imports status
     '.index',  # imports status
     '.commit',  # imports add
+    '.statusbar',
+    '.repo',  # imports statusbar
 
     # no interdependencies below
     '.core',
@@ -34,9 +45,7 @@ mods_load_order = [
     '.diff',
     '.history',
     '.ignore',
-    '.repo',
     '.stash',
-    '.statusbar',
     '.flow',
     '.file',
 ]
@@ -90,3 +99,19 @@ except (ImportError, ValueError):
     from git.stash import *  # noqa
     from git.status import *  # noqa
     from git.statusbar import *  # noqa
+
+
+def plugin_unloaded():
+    # don't leave the persistent `git cat-file` processes, repo watchers or
+    # annotation temp files behind on reload
+    try:
+        from .git.catfile import shutdown_all
+        from .git.annotate import remove_temp_files
+        from .git import watcher
+    except (ImportError, ValueError):
+        from git.catfile import shutdown_all
+        from git.annotate import remove_temp_files
+        from git import watcher
+    shutdown_all()
+    watcher.shutdown_all()
+    remove_temp_files()
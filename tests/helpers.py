@@ -0,0 +1,64 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+# What the tests share: importing this puts the stubs, the plugin and the
+# benchmark harness on the path, and RepoTestCase gives each test a fresh
+# repo with a window open on it
+
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'benchmarks'))
+
+from harness import sublime, load_plugin_settings, wait_idle, reset_caches  # noqa: E402,F401
+
+COMMIT = ['-c', 'user.name=a', '-c', 'user.email=a@b', 'commit', '-q']
+
+
+def git(repo, *args):
+    subprocess.check_call(['git'] + list(args), cwd=repo)
+
+
+def write(repo, files):
+    # files maps relative paths to their contents
+    for name, text in files.items():
+        path = os.path.join(repo, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(text)
+
+
+def make_repo(path=None, files=None):
+    # a new repo (in a new temporary directory unless path is given), with
+    # files committed if there are any
+    repo = path or os.path.realpath(tempfile.mkdtemp())
+    git(repo, 'init', '-q')
+    if files:
+        write(repo, files)
+        git(repo, 'add', '.')
+        git(repo, *COMMIT + ['-m', 'initial'])
+    return repo
+
+
+class RepoTestCase(unittest.TestCase):
+    # files is what the repo starts with, committed
+    files = {}
+
+    def setUp(self):
+        load_plugin_settings()
+        reset_caches()
+        self.repo = make_repo(files=self.files)
+        self.window = sublime.Window([self.repo], {'folders': [{'path': self.repo}]})
+
+    def tearDown(self):
+        self.window.close()
+        reset_caches()
+        load_plugin_settings()
+        shutil.rmtree(self.repo)
+
+    def path(self, *parts):
+        return os.path.join(self.repo, *parts)
@@ -0,0 +1,42 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import unittest
+
+from helpers import sublime, wait_idle, RepoTestCase
+from git import annotate
+
+
+class ChangeListenerTest(RepoTestCase):
+    files = {'a.txt': ''.join('line %d\n' % number for number in range(20))}
+
+    def setUp(self):
+        super(ChangeListenerTest, self).setUp()
+        self.view = self.window.open_file(self.path('a.txt'))
+
+    def tearDown(self):
+        annotate.forget_buffer(self.view.buffer_id())
+        super(ChangeListenerTest, self).tearDown()
+
+    def annotate(self):
+        annotate.GitAnnotateCommand(self.view).run(sublime.Edit())
+        wait_idle(30)
+
+    def test_edits_after_annotating_are_tracked(self):
+        self.annotate()
+        self.annotate()
+        self.assertEqual(len(self.view.buffer().listeners), 1)
+        self.view.insert(sublime.Edit(), self.view.text_point(5, 0), 'typed\n')
+        dirty = annotate._dirty_rows[self.view.buffer_id()]
+        self.assertEqual((dirty.start, dirty.end, dirty.delta), (5, 6, 1))
+        self.annotate()
+        self.assertEqual(self.view.get_regions('git.changes.+'), [self.view.full_line(self.view.text_point(5, 0))])
+        self.assertEqual(self.view.get_regions('git.changes.x'), [])
+
+    def test_closing_detaches(self):
+        self.annotate()
+        annotate.forget_buffer(self.view.buffer_id())
+        self.assertEqual(self.view.buffer().listeners, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,89 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import os
+import time
+import unittest
+
+from helpers import wait_idle, RepoTestCase
+import git
+
+
+class ReadObjectTest(RepoTestCase):
+    files = {'a.txt': 'aaa\n', 'b.txt': 'bbb\n'}
+
+    def setUp(self):
+        super(ReadObjectTest, self).setUp()
+        self.command = git.GitWindowCommand(self.window)
+
+    def test_concurrent_reads_of_different_specs(self):
+        results = {}
+
+        def done(result, name):
+            results[name] = result
+
+        for spec in ('HEAD:a.txt', 'HEAD:b.txt'):
+            self.command.read_object(spec, done, name=spec, working_dir=self.repo)
+        wait_idle(30)
+        self.assertEqual(results, {'HEAD:a.txt': 'aaa\n', 'HEAD:b.txt': 'bbb\n'})
+
+    def test_missing_spec_with_spaces(self):
+        results = {}
+
+        def done(result, name):
+            results[name] = result
+
+        # the two reads may finish in either order
+        for spec in ('HEAD:new file.txt', 'HEAD:a.txt'):
+            self.command.read_object(spec, done, name=spec, working_dir=self.repo)
+        wait_idle(30)
+        self.assertEqual(results, {'HEAD:new file.txt': 'fatal: Not a valid object name HEAD:new file.txt\n', 'HEAD:a.txt': 'aaa\n'})
+
+    def hung_git(self):
+        # stands in for a cat-file process that never answers
+        path = self.path('hung-git')
+        with open(path, 'w') as f:
+            f.write('#!/bin/sh\nexec sleep 60\n')
+        os.chmod(path, 0o755)
+        return path
+
+    def test_hung_read_times_out(self):
+        results = []
+        started = time.time()
+        git.CatFileThread(self.hung_git(), ['HEAD:a.txt'], results.append, working_dir=self.repo, timeout=0.5).start()
+        wait_idle(30)
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(len(results), 1)
+        self.assertIn('timed out', results[0])
+
+    def test_failed_read_is_none_when_errors_are_suppressed(self):
+        results = []
+        git.CatFileThread(self.hung_git(), ['HEAD:a.txt'], results.append, working_dir=self.repo, timeout=0.5, error_suppresses_output=True).start()
+        wait_idle(30)
+        self.assertEqual(results, [None])
+
+    def test_failed_command_output_is_not_parsed(self):
+        results = {}
+
+        def done(result, name):
+            results[name] = result
+
+        for name in ('nonexistent', 'HEAD'):
+            self.command.run_command(['git', 'rev-parse', '--verify', name], done, name=name, working_dir=self.repo, parse=lambda output: 'parsed')
+        wait_idle(30)
+        self.assertIn('fatal', results['nonexistent'])
+        self.assertEqual(results['HEAD'], 'parsed')
+
+    def test_hung_read_can_be_cancelled(self):
+        results = []
+        handle = git.CatFileThread(self.hung_git(), ['HEAD:a.txt'], results.append, working_dir=self.repo).start()
+        started = time.time()
+        while not handle.thread.server and time.time() - started < 10:
+            time.sleep(0.01)
+        handle.cancel()
+        wait_idle(30)
+        self.assertLess(time.time() - started, 10)
+        self.assertEqual(results, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import unittest
+
+from helpers import sublime, git, wait_idle, COMMIT, RepoTestCase
+from git.history import GitLogAllCommand, parse_log
+
+LOAD_OLDER = "Load older commits\u2026"
+
+
+class ParseLogTest(unittest.TestCase):
+    def test_fields_are_split_on_nuls(self):
+        output = '\0'.join([
+            'f' * 40, 'fffffff', 'a subject; with (brackets)', 'A <a@b>', 'today (now)',
+            'e' * 40, 'eeeeeee', '', 'B <b@c>', 'yesterday (1 day ago)',
+        ])
+        self.assertEqual(parse_log(output), [
+            ('f' * 40, ['a subject; with (brackets) (fffffff)', 'A <a@b>', 'today (now)']),
+            ('e' * 40, [' (eeeeeee)', 'B <b@c>', 'yesterday (1 day ago)']),
+        ])
+
+    def test_nothing(self):
+        self.assertEqual(parse_log(''), [])
+
+
+class LogPagingTest(RepoTestCase):
+    def setUp(self):
+        super(LogPagingTest, self).setUp()
+        for number in range(5):
+            git(self.repo, *COMMIT + ['--allow-empty', '-m', 'commit %d' % number])
+        sublime.load_settings('Git.sublime-settings').set('log_page_size', 2)
+        self.command = GitLogAllCommand(self.window)
+
+    def subjects(self):
+        items = self.window.quick_panels[-1][0]
+        return [item[0].rpartition(' (')[0] if item[0] != LOAD_OLDER else item[0] for item in items]
+
+    def load_older(self):
+        items, on_select = self.window.quick_panels[-1]
+        on_select(len(items) - 1)
+        wait_idle(30)
+
+    def test_older_commits_are_loaded_a_page_at_a_time(self):
+        self.command.run()
+        wait_idle(30)
+        self.assertEqual(self.subjects(), ['commit 4', 'commit 3', LOAD_OLDER])
+        self.load_older()
+        self.assertEqual(self.subjects(), ['commit 4', 'commit 3', 'commit 2', 'commit 1', LOAD_OLDER])
+        self.load_older()
+        self.assertEqual(self.subjects(), ['commit 4', 'commit 3', 'commit 2', 'commit 1', 'commit 0'])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,143 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+
+from helpers import make_repo, RepoTestCase
+from git import repostate
+
+OID = '0' * 40
+HEADERS = ['# branch.oid ' + OID, '# branch.head master']
+
+
+def ordinary(xy, path):
+    return '1 %s N... 100644 100644 100644 %s %s %s' % (xy, OID, OID, path)
+
+
+def renamed(xy, path):
+    return '2 %s N... 100644 100644 100644 %s %s R100 %s' % (xy, OID, OID, path)
+
+
+def conflicted(path):
+    return 'u UU N... 100644 100644 100644 100644 %s %s %s %s' % (OID, OID, OID, path)
+
+
+def status(records):
+    return '\0'.join(records) + '\0'
+
+
+class ParseStatusTest(unittest.TestCase):
+    def test_ordinary_changes(self):
+        snapshot = repostate.parse_status(status(HEADERS + [
+            ordinary('.M', 'a b.txt'), ordinary('A.', 'c.txt'), '? new file', '? other', '! build/',
+        ]))
+        self.assertEqual(snapshot.branch, 'master')
+        self.assertEqual(snapshot.entries, [
+            (' M', 'a b.txt', None), ('A ', 'c.txt', None), ('??', 'new file', None), ('??', 'other', None),
+            ('!!', 'build/', None),
+        ])
+        self.assertEqual(dict(snapshot.index), {'A': 1, '?': 2, '!': 1})
+        self.assertEqual(dict(snapshot.working), {'M': 1, '?': 2, '!': 1})
+
+    def test_rename_sources_that_look_like_records(self):
+        snapshot = repostate.parse_status(status(HEADERS + [
+            renamed('R.', 'a'), '? a', renamed('R.', 'b'), '2 b', ordinary('.M', 'c'), conflicted('d'), '? e',
+        ]))
+        self.assertEqual(snapshot.entries, [
+            ('R ', 'a', '? a'), ('R ', 'b', '2 b'), (' M', 'c', None), ('UU', 'd', None), ('??', 'e', None),
+        ])
+        self.assertEqual(dict(snapshot.index), {'R': 2, 'U': 1, '?': 1})
+
+    def test_nothing_but_untracked(self):
+        snapshot = repostate.parse_status(status(['? a', '! b']))
+        self.assertEqual(snapshot.entries, [('??', 'a', None), ('!!', 'b', None)])
+
+    def test_clean(self):
+        snapshot = repostate.parse_status(status(HEADERS))
+        self.assertEqual(snapshot.entries, [])
+        self.assertEqual(repostate.parse_status('').entries, [])
+
+
+class StatusSnapshotTest(RepoTestCase):
+    def setUp(self):
+        super(StatusSnapshotTest, self).setUp()
+        self.state = repostate.RepoState(self.repo)
+        self.runs = []
+        self.results = []
+
+    def run_command(self, command, callback, parse):
+        self.runs.append((callback, parse))
+
+    def ask(self, timeout):
+        self.state.status_snapshot(self.run_command, self.results.append, timeout)
+
+    def test_failure_is_passed_on_but_not_kept(self):
+        self.ask(30)
+        self.ask(30)
+        self.assertEqual(len(self.runs), 1)
+        self.runs[0][0]('fatal: unknown option porcelain=v2\n')
+        self.assertEqual([snapshot.error for snapshot in self.results], ['fatal: unknown option porcelain=v2'] * 2)
+        self.ask(30)
+        self.assertEqual(len(self.runs), 2)
+
+    def test_longer_request_doesnt_join_shorter_fetch(self):
+        self.ask(30)
+        self.ask(600)
+        self.assertEqual(len(self.runs), 2)
+        # the first fetch times out, which no longer matters
+        self.runs[0][0]('')
+        self.assertEqual(self.results, [])
+        callback, parse = self.runs[1]
+        callback(parse(status(HEADERS + ['? new'])))
+        self.assertEqual([snapshot.entries for snapshot in self.results], [[('??', 'new', None)]] * 2)
+        self.assertTrue(all(snapshot.error is None for snapshot in self.results))
+
+
+class GitRootCacheTest(RepoTestCase):
+    def setUp(self):
+        super(GitRootCacheTest, self).setUp()
+        os.makedirs(self.path('vendor', 'lib', 'src'))
+        self.cache = repostate.GitRootCache()
+
+    def test_lookup_remembers_the_way_up(self):
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'lib', 'src')), self.repo)
+        self.assertEqual(set(self.cache.entries), set([
+            self.path('vendor', 'lib', 'src'), self.path('vendor', 'lib'), self.path('vendor'), self.repo,
+        ]))
+        # a sibling stops at the first directory already known
+        os.makedirs(self.path('vendor', 'other'))
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'other')), self.repo)
+        self.assertEqual(len(self.cache.entries), 5)
+
+    def test_least_recently_used_are_dropped(self):
+        self.cache.max_size = 2
+        self.cache.lookup(self.path('vendor', 'lib', 'src'))
+        self.assertEqual(list(self.cache.entries), [self.path('vendor'), self.repo])
+
+    def test_directory_outside_a_repo(self):
+        outside = os.path.realpath(tempfile.mkdtemp())
+        try:
+            self.assertFalse(self.cache.lookup(outside))
+            make_repo(outside)
+            self.assertEqual(self.cache.lookup(outside), outside)
+        finally:
+            shutil.rmtree(outside)
+
+    def test_repo_created_in_a_known_directory(self):
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'lib')), self.repo)
+        make_repo(self.path('vendor', 'lib'))
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'lib')), self.path('vendor', 'lib'))
+
+    def test_repo_created_above_a_known_directory(self):
+        self.cache.ttl = 0.1
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'lib', 'src')), self.repo)
+        make_repo(self.path('vendor', 'lib'))
+        time.sleep(0.2)
+        self.assertEqual(self.cache.lookup(self.path('vendor', 'lib', 'src')), self.path('vendor', 'lib'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,57 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import threading
+import unittest
+
+from helpers import wait_idle, RepoTestCase
+import git
+from git.scheduler import CommandScheduler
+
+
+class Job(object):
+    exclusive = False
+    repo = '/repo'
+
+    def __init__(self, fail=False):
+        self.fail = fail
+        self.done = threading.Event()
+
+    def run(self):
+        self.done.set()
+        if self.fail:
+            raise ValueError('broken job')
+
+
+class SchedulerTest(unittest.TestCase):
+    def test_failing_jobs_leave_workers_running(self):
+        scheduler = CommandScheduler(max_workers=2)
+        failing = [Job(fail=True) for _ in range(4)]
+        for job in failing:
+            scheduler.submit(job)
+        for job in failing:
+            self.assertTrue(job.done.wait(5))
+        job = Job()
+        scheduler.submit(job)
+        self.assertTrue(job.done.wait(5))
+
+
+class LaunchTest(RepoTestCase):
+    def setUp(self):
+        super(LaunchTest, self).setUp()
+        self.command = git.GitWindowCommand(self.window)
+
+    def test_interactive_tools_do_not_hold_a_worker(self):
+        # stands in for gitk: it stays open until the user closes it
+        proc = self.command.launch(['sleep', '60'], working_dir=self.repo)
+        try:
+            results = []
+            self.command.run_command(['git', 'tag', 'x', '--no-such-option'], results.append, working_dir=self.repo)
+            wait_idle(10)
+            self.assertEqual(len(results), 1)
+            self.assertIsNone(proc.poll())
+        finally:
+            proc.kill()
+
+
+if __name__ == '__main__':
+    unittest.main()
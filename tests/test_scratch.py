@@ -0,0 +1,26 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import unittest
+
+from helpers import sublime, wait_idle, RepoTestCase
+import git
+from git import core  # noqa: F401 (registers git_scratch_output)
+
+
+class ScratchStreamTest(RepoTestCase):
+    def setUp(self):
+        super(ScratchStreamTest, self).setUp()
+        self.command = git.GitWindowCommand(self.window)
+
+    def test_leading_whitespace_is_kept_once(self):
+        # blank lines first, then output arriving in separate batches
+        script = 'sleep 0.2; printf "\\n\\n"; sleep 0.3; echo one; sleep 0.3; echo two'
+        self.command.scratch_stream(['sh', '-c', script], title='Output', working_dir=self.repo)
+        wait_idle(30)
+        views = [view for view in self.window.views() if view.name() == 'Output']
+        self.assertEqual(len(views), 1)
+        self.assertEqual(views[0].substr(sublime.Region(0, views[0].size())), '\n\none\ntwo\n')
+
+
+if __name__ == '__main__':
+    unittest.main()
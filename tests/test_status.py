@@ -0,0 +1,93 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import subprocess
+import unittest
+
+from helpers import wait_idle, write, RepoTestCase
+from git import telemetry
+from git.add import GitAddChoiceCommand
+from git.status import PageLink, StatusPage, staged_entry
+
+
+def modified(path):
+    return (' M', path, None)
+
+
+class StatusPageTest(unittest.TestCase):
+    def test_short_list_is_shown_as_it_is(self):
+        entries = [modified('a/x.txt'), modified('a/y.txt'), ('??', 'new.txt', None)]
+        page = StatusPage(entries, size=5, header=['header'])
+        self.assertEqual(page.items, ['header', ' M a/x.txt', ' M a/y.txt', '?? new.txt'])
+        self.assertEqual(page.targets, [0] + entries)
+
+    def test_long_list_is_grouped_by_directory(self):
+        entries = [modified('src/%d.c' % number) for number in range(3)] + [
+            ('??', 'src/new.c', None), ('??', 'build/', None), modified('lib/only.c'), modified('README'),
+        ]
+        page = StatusPage(entries, size=4)
+        self.assertEqual(page.items, [
+            'src/ \u2014 3 modified, 1 untracked', '?? build/', ' M lib/only.c', ' M README',
+        ])
+        self.assertEqual(page.targets[0], PageLink('src/', 0))
+
+    def test_drilling_into_a_directory(self):
+        entries = [modified('src/a/%d.c' % number) for number in range(3)] + [modified('src/b.c'), modified('top.c')]
+        page = StatusPage(entries, 'src/', size=3)
+        self.assertEqual(page.items, ['src/a/ \u2014 3 modified', ' M src/b.c'])
+        page = StatusPage(entries, 'src/a/', size=3)
+        self.assertEqual(page.items, [' M src/a/0.c', ' M src/a/1.c', ' M src/a/2.c'])
+
+    def test_paging(self):
+        entries = [modified('%02d.txt' % number) for number in range(25)]
+        page = StatusPage(entries, size=10)
+        self.assertEqual(len(page.items), 11)
+        self.assertEqual(page.items[-1], '\u2026 15 more')
+        self.assertEqual(page.targets[-1], PageLink('', 10))
+        page = StatusPage(entries, start=20, size=10)
+        self.assertEqual(page.items, [' M %02d.txt' % number for number in range(20, 25)])
+
+
+class StagedEntryTest(unittest.TestCase):
+    def test_staged_entries(self):
+        self.assertEqual(staged_entry(('??', 'a', None)), ('A ', 'a', None))
+        self.assertEqual(staged_entry((' M', 'a', None)), ('M ', 'a', None))
+        self.assertEqual(staged_entry(('AM', 'a', None)), ('A ', 'a', None))
+        self.assertEqual(staged_entry(('RM', 'b', 'a')), ('R ', 'b', 'a'))
+        self.assertEqual(staged_entry((' T', 'a', None)), ('T ', 'a', None))
+        self.assertEqual(staged_entry((' D', 'a', None)), ('D ', 'a', None))
+        self.assertEqual(staged_entry(('AD', 'a', None)), None)
+
+
+class ChangeEntriesTest(RepoTestCase):
+    files = {'a.txt': 'a\n', 'b.txt': 'b\n'}
+
+    def setUp(self):
+        super(ChangeEntriesTest, self).setUp()
+        write(self.repo, {'a.txt': 'changed\n', 'b.txt': 'changed\n'})
+        telemetry.clear()
+        self.command = GitAddChoiceCommand(self.window)
+        self.command.run()
+        wait_idle(30)
+
+    def pick(self, item):
+        items, on_select = self.window.quick_panels[-1]
+        on_select(items.index(item))
+        wait_idle(30)
+
+    def test_list_is_updated_in_place(self):
+        self.pick(' M a.txt')
+        self.assertEqual(self.command.entries, [modified('b.txt')])
+        self.assertEqual(self.window.quick_panels[-1][0][2:], [' M b.txt'])
+        self.assertEqual(telemetry.counters().get('status list rescans avoided'), 1)
+        staged = subprocess.check_output(['git', 'diff', '--cached', '--name-only'], cwd=self.repo)
+        self.assertEqual(staged.decode('utf-8'), 'a.txt\n')
+
+    def test_outside_change_to_the_index_means_a_rescan(self):
+        subprocess.check_call(['git', 'add', 'b.txt'], cwd=self.repo)
+        self.pick(' M a.txt')
+        self.assertEqual(telemetry.counters().get('status list rescans avoided'), None)
+        self.assertEqual(self.command.entries, [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,53 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import os
+import shutil
+import tempfile
+import unittest
+
+from helpers import sublime, git, wait_idle, COMMIT, RepoTestCase
+from git import repostate, statusbar  # noqa: F401 (registers git_branch_status)
+
+
+class BranchOnlyTest(RepoTestCase):
+    files = {'a.txt': 'a\n'}
+
+    def setUp(self):
+        super(BranchOnlyTest, self).setUp()
+        settings = sublime.load_settings('Git.sublime-settings')
+        settings.set('statusbar_branch', True)
+        settings.set('statusbar_status', False)
+        # one commit ahead of its upstream
+        self.upstream = os.path.realpath(tempfile.mkdtemp())
+        git(self.upstream, 'init', '-q', '--bare')
+        git(self.repo, 'remote', 'add', 'origin', self.upstream)
+        git(self.repo, 'push', '-q', '-u', 'origin', 'HEAD')
+        git(self.repo, *COMMIT + ['--allow-empty', '-m', 'ahead'])
+
+    def tearDown(self):
+        super(BranchOnlyTest, self).tearDown()
+        shutil.rmtree(self.upstream)
+
+    def test_ahead_count_without_a_status(self):
+        statuses = []
+        status_snapshot = repostate.RepoState.status_snapshot
+
+        def counting(state, *args, **kwargs):
+            statuses.append(state)
+            return status_snapshot(state, *args, **kwargs)
+
+        repostate.RepoState.status_snapshot = counting
+        try:
+            view = self.window.open_file(self.path('a.txt'))
+            view.run_command('git_branch_status')
+            wait_idle(30)
+        finally:
+            repostate.RepoState.status_snapshot = status_snapshot
+        self.assertEqual(statuses, [])
+        branch = repostate.repo_state(self.repo).branch
+        self.assertEqual(view.get_status('git-branch'), 'Git branch: %s 1\u2191' % branch)
+        self.assertEqual(view.get_status('git-status-index'), '')
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,31 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import unittest
+
+import helpers  # noqa: F401 (puts the plugin on the path)
+from git import telemetry
+
+
+class RedactTest(unittest.TestCase):
+    def test_global_option_values_are_redacted(self):
+        command = ['/usr/bin/git', '-c', 'user.email=me@example.com', '-C', '/home/me/secret', 'commit', '-m', 'message']
+        self.assertEqual(telemetry.redact(command), ['git', '-c', '...', '-C', '...', 'commit', '-m', '...'])
+        self.assertEqual(telemetry.command_kind(command), 'git commit')
+
+    def test_bare_global_options_are_skipped(self):
+        command = ['git', '--no-optional-locks', '--git-dir', '/repo/.git', 'status', '--porcelain']
+        self.assertEqual(telemetry.command_kind(command), 'git status')
+        self.assertNotIn('/repo/.git', telemetry.redact(command))
+
+
+class PercentileTest(unittest.TestCase):
+    def test_nearest_rank(self):
+        self.assertEqual(telemetry.percentile([1, 2, 3, 4], 0.5), 2)
+        self.assertEqual(telemetry.percentile([1, 2, 3, 4], 0.75), 3)
+        self.assertEqual(telemetry.percentile(range(1, 101), 0.95), 95)
+        self.assertEqual(telemetry.percentile([5], 0.0), 5)
+        self.assertEqual(telemetry.percentile([1, 2, 3], 1.0), 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
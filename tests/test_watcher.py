@@ -0,0 +1,72 @@
+from __future__ import absolute_import, unicode_literals, print_function, division
+
+import threading
+import time
+import unittest
+
+from helpers import sublime, git, wait_idle, RepoTestCase
+from git import ignore, watcher  # noqa: F401 (registers git_update_ignore)
+
+
+class WatcherTest(RepoTestCase):
+    backend = 'auto'
+    files = {'a.txt': 'a\n', 'sub/dir/.gitignore': '*.log\n'}
+
+    def setUp(self):
+        super(WatcherTest, self).setUp()
+        sublime.load_settings('Git.sublime-settings').set('repo_watcher', self.backend)
+        self.view = self.window.open_file(self.path('a.txt'))
+
+    def tearDown(self):
+        watcher.shutdown_all()
+        sublime.load_settings('Git.sublime-settings').erase('repo_watcher')
+        super(WatcherTest, self).tearDown()
+
+    def wait_for(self, condition, timeout=10):
+        deadline = time.time() + timeout
+        while not condition() and time.time() < deadline:
+            sublime.run_pending(wait=0.01)
+        return condition()
+
+    def test_nested_gitignore_changes_are_seen(self):
+        self.assertTrue(watcher.watch(self.repo))
+        self.view.run_command('git_update_ignore')
+        wait_idle(30)
+        before = watcher.generation(self.repo, (watcher.IGNORE,))
+        # let the polling watcher take its first look
+        time.sleep(1.5)
+        sublime.run_pending()
+        self.assertEqual(watcher.generation(self.repo, (watcher.IGNORE,)), before)
+        with open(self.path('sub', 'dir', '.gitignore'), 'a') as f:
+            f.write('*.tmp\n')
+        self.assertTrue(self.wait_for(lambda: watcher.generation(self.repo, (watcher.IGNORE,)) > before))
+
+    def test_changes_are_published_while_a_file_is_being_written(self):
+        self.assertTrue(watcher.watch(self.repo))
+        stop = threading.Event()
+
+        def write_log():
+            with open(self.path('server.log'), 'a') as f:
+                while not stop.wait(0.01):
+                    f.write('line\n')
+                    f.flush()
+
+        writer = threading.Thread(target=write_log)
+        writer.start()
+        try:
+            time.sleep(1.5)
+            sublime.run_pending()
+            before = watcher.generation(self.repo, (watcher.HEAD,))
+            git(self.repo, 'checkout', '-q', '-b', 'other')
+            self.assertTrue(self.wait_for(lambda: watcher.generation(self.repo, (watcher.HEAD,)) > before, 4))
+        finally:
+            stop.set()
+            writer.join()
+
+
+class PolledWatcherTest(WatcherTest):
+    backend = 'polling'
+
+
+if __name__ == '__main__':
+    unittest.main()